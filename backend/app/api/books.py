@@ -12,9 +12,11 @@ from app.models.book import Book
 from app.services.document_parser import get_document_parser
 from app.services.persona_builder import get_persona_builder
 from app.services.outline_generator import get_outline_generator
-from app.crud.crud_book import create_book, get_book, get_books, delete_book
+from app.crud.crud_book import create_book, get_book, get_book_by_hash, get_books, delete_book
 from app.crud.crud_series import create_persona, create_book_series
 from app.models.orm import BookORM
+from app.utils.file_handler import get_file_handler
+from app.utils.config import settings
 
 router = APIRouter()
 
@@ -29,33 +31,59 @@ async def upload_book(
     """
     上传著作文件并解析
 
+    文件分块流式写入临时文件并同步计算哈希，超过大小上限立即中止（413）；
+    内容相同的文件直接返回已有著作，不重复解析
+
     参数:
     - file: 著作文件（PDF/EPUB/TXT）
     - title: 著作标题（可选）
     - author: 作者（可选）
     """
     try:
-        # 保存文件
-        import os
-        from pathlib import Path
-
-        upload_dir = Path("./data/books")
-        upload_dir.mkdir(exist_ok=True)
-
-        file_path = upload_dir / file.filename
-
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-
-        logger.info(f"✅ 文件保存成功: {file_path}")
+        file_handler = get_file_handler()
+
+        async def iter_chunks():
+            while True:
+                chunk = await file.read(settings.upload_chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+        saved = await file_handler.save_upload_stream(
+            iter_chunks(),
+            file.filename,
+            declared_size=file.size
+        )
+        if not saved["success"]:
+            status_code = 413 if saved["reason"] == "too_large" else 400
+            if saved["reason"] == "error":
+                status_code = 500
+            raise HTTPException(status_code=status_code, detail=saved["error"])
+
+        # 相同内容的著作已入库时直接返回
+        existing = get_book_by_hash(db, saved["hash"])
+        if existing:
+            logger.info(f"♻️  文件内容已存在，复用著作: {existing.book_id}")
+            return {
+                "code": 200,
+                "message": "著作已存在",
+                "data": {
+                    "book_id": existing.book_id,
+                    "title": existing.title,
+                    "author": existing.author,
+                    "total_chapters": existing.total_chapters,
+                    "total_viewpoints": existing.total_viewpoints,
+                    "deduplicated": True
+                }
+            }
 
         # 解析著作
         parser = get_document_parser()
         book = await parser.parse_book(
-            file_path=str(file_path),
+            file_path=saved["file_path"],
             title=title or file.filename,
-            author=author or "未知作者"
+            author=author or "未知作者",
+            file_hash=saved["hash"]
         )
 
         # 保存到数据库
@@ -69,13 +97,18 @@ async def upload_book(
                 "title": db_book.title,
                 "author": db_book.author,
                 "total_chapters": db_book.total_chapters,
-                "total_viewpoints": db_book.total_viewpoints
+                "total_viewpoints": db_book.total_viewpoints,
+                "deduplicated": False
             }
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ 上传著作失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await file.close()
 
 
 @router.get("/", summary="获取著作列表")
@@ -145,7 +178,9 @@ async def get_book_detail(book_id: str, db: Session = Depends(get_db)):
                 "chapter_id": c.chapter_id,
                 "chapter_number": c.chapter_number,
                 "title": c.title,
-                "word_count": c.word_count
+                "word_count": c.word_count,
+                "paragraph_count": c.paragraph_count,
+                "text_stats": c.text_stats or {}
             }
             for c in db_book.chapters
         ]
@@ -155,7 +190,8 @@ async def get_book_detail(book_id: str, db: Session = Depends(get_db)):
             {
                 "viewpoint_id": v.viewpoint_id,
                 "content": v.content[:100] + "..." if len(v.content) > 100 else v.content,
-                "keywords": v.keywords[:5] if v.keywords else []
+                "keywords": v.keywords[:5] if v.keywords else [],
+                "duplicate_count": len(v.duplicates or [])
             }
             for v in db_book.viewpoints
         ]
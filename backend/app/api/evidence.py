@@ -1,27 +1,85 @@
 """
 证据库API
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import literal_column
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
 from app.database import get_db
 from app.models.orm import EvidenceORM, ParagraphORM, ChapterORM
 from app.services.evidence_builder import get_evidence_builder
+from app.crud import crud_search
+from app.utils.book_text import MAX_CONTEXT_PARAGRAPHS, get_book_text_store
+from app.utils.config import settings
 
 router = APIRouter()
 
 
+def _rows_by_rowid(db: Session, model, rowids: List[int]) -> Dict[int, object]:
+    """按rowid批量取记录"""
+    if not rowids:
+        return {}
+    rowid = literal_column(f"{model.__tablename__}.rowid")
+    return {key: row for row, key in db.query(model, rowid).filter(rowid.in_(rowids)).all()}
+
+
+def _list_by_rowid(db: Session, model, filters: Dict[str, str], cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """按过滤条件列出记录（rowid顺序），游标为上一页最后一条的rowid"""
+    rowid = literal_column(f"{model.__tablename__}.rowid")
+    query = db.query(model, rowid).filter_by(**filters)
+    after = crud_search.decode_cursor(cursor)
+    if after is not None:
+        query = query.filter(rowid > after[1])
+    rows = query.order_by(rowid).limit(limit + 1).all()
+    next_cursor = crud_search.encode_cursor(0.0, rows[limit - 1][1]) if len(rows) > limit else None
+    return [row for row, _ in rows[:limit]], next_cursor
+
+
+def _chapter_rows(db: Session, chapter_ids) -> Dict[str, Tuple]:
+    """章节ID -> (标题, 全书正文中的起始字节, 结束字节)"""
+    if not chapter_ids:
+        return {}
+    rows = (
+        db.query(ChapterORM.chapter_id, ChapterORM.title, ChapterORM.text_start, ChapterORM.text_end)
+        .filter(ChapterORM.chapter_id.in_(chapter_ids)).all()
+    )
+    return {chapter_id: (title, start, end) for chapter_id, title, start, end in rows}
+
+
+def _paragraph_text(p: ParagraphORM, chapters: Dict[str, Tuple]) -> str:
+    """段落正文：按字节位置从全书正文切出（旧数据直接返回入库的正文）"""
+    _, text_start, _ = chapters.get(p.chapter_id, (None, None, None))
+    if text_start is None or p.byte_start is None:
+        return p.content
+    return crud_search.book_text_of(p.book_id, text_start + p.byte_start, text_start + p.byte_end, p.content)
+
+
+def _evidence_context(e: EvidenceORM, chapters: Dict[str, Tuple], paragraphs: int) -> Tuple[Optional[str], Optional[str]]:
+    """证据前后文：按窗口从全书正文切出前后各paragraphs段（旧数据返回入库时保存的相邻段落）"""
+    _, lower, upper = chapters.get(e.chapter_id, (None, None, None))
+    book_text = get_book_text_store().open(e.book_id) if lower is not None and e.byte_start is not None else None
+    if book_text is None:
+        return e.context_before, e.context_after
+    before, after = book_text.context(lower, upper, lower + e.byte_start, lower + e.byte_end, paragraphs)
+    return str(before, "utf-8").strip() or None, str(after, "utf-8").strip() or None
+
+
 @router.post("/build/{book_id}", summary="构建证据库")
-async def build_evidence(book_id: str, db: Session = Depends(get_db)):
+async def build_evidence(
+    book_id: str,
+    force: bool = Query(False, description="忽略章节摘要，全部重建"),
+    db: Session = Depends(get_db)
+):
+    """按章节增量构建：未变化的章节跳过，返回写入行数、吞吐与跳过的章节"""
     try:
         builder = get_evidence_builder()
-        builder.build_for_book(db, book_id)
+        stats = builder.build_for_book(db, book_id, force=force)
         return {
             "code": 200,
             "message": "证据库构建完成",
-            "data": {"book_id": book_id}
+            "data": {"book_id": book_id, **stats}
         }
     except Exception as e:
         logger.error(f"❌ 证据库构建失败: {e}")
@@ -34,29 +92,42 @@ async def search_evidence(
     book_id: Optional[str] = None,
     chapter_id: Optional[str] = None,
     viewpoint_id: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的next_cursor）"),
+    limit: int = Query(50, ge=1, le=200, description="每页数量"),
+    context: Optional[int] = Query(
+        None, ge=0, le=MAX_CONTEXT_PARAGRAPHS, description="前后文各取的段落数（默认取配置evidence_context_paragraphs）"
+    ),
     db: Session = Depends(get_db)
 ):
+    """
+    有检索词时走全文索引（BM25排序，返回高亮片段），否则按过滤条件列出；均按游标翻页。
+    前后文按请求的窗口大小从全书正文切出，调大窗口无需重建证据库
+    """
     try:
-        query = db.query(EvidenceORM)
-        if book_id:
-            query = query.filter(EvidenceORM.book_id == book_id)
-        if chapter_id:
-            query = query.filter(EvidenceORM.chapter_id == chapter_id)
-        if viewpoint_id:
-            query = query.filter(EvidenceORM.viewpoint_id == viewpoint_id)
+        filters = {
+            column: value for column, value in (
+                ("book_id", book_id), ("chapter_id", chapter_id), ("viewpoint_id", viewpoint_id)
+            ) if value
+        }
         if keyword:
-            query = query.filter(EvidenceORM.evidence_text.contains(keyword))
-
-        evidences = query.limit(50).all()
-        chapter_map = {}
-        paragraph_map = {}
-        for e in evidences:
-            if e.chapter_id and e.chapter_id not in chapter_map:
-                chapter = db.query(ChapterORM).filter(ChapterORM.chapter_id == e.chapter_id).first()
-                chapter_map[e.chapter_id] = chapter.title if chapter else None
-            if e.paragraph_id and e.paragraph_id not in paragraph_map:
-                paragraph = db.query(ParagraphORM).filter(ParagraphORM.paragraph_id == e.paragraph_id).first()
-                paragraph_map[e.paragraph_id] = paragraph.paragraph_number if paragraph else None
+            hits, next_cursor = crud_search.search(
+                db, crud_search.EVIDENCE_SEARCH, keyword, filters, cursor=cursor, limit=limit
+            )
+            rows = _rows_by_rowid(db, EvidenceORM, [hit["rowid"] for hit in hits])
+            matches = [(rows[hit["rowid"]], hit) for hit in hits if hit["rowid"] in rows]
+        else:
+            evidences, next_cursor = _list_by_rowid(db, EvidenceORM, filters, cursor, limit)
+            matches = [(e, None) for e in evidences]
+
+        chapter_ids = {e.chapter_id for e, _ in matches if e.chapter_id}
+        paragraph_ids = {e.paragraph_id for e, _ in matches if e.paragraph_id}
+        chapter_map = _chapter_rows(db, chapter_ids)
+        window = settings.evidence_context_paragraphs if context is None else context
+        contexts = {e.evidence_id: _evidence_context(e, chapter_map, window) for e, _ in matches}
+        paragraph_map = dict(
+            db.query(ParagraphORM.paragraph_id, ParagraphORM.paragraph_number)
+            .filter(ParagraphORM.paragraph_id.in_(paragraph_ids)).all()
+        ) if paragraph_ids else {}
 
         return {
             "code": 200,
@@ -67,32 +138,86 @@ async def search_evidence(
                         "evidence_id": e.evidence_id,
                         "book_id": e.book_id,
                         "chapter_id": e.chapter_id,
-                        "chapter_title": chapter_map.get(e.chapter_id),
+                        "chapter_title": chapter_map.get(e.chapter_id, (None,))[0],
                         "paragraph_id": e.paragraph_id,
                         "paragraph_number": paragraph_map.get(e.paragraph_id),
                         "viewpoint_id": e.viewpoint_id,
                         "evidence_text": e.evidence_text,
-                        "context_before": e.context_before,
-                        "context_after": e.context_after,
+                        "context_before": contexts[e.evidence_id][0],
+                        "context_after": contexts[e.evidence_id][1],
                         "keywords": e.keywords,
-                        "score": e.score
+                        "score": e.score,
+                        "rank_score": hit["score"] if hit else None,
+                        "snippet": hit["snippet"] if hit else None
                     }
-                    for e in evidences
-                ]
+                    for e, hit in matches
+                ],
+                "next_cursor": next_cursor
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"❌ 证据检索失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/paragraphs/search", summary="段落全文检索")
+async def search_paragraphs(
+    keyword: str,
+    book_id: Optional[str] = None,
+    chapter_id: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="翻页游标（上一页返回的next_cursor）"),
+    limit: int = Query(50, ge=1, le=200, description="每页数量"),
+    db: Session = Depends(get_db)
+):
+    try:
+        filters = {column: value for column, value in (("book_id", book_id), ("chapter_id", chapter_id)) if value}
+        hits, next_cursor = crud_search.search(
+            db, crud_search.PARAGRAPH_SEARCH, keyword, filters, cursor=cursor, limit=limit
+        )
+        rows = _rows_by_rowid(db, ParagraphORM, [hit["rowid"] for hit in hits])
+        chapter_map = _chapter_rows(db, {p.chapter_id for p in rows.values()})
+        return {
+            "code": 200,
+            "message": "获取成功",
+            "data": {
+                "items": [
+                    {
+                        "paragraph_id": p.paragraph_id,
+                        "book_id": p.book_id,
+                        "chapter_id": p.chapter_id,
+                        "paragraph_number": p.paragraph_number,
+                        "content": _paragraph_text(p, chapter_map),
+                        "rank_score": hit["score"],
+                        "snippet": hit["snippet"]
+                    }
+                    for hit in hits
+                    for p in [rows.get(hit["rowid"])] if p is not None
+                ],
+                "next_cursor": next_cursor
+            }
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ 段落检索失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/paragraphs", summary="按章节获取段落")
 async def list_paragraphs(
     chapter_id: str,
     db: Session = Depends(get_db)
 ):
     try:
-        paragraphs = db.query(ParagraphORM).filter(ParagraphORM.chapter_id == chapter_id).all()
+        paragraphs = (
+            db.query(ParagraphORM)
+            .filter(ParagraphORM.chapter_id == chapter_id)
+            .order_by(ParagraphORM.paragraph_number)
+            .all()
+        )
+        chapter_map = _chapter_rows(db, {chapter_id})
         return {
             "code": 200,
             "message": "获取成功",
@@ -102,8 +227,9 @@ async def list_paragraphs(
                         "paragraph_id": p.paragraph_id,
                         "chapter_id": p.chapter_id,
                         "paragraph_number": p.paragraph_number,
-                        "content": p.content,
-                        "word_count": p.word_count
+                        "content": _paragraph_text(p, chapter_map),
+                        "word_count": p.word_count,
+                        "duplicates": p.duplicates or []
                     }
                     for p in paragraphs
                 ]
@@ -7,6 +7,7 @@ from loguru import logger
 
 from app.database import get_db
 from app.utils.config import settings
+from app.utils.warmup import get_readiness
 
 router = APIRouter()
 
@@ -16,7 +17,9 @@ async def health_check(db: Session = Depends(get_db)):
     """
     健康检查端点
 
-    返回系统状态信息
+    返回系统状态信息；nlp_ready表示分词词典、NLP模型等组件是否都已加载（或无需加载）。
+    开启预热时随后台预热完成而就绪；未开启时尚未用到的组件显示为lazy，首次使用加载后变为ready
+    （未就绪时相关功能仍可使用，首次调用会等待加载）
     """
     # 检查数据库连接
     try:
@@ -26,11 +29,14 @@ async def health_check(db: Session = Depends(get_db)):
         logger.error(f"数据库连接失败: {e}")
         db_status = "disconnected"
 
+    readiness = get_readiness()
     return {
         "status": "healthy" if db_status == "connected" else "unhealthy",
         "service": settings.project_name,
         "version": settings.project_version,
         "database": db_status,
         "openai_model": settings.openai_model,
-        "debug": settings.debug
+        "debug": settings.debug,
+        "nlp_ready": readiness["ready"],
+        "nlp": readiness
     }
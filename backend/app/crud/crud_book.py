@@ -2,11 +2,14 @@
 著作CRUD操作
 """
 from typing import List, Optional
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from loguru import logger
 
-from app.models.orm import BookORM, ChapterORM, CoreViewpointORM
+from app.models.orm import BookORM, ChapterORM, CoreViewpointORM, EvidenceORM, ParagraphORM
 from app.models.book import Book, Chapter, CoreViewpoint
+from app.utils.text_stats import compute_text_stats
+from app.utils.book_text import get_book_text_store
 
 
 def create_book(db: Session, book: Book) -> BookORM:
@@ -27,6 +30,7 @@ def create_book(db: Session, book: Book) -> BookORM:
         language=book.language,
         file_path=book.file_path,
         file_type=book.file_type,
+        file_hash=book.file_hash,
         total_words=book.total_words,
         total_chapters=len(book.chapters),
         total_viewpoints=len(book.core_viewpoints),
@@ -37,16 +41,70 @@ def create_book(db: Session, book: Book) -> BookORM:
     db.commit()
     db.refresh(db_book)
 
-    # 创建章节记录
+    _add_book_content(db, book.book_id, book)
+    db.commit()
+    logger.info(f"✅ 创建著作成功: {book.title} ({len(book.chapters)}章, {len(book.core_viewpoints)}观点)")
+
+    return db_book
+
+
+def replace_book_content(db: Session, book_id: str, book: Book) -> Optional[BookORM]:
+    """
+    用重新解析的结果原地替换著作的解析产物（章节、观点，以及由其构建的段落与证据）
+
+    book_id保持不变，Persona、系列、产出与诊断等记录原样保留；
+    全书正文文件随章节失效，由下次构建证据库时重新写出
+
+    参数:
+        db: 数据库会话
+        book_id: 已入库的著作ID
+        book: 重新解析得到的Pydantic Book对象（其book_id不使用）
+
+    返回:
+        BookORM对象，著作不存在时返回None
+    """
+    db_book = get_book(db, book_id)
+    if not db_book:
+        return None
+
+    # 按外键依赖顺序删除旧的解析产物
+    for model in (EvidenceORM, ParagraphORM, CoreViewpointORM, ChapterORM):
+        db.execute(delete(model).where(model.book_id == book_id))
+
+    db_book.language = book.language
+    db_book.file_path = book.file_path
+    db_book.file_type = book.file_type
+    db_book.total_words = book.total_words
+    db_book.total_chapters = len(book.chapters)
+    db_book.total_viewpoints = len(book.core_viewpoints)
+    db_book.parse_stats = book.parse_stats or {}
+
+    _add_book_content(db, book_id, book)
+    db.commit()
+    db.refresh(db_book)
+    get_book_text_store().delete(book_id)
+    logger.info(f"✅ 重新解析著作成功: {book.title} ({len(book.chapters)}章, {len(book.core_viewpoints)}观点)")
+
+    return db_book
+
+
+def _add_book_content(db: Session, book_id: str, book: Book):
+    """添加章节与核心观点记录（不提交）"""
+    # 统计信息在解析时已一次算出，缺失时补算
+    missing = [chapter for chapter in book.chapters if chapter.text_stats is None]
+    for chapter, stats in zip(missing, compute_text_stats([chapter.content for chapter in missing])):
+        chapter.text_stats = stats
     for chapter in book.chapters:
         db_chapter = ChapterORM(
             chapter_id=chapter.chapter_id,
-            book_id=book.book_id,
+            book_id=book_id,
             chapter_number=chapter.chapter_number,
             title=chapter.title,
             content=chapter.content,
             page_range=chapter.page_range,
-            word_count=len(chapter.content)
+            word_count=chapter.text_stats["words"],
+            paragraph_count=chapter.text_stats["paragraphs"],
+            text_stats=chapter.text_stats
         )
         db.add(db_chapter)
 
@@ -54,26 +112,29 @@ def create_book(db: Session, book: Book) -> BookORM:
     for viewpoint in book.core_viewpoints:
         db_viewpoint = CoreViewpointORM(
             viewpoint_id=viewpoint.viewpoint_id,
-            book_id=book.book_id,
+            book_id=book_id,
             chapter_id=viewpoint.chapter_id,
             content=viewpoint.content,
             original_text=viewpoint.original_text,
             context=viewpoint.context,
-            keywords=viewpoint.keywords
+            keywords=viewpoint.keywords,
+            duplicates=viewpoint.duplicates,
+            start_offset=viewpoint.start_offset,
+            end_offset=viewpoint.end_offset
         )
         db.add(db_viewpoint)
 
-    db.commit()
-    logger.info(f"✅ 创建著作成功: {book.title} ({len(book.chapters)}章, {len(book.core_viewpoints)}观点)")
-
-    return db_book
-
 
 def get_book(db: Session, book_id: str) -> Optional[BookORM]:
     """获取著作"""
     return db.query(BookORM).filter(BookORM.book_id == book_id).first()
 
 
+def get_book_by_hash(db: Session, file_hash: str) -> Optional[BookORM]:
+    """按文件内容哈希获取著作（上传去重）"""
+    return db.query(BookORM).filter(BookORM.file_hash == file_hash).first()
+
+
 def get_books(db: Session, skip: int = 0, limit: int = 10) -> List[BookORM]:
     """获取著作列表"""
     return db.query(BookORM).offset(skip).limit(limit).all()
@@ -85,6 +146,7 @@ def delete_book(db: Session, book_id: str) -> bool:
     if db_book:
         db.delete(db_book)
         db.commit()
+        get_book_text_store().delete(book_id)
         logger.info(f"✅ 删除著作成功: {book_id}")
         return True
     return False
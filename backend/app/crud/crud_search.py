@@ -0,0 +1,339 @@
+"""
+全文检索CRUD操作
+证据与段落正文预先用jieba分词，以不可见分隔符连接后写入SQLite FTS5表（rowid与源表一致）：
+FTS5按分隔符切出词元，检索按BM25排序；去掉分隔符即还原原文，高亮片段可直接返回。
+新行在构建证据库时写入索引，删除、改写正文由触发器同步（见database.ensure_schema）；
+升级前构建的行由启动时的后台补建逐本书写入，补建完成前这些书的检索退回LIKE匹配。
+段落正文不入库，建索引时按字节位置从全书正文（BookTextStore）切出
+"""
+import base64
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.utils.book_text import get_book_text_store
+from app.utils.segmenter import JIEBA_AVAILABLE, load_jieba
+
+
+# 词元分隔符（U+2063 INVISIBLE SEPARATOR），建表时声明为unicode61的分隔字符
+FTS_SEPARATOR = "\u2063"
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+# 高亮片段的最多词元数（FTS5上限64）
+SNIPPET_TOKENS = 32
+# 每批写入索引的行数
+INDEX_BATCH_SIZE = 500
+# LIKE回退检索时高亮片段命中词前后保留的字数
+FALLBACK_SNIPPET_CHARS = 30
+
+
+@dataclass(frozen=True)
+class SearchTable:
+    """可检索的源表及其FTS5索引表"""
+    table: str
+    fts_table: str
+    text_column: str
+    # 正文按byte_start/byte_end从全书正文切出（text_column只保存旧数据的正文）
+    book_text: bool = False
+
+
+EVIDENCE_SEARCH = SearchTable("evidences", "evidence_fts", "evidence_text")
+PARAGRAPH_SEARCH = SearchTable("paragraphs", "paragraph_fts", "content", book_text=True)
+SEARCH_TABLES = (EVIDENCE_SEARCH, PARAGRAPH_SEARCH)
+
+_CJK_CHAR = re.compile(r'([\u4e00-\u9fff])')
+# 查询词元：至少含一个文字或数字
+_WORD_TOKEN = re.compile(r'\w')
+
+
+def _split_tokens(content: str) -> List[str]:
+    """分词（未安装jieba时中文按字切分），词元首尾相接即为原文"""
+    if JIEBA_AVAILABLE:
+        return load_jieba().lcut(content)
+    return [piece for piece in _CJK_CHAR.split(content) if piece]
+
+
+def fts_body(content: str) -> str:
+    """索引正文：分词结果以分隔符连接"""
+    return FTS_SEPARATOR.join(_split_tokens(content or ""))
+
+
+def fts_query(keyword: str) -> Optional[str]:
+    """
+    把检索词转为FTS5查询：与正文相同方式分词，各词元加引号后取交集
+
+    返回:
+        查询串（检索词中没有可检索的词元时返回None）
+    """
+    tokens = dict.fromkeys(token.strip() for token in _split_tokens(keyword or ""))
+    phrases = ['"' + token.replace('"', '""') + '"' for token in tokens if token and _WORD_TOKEN.search(token)]
+    return " AND ".join(phrases) if phrases else None
+
+
+def encode_cursor(score: float, rowid: int) -> str:
+    """翻页游标（上一页最后一条的得分与rowid）"""
+    return base64.urlsafe_b64encode(json.dumps([score, rowid]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """解析翻页游标（无效时抛出ValueError）"""
+    if not cursor:
+        return None
+    try:
+        score, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(score), int(rowid)
+    except Exception as e:
+        raise ValueError(f"无效的翻页游标: {cursor}") from e
+
+
+def book_text_of(book_id: str, start: Optional[int], end: Optional[int], fallback: Optional[str] = None) -> str:
+    """
+    按全书正文中的字节位置取正文（没有位置或正文文件缺失时返回fallback，即旧数据入库的正文）
+    """
+    if start is not None and end is not None:
+        book_text = get_book_text_store().open(book_id)
+        if book_text is not None:
+            return book_text.text(start, end)
+    return fallback or ""
+
+
+# 所有行都已进入索引（后台补建完成后置位，之后检索不再检查未索引的书）
+_index_complete = False
+
+
+def index_missing(db: Session, book_id: Optional[str] = None) -> Dict[str, int]:
+    """
+    为尚未进入索引的证据与段落建立索引（构建证据库后调用，也用于补建旧数据的索引）
+
+    先读出并分词全部待索引行，再集中写入，分词期间不占用写锁；
+    写入时再次确认源行仍存在且尚未索引，与并发的证据库构建交错时不会重复或写入已删除的行。
+    不提交，由调用方决定事务边界
+
+    参数:
+        book_id: 只处理该书的行（None表示全部）
+
+    返回:
+        {源表: 新索引的行数}
+    """
+    indexed: Dict[str, int] = {}
+    pending: Dict[SearchTable, List[Dict]] = {}
+    for search in SEARCH_TABLES:
+        condition = "AND s.book_id = :book_id" if book_id else ""
+        if search.book_text:
+            rows = db.execute(
+                text(
+                    f"SELECT s.rowid, s.{search.text_column}, s.book_id, "
+                    f"c.text_start + s.byte_start, c.text_start + s.byte_end "
+                    f"FROM {search.table} s LEFT JOIN chapters c ON c.chapter_id = s.chapter_id "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {search.fts_table} f WHERE f.rowid = s.rowid) {condition}"
+                ),
+                {"book_id": book_id}
+            ).fetchall()
+            rows = [(rowid, book_text_of(row_book_id, start, end, content)) for rowid, content, row_book_id, start, end in rows]
+        else:
+            rows = db.execute(
+                text(
+                    f"SELECT s.rowid, s.{search.text_column} FROM {search.table} s "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {search.fts_table} f WHERE f.rowid = s.rowid) {condition}"
+                ),
+                {"book_id": book_id}
+            ).fetchall()
+        pending[search] = [{"rowid": rowid, "body": fts_body(content)} for rowid, content in rows]
+        indexed[search.table] = len(rows)
+
+    for search, rows in pending.items():
+        for start in range(0, len(rows), INDEX_BATCH_SIZE):
+            db.execute(
+                text(
+                    f"INSERT INTO {search.fts_table} (rowid, body) SELECT :rowid, :body "
+                    f"WHERE EXISTS (SELECT 1 FROM {search.table} WHERE rowid = :rowid) "
+                    f"AND NOT EXISTS (SELECT 1 FROM {search.fts_table} WHERE rowid = :rowid)"
+                ),
+                rows[start:start + INDEX_BATCH_SIZE]
+            )
+    if any(indexed.values()):
+        logger.info(f"🔎 全文索引已更新: {indexed}")
+    return indexed
+
+
+def unindexed_books(db: Session, search_table: SearchTable, filters: Optional[Dict[str, str]] = None) -> List[str]:
+    """过滤范围内仍有行未进入索引的书（后台补建完成后直接返回空）"""
+    if _index_complete:
+        return []
+    conditions = [f"NOT EXISTS (SELECT 1 FROM {search_table.fts_table} f WHERE f.rowid = s.rowid)"]
+    params: Dict = {}
+    for column, value in (filters or {}).items():
+        conditions.append(f"s.{column} = :filter_{column}")
+        params[f"filter_{column}"] = value
+    rows = db.execute(
+        text(f"SELECT DISTINCT s.book_id FROM {search_table.table} s WHERE {' AND '.join(conditions)}"),
+        params
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def backfill_index(db: Session) -> Dict[str, int]:
+    """
+    补建升级前已构建的证据与段落的索引
+
+    逐本书建立并提交，每次只短暂占用写锁；单本书失败（如与证据库构建争用写锁）只记录日志，
+    下次启动时重试，该书在此之前按LIKE匹配检索
+
+    返回:
+        {源表: 新索引的行数}
+    """
+    global _index_complete
+    book_ids = sorted({book_id for search in SEARCH_TABLES for book_id in unindexed_books(db, search)})
+    db.rollback()
+    totals = {search.table: 0 for search in SEARCH_TABLES}
+    failed = 0
+    for book_id in book_ids:
+        try:
+            for table, count in index_missing(db, book_id).items():
+                totals[table] += count
+            db.commit()
+        except OperationalError as e:
+            db.rollback()
+            failed += 1
+            logger.warning(f"⚠️  补建全文索引失败，下次启动时重试: {book_id} ({e})")
+    _index_complete = failed == 0
+    if book_ids:
+        logger.info(f"🔎 全文索引补建完成: {len(book_ids) - failed}/{len(book_ids)} 本书, {totals}")
+    return totals
+
+
+def _highlight(content: str, keyword: str) -> str:
+    """LIKE回退检索的高亮片段：首个命中前后各取FALLBACK_SNIPPET_CHARS字"""
+    position = content.find(keyword)
+    if position < 0:
+        return content[:FALLBACK_SNIPPET_CHARS * 2]
+    start = max(position - FALLBACK_SNIPPET_CHARS, 0)
+    end = min(position + len(keyword) + FALLBACK_SNIPPET_CHARS, len(content))
+    snippet = content[start:end].replace(keyword, HIGHLIGHT_OPEN + keyword + HIGHLIGHT_CLOSE)
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+
+def contains_search(
+    db: Session,
+    search_table: SearchTable,
+    keyword: str,
+    filters: Optional[Dict[str, str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    LIKE子串匹配（按rowid顺序，不计算相关度），用于范围内还有书未进入索引时
+
+    只匹配入库的正文列（升级前的行正文都在库中），返回格式与search一致
+    """
+    if not keyword:
+        return [], None
+    after = decode_cursor(cursor)
+    conditions = [f"s.{search_table.text_column} LIKE :pattern ESCAPE '\\'"]
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    params: Dict = {"pattern": f"%{escaped}%", "limit": limit + 1}
+    for column, value in (filters or {}).items():
+        conditions.append(f"s.{column} = :filter_{column}")
+        params[f"filter_{column}"] = value
+    if after is not None:
+        conditions.append("s.rowid > :after_rowid")
+        params["after_rowid"] = after[1]
+    rows = db.execute(
+        text(
+            f"SELECT s.rowid, s.{search_table.text_column} FROM {search_table.table} s "
+            f"WHERE {' AND '.join(conditions)} ORDER BY s.rowid LIMIT :limit"
+        ),
+        params
+    ).fetchall()
+    next_cursor = encode_cursor(0.0, rows[limit - 1][0]) if len(rows) > limit else None
+    hits = [
+        {"rowid": rowid, "score": 0.0, "snippet": _highlight(content or "", keyword)}
+        for rowid, content in rows[:limit]
+    ]
+    return hits, next_cursor
+
+
+def search(
+    db: Session,
+    search_table: SearchTable,
+    keyword: str,
+    filters: Optional[Dict[str, str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    全文检索（BM25排序，得分相同按rowid），按游标翻页
+
+    参数:
+        search_table: EVIDENCE_SEARCH或PARAGRAPH_SEARCH
+        keyword: 检索词
+        filters: 源表字段的等值过滤，如{"book_id": ...}
+        cursor: 上一页返回的游标
+
+    范围内还有书未进入索引（升级前构建、后台补建尚未完成）时，整体退回contains_search，
+    保证这些书仍能检索到
+
+    返回:
+        (命中列表 [{"rowid", "score", "snippet"}]，下一页游标（没有更多时为None）)
+    """
+    pending_books = unindexed_books(db, search_table, filters)
+    if pending_books:
+        logger.info(f"🔎 {len(pending_books)} 本书尚未进入全文索引，按LIKE匹配检索")
+        return contains_search(db, search_table, keyword.strip(), filters, cursor=cursor, limit=limit)
+
+    query = fts_query(keyword)
+    if query is None:
+        return [], None
+    after = decode_cursor(cursor)
+
+    conditions = [f"{search_table.fts_table} MATCH :query"]
+    params: Dict = {"query": query, "limit": limit + 1}
+    for column, value in (filters or {}).items():
+        conditions.append(f"s.{column} = :filter_{column}")
+        params[f"filter_{column}"] = value
+    keyset = ""
+    if after is not None:
+        keyset = "WHERE hits.score > :after_score OR (hits.score = :after_score AND hits.rowid > :after_rowid)"
+        params.update(after_score=after[0], after_rowid=after[1])
+
+    # 先只取本页的rowid与得分，高亮片段只为本页生成
+    rows = db.execute(
+        text(
+            f"SELECT hits.rowid, hits.score FROM ("
+            f"SELECT f.rowid AS rowid, bm25({search_table.fts_table}) AS score "
+            f"FROM {search_table.fts_table} f JOIN {search_table.table} s ON s.rowid = f.rowid "
+            f"WHERE {' AND '.join(conditions)}"
+            f") hits {keyset} ORDER BY hits.score, hits.rowid LIMIT :limit"
+        ),
+        params
+    ).fetchall()
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    rowids = [rowid for rowid, _ in rows]
+    snippets = dict(db.execute(
+        text(
+            f"SELECT rowid, snippet({search_table.fts_table}, 0, :open, :close, '…', :tokens) "
+            f"FROM {search_table.fts_table} WHERE {search_table.fts_table} MATCH :query "
+            f"AND rowid IN ({', '.join(str(rowid) for rowid in rowids)})"
+        ),
+        {"query": query, "open": HIGHLIGHT_OPEN, "close": HIGHLIGHT_CLOSE, "tokens": SNIPPET_TOKENS}
+    ).fetchall())
+    hits = [
+        {
+            "rowid": rowid,
+            "score": round(-score, 4),
+            # 去掉分隔符还原原文，相邻命中的词元合并为一段高亮
+            "snippet": (snippets.get(rowid) or "").replace(FTS_SEPARATOR, "").replace(HIGHLIGHT_CLOSE + HIGHLIGHT_OPEN, "")
+        }
+        for rowid, score in rows
+    ]
+    return hits, next_cursor
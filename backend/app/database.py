@@ -65,6 +65,11 @@ def ensure_schema():
                 logger.info("🔧 发现缺失列 books.parse_stats，执行迁移...")
                 conn.execute(text("ALTER TABLE books ADD COLUMN parse_stats JSON"))
                 logger.info("✅ 已补齐 books.parse_stats")
+            if "file_hash" not in columns:
+                logger.info("🔧 发现缺失列 books.file_hash，执行迁移...")
+                conn.execute(text("ALTER TABLE books ADD COLUMN file_hash VARCHAR"))
+                logger.info("✅ 已补齐 books.file_hash")
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_books_file_hash ON books (file_hash)"))
 
             # author_personas.version
             result = conn.execute(text("PRAGMA table_info(author_personas)"))
@@ -85,18 +90,90 @@ def ensure_schema():
                 logger.info("🔧 发现缺失列 chapters.paragraph_count，执行迁移...")
                 conn.execute(text("ALTER TABLE chapters ADD COLUMN paragraph_count INTEGER"))
                 logger.info("✅ 已补齐 chapters.paragraph_count")
+            if "text_stats" not in columns:
+                logger.info("🔧 发现缺失列 chapters.text_stats，执行迁移...")
+                conn.execute(text("ALTER TABLE chapters ADD COLUMN text_stats JSON"))
+                logger.info("✅ 已补齐 chapters.text_stats")
+            if "evidence_hash" not in columns:
+                logger.info("🔧 发现缺失列 chapters.evidence_hash，执行迁移...")
+                conn.execute(text("ALTER TABLE chapters ADD COLUMN evidence_hash VARCHAR"))
+                logger.info("✅ 已补齐 chapters.evidence_hash")
+            for column in ("text_start", "text_end"):
+                if column not in columns:
+                    logger.info(f"🔧 发现缺失列 chapters.{column}，执行迁移...")
+                    conn.execute(text(f"ALTER TABLE chapters ADD COLUMN {column} INTEGER"))
+                    logger.info(f"✅ 已补齐 chapters.{column}")
+
+            # core_viewpoints / paragraphs: duplicates、start_offset、end_offset
+            for table in ("core_viewpoints", "paragraphs"):
+                result = conn.execute(text(f"PRAGMA table_info({table})"))
+                columns = {row[1] for row in result.fetchall()}
+                if "duplicates" not in columns:
+                    logger.info(f"🔧 发现缺失列 {table}.duplicates，执行迁移...")
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN duplicates JSON"))
+                    logger.info(f"✅ 已补齐 {table}.duplicates")
+                for column in ("start_offset", "end_offset"):
+                    if column not in columns:
+                        logger.info(f"🔧 发现缺失列 {table}.{column}，执行迁移...")
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER"))
+                        logger.info(f"✅ 已补齐 {table}.{column}")
+
+            # paragraphs / evidences: byte_start、byte_end
+            for table in ("paragraphs", "evidences"):
+                result = conn.execute(text(f"PRAGMA table_info({table})"))
+                columns = {row[1] for row in result.fetchall()}
+                for column in ("byte_start", "byte_end"):
+                    if column not in columns:
+                        logger.info(f"🔧 发现缺失列 {table}.{column}，执行迁移...")
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER"))
+                        logger.info(f"✅ 已补齐 {table}.{column}")
+
+            # 证据库按章节整体替换，删除时按chapter_id查找
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_paragraphs_chapter_id ON paragraphs (chapter_id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_evidences_chapter_id ON evidences (chapter_id)"))
+
+            ensure_search_schema(conn)
     except Exception as e:
         logger.error(f"❌ 数据库迁移失败: {e}")
 
 
+def ensure_search_schema(conn):
+    """
+    证据与段落的FTS5全文索引表（rowid与源表一致），以及删除/改写正文时同步索引的触发器
+
+    索引正文需jieba预分词，新行由crud_search.index_missing写入
+    """
+    from app.crud.crud_search import FTS_SEPARATOR, SEARCH_TABLES
+
+    for search in SEARCH_TABLES:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {search.fts_table} "
+            f"USING fts5(body, tokenize = \"unicode61 separators '{FTS_SEPARATOR}'\")"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {search.fts_table}_delete AFTER DELETE ON {search.table} "
+            f"BEGIN DELETE FROM {search.fts_table} WHERE rowid = old.rowid; END"
+        ))
+        # 正文改写后移出索引，由index_missing重新分词写入
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {search.fts_table}_update AFTER UPDATE OF {search.text_column} ON {search.table} "
+            f"BEGIN DELETE FROM {search.fts_table} WHERE rowid = old.rowid; END"
+        ))
+
+
 def drop_db():
     """
     删除所有表（谨慎使用！）
     """
     from app.models import orm  # 导入ORM模型
 
+    from app.crud.crud_search import SEARCH_TABLES
+
     logger.warning("⚠️  删除所有数据库表...")
     Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        for search in SEARCH_TABLES:
+            conn.execute(text(f"DROP TABLE IF EXISTS {search.fts_table}"))
     logger.warning("🗑️  所有表已删除")
 
 
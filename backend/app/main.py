@@ -2,6 +2,8 @@
 FastAPI应用入口
 Persona生成与应用平台 - 后端服务
 """
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -9,7 +11,9 @@ from loguru import logger
 import sys
 
 from app.utils.config import settings
-from app.database import init_db, ensure_schema
+from app.database import SessionLocal, init_db, ensure_schema
+from app.crud.crud_search import backfill_index
+from app.utils.warmup import start_warmup
 from app.api import health, books, personas, outlines, scripts, audiences, outputs, diff, diagnostics, model_providers, evidence
 
 # 配置日志
@@ -45,6 +49,21 @@ app.add_middleware(
 )
 
 
+# 后台任务引用（避免任务被回收）
+_background_tasks = set()
+
+
+def _backfill_search_index():
+    """补建升级前数据的全文索引（在后台线程中执行，逐本书提交）"""
+    db = SessionLocal()
+    try:
+        backfill_index(db)
+    except Exception as e:
+        logger.error(f"❌ 全文索引补建失败: {e}")
+    finally:
+        db.close()
+
+
 # 注册路由
 @app.on_event("startup")
 async def startup_event():
@@ -55,6 +74,13 @@ async def startup_event():
     logger.info(f"💾 数据库: {settings.database_url}")
     init_db()
     ensure_schema()
+    # 升级前构建的证据与段落不论是否开启预热都要补建索引；补建完成前这些书的检索退回LIKE匹配
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(_backfill_search_index))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    # 分词词典与NLP模型按需加载；开启预热时在后台提前加载，不阻塞启动
+    if start_warmup() is not None:
+        logger.info("🔥 NLP组件后台预热中...")
 
 
 @app.on_event("shutdown")
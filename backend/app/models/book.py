@@ -13,6 +13,7 @@ class Chapter(BaseModel):
     title: str = Field(..., description="章节标题")
     content: str = Field(..., description="章节内容")
     page_range: Optional[str] = Field(None, description="页码范围")
+    text_stats: Optional[dict] = Field(None, description="文本统计（字数、语言、段落数、句数、术语密度等）")
 
 
 class CoreViewpoint(BaseModel):
@@ -23,6 +24,9 @@ class CoreViewpoint(BaseModel):
     chapter_id: str = Field(..., description="所属章节ID")
     context: str = Field(..., description="上下文")
     keywords: List[str] = Field(default_factory=list, description="关键词")
+    duplicates: List[dict] = Field(default_factory=list, description="被合并的近似重复观点（[{chapter_id}]）")
+    start_offset: Optional[int] = Field(None, description="原文在章节正文中的起始字符位置")
+    end_offset: Optional[int] = Field(None, description="原文在章节正文中的结束字符位置（不含）")
 
 
 class Book(BaseModel):
@@ -33,6 +37,7 @@ class Book(BaseModel):
     language: str = Field(default="zh", description="语言")
     file_path: str = Field(..., description="文件路径")
     file_type: str = Field(..., description="文件类型：pdf/epub/txt")
+    file_hash: Optional[str] = Field(None, description="文件内容哈希（MD5）")
 
     # 结构化内容
     chapters: List[Chapter] = Field(default_factory=list, description="章节列表")
@@ -19,6 +19,7 @@ class BookORM(Base):
     language = Column(String, default="zh")
     file_path = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
+    file_hash = Column(String, nullable=True, index=True)  # 文件内容MD5，用于上传去重
 
     # 内容统计
     total_words = Column(Integer, default=0)
@@ -57,6 +58,10 @@ class ChapterORM(Base):
     page_range = Column(String, nullable=True)
     word_count = Column(Integer, default=0)
     paragraph_count = Column(Integer, default=0)
+    text_stats = Column(JSON, nullable=True)  # 入库时一次算出的文本统计
+    evidence_hash = Column(String, nullable=True)  # 构建证据库时章节正文、观点与构建配置的摘要（未变化则跳过重建）
+    text_start = Column(Integer, nullable=True)  # 章节在全书正文文件中的[起始, 结束)字节位置（见BookTextStore）
+    text_end = Column(Integer, nullable=True)
 
     created_at = Column(DateTime, default=datetime.now)
 
@@ -78,6 +83,9 @@ class CoreViewpointORM(Base):
     original_text = Column(Text, nullable=False)
     context = Column(Text, nullable=True)
     keywords = Column(JSON, default=list)  # 存储关键词列表
+    duplicates = Column(JSON, default=list)  # 被合并的近似重复观点 [{chapter_id}]
+    start_offset = Column(Integer, nullable=True)  # 原文在章节正文中的[起始, 结束)字符位置
+    end_offset = Column(Integer, nullable=True)
 
     created_at = Column(DateTime, default=datetime.now)
 
@@ -93,10 +101,15 @@ class ParagraphORM(Base):
 
     paragraph_id = Column(String, primary_key=True, index=True)
     book_id = Column(String, ForeignKey("books.book_id"), nullable=False)
-    chapter_id = Column(String, ForeignKey("chapters.chapter_id"), nullable=False)
+    chapter_id = Column(String, ForeignKey("chapters.chapter_id"), nullable=False, index=True)
     paragraph_number = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(Text, nullable=False, default="")  # 有字节位置时为空，正文从全书正文文件按偏移读取
     word_count = Column(Integer, default=0)
+    duplicates = Column(JSON, default=list)  # 被合并的近似重复段落 [{chapter_id, paragraph_number}]
+    start_offset = Column(Integer, nullable=True)  # 段落在章节正文中的[起始, 结束)字符位置
+    end_offset = Column(Integer, nullable=True)
+    byte_start = Column(Integer, nullable=True)  # 段落在章节正文中的[起始, 结束)UTF-8字节位置
+    byte_end = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.now)
 
     # 关联关系
@@ -110,13 +123,15 @@ class EvidenceORM(Base):
 
     evidence_id = Column(String, primary_key=True, index=True)
     book_id = Column(String, ForeignKey("books.book_id"), nullable=False)
-    chapter_id = Column(String, ForeignKey("chapters.chapter_id"), nullable=False)
+    chapter_id = Column(String, ForeignKey("chapters.chapter_id"), nullable=False, index=True)
     paragraph_id = Column(String, ForeignKey("paragraphs.paragraph_id"), nullable=True)
     viewpoint_id = Column(String, ForeignKey("core_viewpoints.viewpoint_id"), nullable=True)
 
     evidence_text = Column(Text, nullable=False)
-    context_before = Column(Text, nullable=True)
+    context_before = Column(Text, nullable=True)  # 旧数据保存的前后文；新证据按字节位置在请求时切出
     context_after = Column(Text, nullable=True)
+    byte_start = Column(Integer, nullable=True)  # 证据所在段落在章节正文中的[起始, 结束)UTF-8字节位置
+    byte_end = Column(Integer, nullable=True)
     keywords = Column(JSON, default=list)
     score = Column(Float, default=1.0)
     created_at = Column(DateTime, default=datetime.now)
@@ -4,10 +4,10 @@
 """
 from typing import Dict, Any, Optional, List
 from loguru import logger
-import re
 
 from app.models.persona import AudiencePersona
 from app.services.audience_adapter import AudienceAdapter
+from app.utils.text_stats import text_stats
 
 
 class DiagnosticEvaluator:
@@ -28,18 +28,19 @@ class DiagnosticEvaluator:
         issues: List[str] = []
 
         cleaned = text.strip()
-        char_count = len(cleaned)
-        sentences = self._split_sentences(cleaned)
-        sentence_count = max(len(sentences), 1)
+        # 字数、句数、段落数与术语密度一次扫描算出（句子以句末标点或换行结束）
+        stats = text_stats(cleaned)
+        char_count = stats["chars"]
+        sentence_count = max(stats["sentences"], 1)
         avg_sentence_length = round(char_count / sentence_count, 2)
-        paragraph_count = max(len([p for p in cleaned.splitlines() if p.strip()]), 1)
+        paragraph_count = max(stats["paragraphs"], 1)
 
         metrics["character_count"] = char_count
         metrics["sentence_count"] = sentence_count
         metrics["avg_sentence_length"] = avg_sentence_length
         metrics["paragraph_count"] = paragraph_count
 
-        term_density = self._estimate_term_density(cleaned)
+        term_density = stats["term_density"]
         metrics["term_density_estimate"] = term_density
 
         if audience:
@@ -85,27 +86,6 @@ class DiagnosticEvaluator:
             "issues": issues
         }
 
-    def _split_sentences(self, text: str) -> List[str]:
-        parts = []
-        buff = ""
-        for ch in text:
-            buff += ch
-            if ch in "。！？!?\n":
-                if buff.strip():
-                    parts.append(buff.strip())
-                buff = ""
-        if buff.strip():
-            parts.append(buff.strip())
-        return parts
-
-    def _estimate_term_density(self, text: str) -> float:
-        word_like = re.findall(r"[A-Za-z]+|\\d+|[\\u4e00-\\u9fff]+", text)
-        if not word_like:
-            return 0.0
-
-        term_candidates = re.findall(r"[A-Za-z]{3,}|\\d+|[\\u4e00-\\u9fff]{4,}", text)
-        return round(len(term_candidates) / max(len(word_like), 1), 4)
-
 
 _evaluator: DiagnosticEvaluator | None = None
 
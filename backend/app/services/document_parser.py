@@ -3,40 +3,145 @@
 负责解析各种格式的著作文件，提取结构化内容
 """
 import re
-from collections import Counter
+import json
+import asyncio
+import hashlib
+import time
+from bisect import bisect_right
+from importlib.util import find_spec
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Callable, Iterable, Iterator, Optional, List, Dict
 from loguru import logger
 import uuid
 
 from app.models.book import Book, Chapter, CoreViewpoint
 from app.utils.text_processor import get_text_processor
 from app.utils.file_handler import get_file_handler
-
-# 尝试导入文档解析库
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+from app.utils.epub_reader import EpubReader
+from app.utils.txt_reader import TxtReader, FALLBACK_ENCODING
+from app.utils.line_pipeline import ParagraphReflow, RepeatedLineFilter, iter_text_lines, trim_blank_lines
+from app.utils.pdf_extractor import PDFPLUMBER_AVAILABLE, extract_pdf_pages, read_pdf_outline, select_outline_level
+from app.utils.aho_corasick import AhoCorasick
+from app.utils.parse_cache import get_parse_cache
+from app.utils.segmenter import segment_batch
+from app.utils.custom_dict import get_custom_dictionary, texts_containing
+from app.utils.token_store import BookTokenStore, get_token_store_cache
+from app.utils.tfidf import BookTfidf, get_tfidf_cache
+from app.utils.text_stats import compute_text_stats, summarize_text_stats
+from app.utils.near_duplicates import cluster_near_duplicates
+from app.utils.config import settings
+
+# 文档解析库在解析对应格式时才导入，启动时只检测是否安装
+if not PDFPLUMBER_AVAILABLE:
     logger.warning("⚠️  pdfplumber未安装，PDF解析功能不可用")
 
-try:
-    import ebooklib
-    from ebooklib import epub
-    EBOOKLIB_AVAILABLE = True
-except ImportError:
-    EBOOKLIB_AVAILABLE = False
-    logger.warning("⚠️  ebooklib未安装，EPUB解析功能不可用")
-
-try:
-    import docx
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+DOCX_AVAILABLE = find_spec("docx") is not None
+if not DOCX_AVAILABLE:
     logger.warning("⚠️  python-docx未安装，DOCX解析功能不可用")
 
 
+# 解析器版本：清洗、章节识别、观点提取等会改变解析结果的逻辑调整后需递增，使解析缓存失效
+PARSER_VERSION = 20
+
+# 已知书籍的章节列表
+KNOWN_BOOK_CHAPTERS = {
+    '乡土中国': [
+        '乡土本色',
+        '文字下乡',
+        '再论文字下乡',
+        '差序格局',
+        '系维着私人的道德',
+        '家族',
+        '男女有别',
+        '礼治秩序',
+        '无讼',
+        '无为政治',
+        '长老统治',
+        '血缘和地缘',
+        '名实的分离',
+        '从欲望到需要'
+    ],
+    '论语': [
+        '学而',
+        '为政',
+        '八佾',
+        '里仁',
+        '公冶长',
+        '雍也',
+        '述而',
+        '泰伯',
+        '子罕',
+        '乡党',
+        '先进',
+        '颜渊',
+        '子路',
+        '宪问',
+        '卫灵公',
+        '季氏',
+        '阳货',
+        '微子',
+        '子张',
+        '尧曰'
+    ]
+}
+
+# 常见章节标题模式
+CHAPTER_PATTERNS = [
+    r'^第【\d+】段.*',  # "第【X】段：Y卷"（理想国格式）
+    r'^第[一二三四五六七八九十百零\d]+章\s*',  # "第X章"
+    r'^第[一二三四五六七八九十百零\d]+卷\s*',  # "第X卷"
+    r'^第[一二三四五六七八九十百零\d]+篇\s*',  # "第X篇"（论语格式）
+    r'^[\u4e00-\u9fff]{1,3}第[一二三四五六七八九十百零\d]+[卷篇章期]\s*',  # "学而第一卷"、"为政第二篇"（必须以卷/篇/章/期结尾）
+    r'^[\u4e00-\u9fff]{1,3}第\d+[卷篇章期]\s*',  # "公冶长第五卷"、"先进第十一篇"（必须以卷/篇/章/期结尾）
+    r'^Chapter\s*\d+',  # "Chapter X"
+    r'^(Chapter|CHAPTER)\s+[IVXLC]+',  # "CHAPTER IV"
+    r'^(Part|PART)\s+\d+',  # "Part 1"
+    r'^(Part|PART)\s+[IVXLC]+',  # "PART II"
+    r'^第[一二三四五六七八九十百零\d]+节\s*',  # "第X节"
+    r'^[一二三四五六七八九十百零\d]+\.\s',  # "一. "、"1. "
+    r'^[一二三四五六七八九十百零]+、\s',  # "一、"、"二、"
+]
+
+# 预编译的行扫描模式：所有标题模式合并为一个交替表达式，每行只匹配一次
+_HEADING_PATTERN = re.compile('|'.join(f'(?:{pattern})' for pattern in CHAPTER_PATTERNS))
+_NOISE_LINE_PATTERN = re.compile(
+    r'^[①②③④⑤⑥⑦⑧⑨⑩\[\d]]'
+    r'|^\d+$'
+    r'|^-?\s*\d+\s*-?$'
+    r'|^第?\s*\d+\s*页$'
+    r'|^(注|按|又按|译注|校注|说明)[：:]?'
+)
+_CITATION_PATTERN = re.compile(r'《.+》.*(卷|节|篇|页)')
+_STRUCTURE_KEYWORD_PATTERN = re.compile(r'(章|卷|篇|节|Chapter|CHAPTER|Part|PART)')
+_FOOTNOTE_MARK_PATTERN = re.compile(r'^[①②③④⑤⑥⑦⑧⑨⑩]')
+_NUMBERED_HEADING_PATTERN = re.compile(r'^第[一二三四五六七八九十百零\d]+(卷|章|篇|节)')
+_TITLE_NOISE_PATTERN = re.compile(r'[\s\u3000·•\-—―–:：.。章节卷篇第]+')
+_MAJOR_ORDINAL_PATTERN = re.compile(r'^第[一二三四五六七八九十百零]+、')
+_MAJOR_NAMED_PATTERN = re.compile(r'^[\u4e00-\u9fff]{1,3}第[\u4e00-\u9fff一二三四五六七八九十百零\d]+')  # "学而第一"
+_MAJOR_SUFFIX_PATTERN = re.compile(r'第[一二三四五六七八九十百零\d]+$')  # "公冶长第五"
+
+
+def _normalize_title(raw: str) -> str:
+    """归一化标题：去掉空白、标点、章节卷篇与"第"字"""
+    if not raw:
+        return ""
+    return _TITLE_NOISE_PATTERN.sub('', raw)
+
+
+def _build_known_title_automaton() -> AhoCorasick:
+    """把所有已知书籍的归一化章节名放入同一个自动机，值为 (书名, 顺序, 原标题)"""
+    automaton = AhoCorasick()
+    for book_name, chapter_titles in KNOWN_BOOK_CHAPTERS.items():
+        normalized_targets = {_normalize_title(t): t for t in chapter_titles}
+        for order, (normalized, original) in enumerate(normalized_targets.items()):
+            automaton.add(normalized, (book_name, order, original))
+    automaton.build()
+    return automaton
+
+
+_KNOWN_TITLE_AUTOMATON = _build_known_title_automaton()
+
+
 class DocumentParser:
     """
     文档解析服务
@@ -52,13 +157,46 @@ class DocumentParser:
         """初始化文档解析器"""
         self.text_processor = get_text_processor()
         self.file_handler = get_file_handler()
+        self.parse_cache = get_parse_cache()
+        self.token_store_cache = get_token_store_cache()
+        self.tfidf_cache = get_tfidf_cache()
+        self.custom_dictionary = get_custom_dictionary()
+        self.cache_version = self._compute_cache_version()
+
+        # 清理旧版本解析器留下的缓存
+        removed = self.parse_cache.invalidate(keep_version=self.cache_version)
+        removed += self.token_store_cache.invalidate(keep_version=self.cache_version)
+        removed += self.tfidf_cache.invalidate(keep_version=self.cache_version)
+        if removed:
+            logger.info(f"🧹 清理过期解析缓存 {removed} 条")
         logger.info("✅ 文档解析服务初始化成功")
 
+    def _compute_cache_version(self) -> str:
+        """
+        解析缓存版本指纹
+
+        由解析器版本、章节模式表、已知书籍章节表和影响提取结果的配置共同决定，
+        任一变化都会使旧缓存失效
+        """
+        fingerprint = json.dumps(
+            [
+                PARSER_VERSION, CHAPTER_PATTERNS, KNOWN_BOOK_CHAPTERS, settings.pdf_fast_path,
+                self.text_processor.spacy_sentence_split,
+                self.custom_dictionary.enabled, self.custom_dictionary.domain_words(),
+                settings.near_dup_enabled, settings.near_dup_max_distance, settings.near_dup_min_chars
+            ],
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return f"v{PARSER_VERSION}-{hashlib.md5(fingerprint.encode('utf-8')).hexdigest()[:8]}"
+
     async def parse_book(
         self,
         file_path: str,
         title: Optional[str] = None,
-        author: Optional[str] = None
+        author: Optional[str] = None,
+        use_cache: bool = True,
+        file_hash: Optional[str] = None
     ) -> Book:
         """
         解析著作文件
@@ -67,6 +205,8 @@ class DocumentParser:
             file_path: 文件路径
             title: 著作标题（可选，从文件名提取）
             author: 作者（可选）
+            use_cache: 是否读取解析缓存（False时强制重新解析并刷新缓存）
+            file_hash: 文件内容MD5（上传时已计算则传入，避免重复读取文件）
 
         返回:
             Book对象
@@ -74,142 +214,456 @@ class DocumentParser:
         logger.info(f"📖 开始解析著作: {file_path}")
 
         # 获取文件信息
-        file_info = self.file_handler.get_file_info(file_path)
+        file_info = self.file_handler.get_file_info(file_path, with_hash=file_hash is None)
         if not file_info:
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
+        # 同一内容、同一解析器版本直接复用缓存结果
+        file_hash = file_hash or file_info['hash']
+        if use_cache:
+            cached = self.parse_cache.get(file_hash, self.cache_version)
+            if cached:
+                book = self._book_from_cache(cached, file_path, file_hash, title, author)
+                logger.info(f"⚡ 命中解析缓存: {book.title}（{len(book.chapters)} 章）")
+                return book
+
         # 确定文件类型
         file_ext = file_info['extension']
 
-        # 提取文本内容
+        # 提取文本内容（行流水线：提取 -> 清洗 -> 重复行过滤，逐行流过各阶段）
+        extraction_stats: Dict = {}
+        pdf_pages: List[str] = []
+        chapters: List[Chapter] = []
+        chapter_stats: Dict = {}
         if file_ext == 'pdf':
-            text = await self._parse_pdf(file_path)
+            pdf_pages, extraction_stats = await self._parse_pdf(file_path)
+            lines, raw_stats = await asyncio.to_thread(self._run_line_pipeline, lambda: iter_text_lines(pdf_pages))
         elif file_ext == 'epub':
-            text = await self._parse_epub(file_path)
+            # EPUB的章节边界直接来自目录，流式逐章清洗，不再拼接全文做标题扫描
+            chapters, chapter_stats, extraction_stats = await self._parse_epub(file_path)
+            lines = None
+            raw_stats = extraction_stats
         elif file_ext == 'txt':
-            text = await self._parse_txt(file_path)
+            lines, extraction_stats = await self._parse_txt(file_path)
+            raw_stats = extraction_stats
         elif file_ext == 'docx':
-            text = await self._parse_docx(file_path)
+            paragraphs = await self._parse_docx(file_path)
+            lines, raw_stats = await asyncio.to_thread(self._run_line_pipeline, lambda: iter_text_lines(paragraphs))
         else:
             raise ValueError(f"不支持的文件格式: {file_ext}")
 
-        raw_text = text
-        logger.info(f"✅ 文本提取完成，总字数: {len(text)}")
+        if lines is None:
+            logger.info(f"✅ 按目录提取 {len(chapters)} 个章节")
+        else:
+            logger.info(f"✅ 文本提取与清洗完成，原始字数: {raw_stats['raw_chars']}，清洗后 {len(lines)} 行")
+
+            # 识别章节（PDF优先使用书签目录，无书签时再走标题评分）
+            logger.info("📚 开始识别章节结构...")
+            if pdf_pages:
+                chapters, chapter_stats = await self._segment_by_pdf_outline(file_path, pdf_pages)
+            if not chapters:
+                chapters, chapter_stats = self._identify_chapters(lines, file_ext, title or Path(file_path).stem)
+            logger.info(f"✅ 识别到 {len(chapters)} 个章节")
+
+        # 折行合并为段落（PDF按版心折行的行），之后的分句、偏移与证据段落都基于重排后的正文
+        reflow_stats = await asyncio.to_thread(self._reflow_chapters, chapters)
 
-        # 清洗文本
-        logger.info("🧹 开始清洗文本...")
-        text = self.text_processor.clean_text(text)
-        text = self.text_processor.remove_redundant_info(text)
-        text = self._remove_repeated_lines(text)
-        cleaned_lines = [line for line in text.split('\n') if line.strip()]
-        raw_lines = [line for line in raw_text.split('\n') if line.strip()]
-        logger.info(f"✅ 文本清洗完成，清洗后字数: {len(text)}")
+        # 各章文本统计一次算出，随章节入库，列表/详情接口直接读取；全书字数、语言由各章统计汇总
+        chapter_text_stats = await asyncio.to_thread(compute_text_stats, [chapter.content for chapter in chapters])
+        for chapter, stats in zip(chapters, chapter_text_stats):
+            chapter.text_stats = stats
+        profile = summarize_text_stats(chapter_text_stats)
+        logger.info(f"✅ 清洗后字数: {profile['chars']}")
 
-        # 识别章节
-        logger.info("📚 开始识别章节结构...")
-        chapters, chapter_stats = self._identify_chapters(text, file_ext, title or Path(file_path).stem)
-        logger.info(f"✅ 识别到 {len(chapters)} 个章节")
+        # 全书分词一次并建立TF-IDF模型，核心观点及后续证据构建、诊断等环节共用
+        token_store, nlp_stats = await self.build_token_store(chapters, file_hash)
+        tfidf = await asyncio.to_thread(self.text_processor.build_tfidf_model, token_store)
+        self.token_store_cache.put(file_hash, self.cache_version, token_store)
+        self.tfidf_cache.put(file_hash, self.cache_version, tfidf)
 
         # 提取核心观点
         logger.info("💡 开始提取核心观点...")
-        core_viewpoints = await self._extract_core_viewpoints(chapters)
-        logger.info(f"✅ 提取到 {len(core_viewpoints)} 个核心观点")
+        core_viewpoints = await self._extract_core_viewpoints(chapters, token_store, tfidf)
+        merged_viewpoints = sum(len(viewpoint.duplicates) for viewpoint in core_viewpoints)
+        logger.info(f"✅ 提取到 {len(core_viewpoints)} 个核心观点（合并近似重复 {merged_viewpoints} 个）")
 
         # 创建Book对象
         parse_stats = {
-            "raw_chars": len(raw_text),
-            "cleaned_chars": len(text),
-            "raw_lines": len(raw_lines),
-            "cleaned_lines": len(cleaned_lines),
+            "raw_chars": raw_stats["raw_chars"],
+            "cleaned_chars": profile["chars"],
+            "raw_lines": raw_stats["raw_lines"],
+            "cleaned_lines": profile["lines"],
             "chapters_detected": len(chapters),
-            "chapter_detection": chapter_stats
+            "chapter_detection": chapter_stats,
+            "reflow": reflow_stats,
+            "tokens": token_store.stats(),
+            "nlp": nlp_stats,
+            "near_duplicates": {"viewpoints": merged_viewpoints}
         }
+        if extraction_stats:
+            parse_stats["extraction"] = extraction_stats
 
         book = Book(
             book_id=str(uuid.uuid4()),
             title=title or Path(file_path).stem,
             author=author or "未知作者",
-            language=self.text_processor.detect_language(text),
+            language=profile["language"],
             file_path=file_path,
             file_type=file_ext,
+            file_hash=file_hash,
             chapters=chapters,
             core_viewpoints=core_viewpoints,
-            total_words=self.text_processor.count_words(text),
+            total_words=profile["words"],
             parse_stats=parse_stats
         )
 
+        self.parse_cache.put(file_hash, self.cache_version, self._book_to_cache(book))
+        book.parse_stats["cache"] = {"hit": False, "version": self.cache_version}
+
         logger.info(f"🎉 著作解析完成: {book.title}")
         return book
 
-    async def _parse_pdf(self, file_path: str) -> str:
-        """解析PDF文件"""
+    def _reflow_chapters(self, chapters: List[Chapter]) -> Dict:
+        """
+        段落重排：按全书行宽估计版心，把各章折行合并为真实段落（原地修改章节正文）
+
+        返回:
+            重排统计（见ParagraphReflow.stats）
+        """
+        reflow = ParagraphReflow()
+        reflow.consume(line for chapter in chapters for line in chapter.content.split('\n'))
+        for chapter in chapters:
+            chapter.content = "\n".join(reflow.reflow(chapter.content.split('\n')))
+        stats = reflow.stats()
+        if stats["applied"]:
+            logger.info(
+                f"✅ 段落重排: {stats['lines']} 行 -> {stats['paragraphs']} 段"
+                f"（版心宽度 {stats['wrap_width']}，合并比例 {stats['merge_ratio']:.1%}）"
+            )
+        return stats
+
+    def _book_to_cache(self, book: Book) -> Dict:
+        """
+        把解析结果转为紧凑的缓存结构
+
+        章节/观点按位置存为数组，不保存ID（命中时重新生成）；观点通过章节下标关联
+        """
+        chapter_index = {chapter.chapter_id: index for index, chapter in enumerate(book.chapters)}
+        return {
+            "file_type": book.file_type,
+            "language": book.language,
+            "total_words": book.total_words,
+            "parse_stats": book.parse_stats,
+            "chapters": [
+                [chapter.chapter_number, chapter.title, chapter.content, chapter.page_range, chapter.text_stats]
+                for chapter in book.chapters
+            ],
+            "viewpoints": [
+                [
+                    chapter_index[viewpoint.chapter_id],
+                    viewpoint.content,
+                    None if viewpoint.original_text == viewpoint.content else viewpoint.original_text,
+                    viewpoint.context,
+                    viewpoint.keywords,
+                    [chapter_index[duplicate["chapter_id"]] for duplicate in viewpoint.duplicates],
+                    viewpoint.start_offset
+                ]
+                for viewpoint in book.core_viewpoints
+                if viewpoint.chapter_id in chapter_index
+            ]
+        }
+
+    def _book_from_cache(
+        self,
+        cached: Dict,
+        file_path: str,
+        file_hash: str,
+        title: Optional[str],
+        author: Optional[str]
+    ) -> Book:
+        """从缓存结构还原Book（书、章节、观点都分配新的ID，避免与已入库的记录冲突）"""
+        chapters = [
+            Chapter(
+                chapter_id=str(uuid.uuid4()),
+                chapter_number=chapter_number,
+                title=chapter_title,
+                content=content,
+                page_range=page_range,
+                text_stats=text_stats
+            )
+            for chapter_number, chapter_title, content, page_range, text_stats in cached["chapters"]
+        ]
+        core_viewpoints = [
+            CoreViewpoint(
+                viewpoint_id=str(uuid.uuid4()),
+                content=content,
+                original_text=content if original_text is None else original_text,
+                chapter_id=chapters[chapter_index].chapter_id,
+                context=context,
+                keywords=keywords,
+                duplicates=[{"chapter_id": chapters[index].chapter_id} for index in duplicates],
+                start_offset=start_offset,
+                end_offset=None if start_offset is None else start_offset + len(content if original_text is None else original_text)
+            )
+            for chapter_index, content, original_text, context, keywords, duplicates, start_offset in cached["viewpoints"]
+        ]
+        parse_stats = dict(cached["parse_stats"])
+        parse_stats["cache"] = {"hit": True, "version": self.cache_version}
+
+        return Book(
+            book_id=str(uuid.uuid4()),
+            title=title or Path(file_path).stem,
+            author=author or "未知作者",
+            language=cached["language"],
+            file_path=file_path,
+            file_type=cached["file_type"],
+            file_hash=file_hash,
+            chapters=chapters,
+            core_viewpoints=core_viewpoints,
+            total_words=cached["total_words"],
+            parse_stats=parse_stats
+        )
+
+    async def _parse_pdf(self, file_path: str) -> tuple[List[str], Dict]:
+        """
+        解析PDF文件
+
+        按页区间分片并行提取，返回按页序排列的页面文本；
+        优先走PyPDF2快速层，仅对质量不达标的页面调用pdfplumber
+        """
         if not PDFPLUMBER_AVAILABLE:
             raise ImportError("pdfplumber未安装，无法解析PDF文件")
 
-        text = ""
         try:
-            with pdfplumber.open(file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n\n"
-
-                    if page_num % 10 == 0:
-                        logger.debug(f"  已处理 {page_num + 1}/{len(pdf.pages)} 页")
-
+            pages, stats = await extract_pdf_pages(
+                file_path,
+                workers=settings.pdf_parse_workers,
+                pages_per_shard=settings.pdf_pages_per_shard,
+                fast_path=settings.pdf_fast_path
+            )
         except Exception as e:
             logger.error(f"❌ PDF解析失败: {e}")
             raise
 
-        return text
+        logger.debug(
+            f"  PDF提取完成: {stats['pages']} 页, 模式={stats['mode']}, "
+            f"进程数={stats['workers']}, 分层={stats['tiers']}, 耗时 {stats['elapsed_seconds']}s"
+        )
+        return pages, stats
 
-    async def _parse_epub(self, file_path: str) -> str:
-        """解析EPUB文件"""
-        if not EBOOKLIB_AVAILABLE:
-            raise ImportError("ebooklib未安装，无法解析EPUB文件")
+    async def _segment_by_pdf_outline(self, file_path: str, pages: List[str]) -> tuple[List[Chapter], Dict]:
+        """
+        按PDF书签目录切分章节
 
-        try:
-            book = epub.read_epub(file_path)
-            text = ""
-
-            # 获取所有章节
-            for item in book.get_items():
-                if item.get_type() == ebooklib.ITEM_DOCUMENT:
-                    # 提取HTML内容
-                    content = item.get_content()
-                    # 简单的HTML标签去除
-                    content = re.sub(r'<[^>]+>', '\n', content.decode('utf-8'))
-                    text += content + "\n\n"
+        书签给出每章的起始页；在页内定位标题行，把相邻两章标题之间的内容作为正文，
+        并填充Chapter.page_range。没有可用书签时返回空列表，由调用方回退到标题评分。
+        """
+        entries = select_outline_level(await asyncio.to_thread(read_pdf_outline, file_path))
+        entries = [entry for entry in entries if entry["page"] < len(pages)]
+        if len(entries) < 2:
+            return [], {}
+
+        # 逐页清洗（页眉页脚按全书统计），保证页边界在清洗后仍然可用
+        repeated = RepeatedLineFilter()
+        repeated.consume(
+            line for page_text in pages
+            for line in self.text_processor.iter_clean_lines(page_text.split('\n'))
+        )
+        cleaned_pages = [
+            "\n".join(trim_blank_lines(repeated.filter(self.text_processor.iter_clean_lines(page_text.split('\n')))))
+            for page_text in pages
+        ]
+
+        # 全书拼接后的页起始偏移
+        page_starts = []
+        offset = 0
+        for page_text in cleaned_pages:
+            page_starts.append(offset)
+            offset += len(page_text) + 1
+        full_text = "\n".join(cleaned_pages)
+
+        # 每章标题在全书中的 (标题行起点, 正文起点)
+        anchors = []
+        titles_located = 0
+        for entry in entries:
+            page_start = page_starts[entry["page"]]
+            located = self._locate_title_line(cleaned_pages[entry["page"]], entry["title"])
+            if located:
+                titles_located += 1
+                anchors.append((page_start + located[0], page_start + located[1]))
+            else:
+                anchors.append((page_start, page_start))
+
+        # 标题定位顺序异常时退回到页边界
+        if any(anchors[i][0] < anchors[i - 1][1] for i in range(1, len(anchors))):
+            anchors = [(page_starts[entry["page"]], page_starts[entry["page"]]) for entry in entries]
+
+        chapters = []
+        for i, entry in enumerate(entries):
+            content_start = anchors[i][1]
+            content_end = anchors[i + 1][0] if i + 1 < len(anchors) else len(full_text)
+            chapter_text = full_text[content_start:content_end].strip()
+            if not chapter_text:
+                continue
+
+            end_page = bisect_right(page_starts, max(content_end - 1, content_start)) - 1
+            chapters.append(Chapter(
+                chapter_id=str(uuid.uuid4()),
+                chapter_number=len(chapters) + 1,
+                title=entry["title"],
+                content=chapter_text,
+                page_range=f"{entry['page'] + 1}-{end_page + 1}"
+            ))
+
+        stats = {
+            "strategy": "pdf_outline",
+            "outline_entries": len(entries),
+            "titles_located": titles_located,
+            "known_book_hit": None,
+            "fallback": False
+        }
+        if chapters:
+            logger.info(f"✅ 使用PDF书签目录切分章节: {len(chapters)} 章")
+        return chapters, stats
 
+    def _locate_title_line(self, page_text: str, title: str) -> Optional[tuple[int, int]]:
+        """在页内查找书签标题所在行，返回 (行起点, 下一行起点)"""
+        target = re.sub(r'\s+', '', title)
+        if not target:
+            return None
+
+        offset = 0
+        for line in page_text.split('\n'):
+            normalized = re.sub(r'\s+', '', line)
+            if normalized == target or (
+                normalized.startswith(target) and len(normalized) <= len(target) + 8
+            ):
+                return offset, min(offset + len(line) + 1, len(page_text))
+            offset += len(line) + 1
+        return None
+
+    async def _parse_epub(self, file_path: str) -> tuple[List[Chapter], Dict, Dict]:
+        """
+        解析EPUB文件
+
+        按spine顺序流式读取，使用nav/NCX目录确定章节标题与边界，逐章清洗
+
+        返回:
+            (章节列表, 章节识别统计, 提取统计)
+        """
+        try:
+            return await asyncio.to_thread(self._collect_epub_chapters, file_path)
         except Exception as e:
             logger.error(f"❌ EPUB解析失败: {e}")
             raise
 
-        return text
+    def _collect_epub_chapters(self, file_path: str) -> tuple[List[Chapter], Dict, Dict]:
+        """消费EPUB章节流，逐章清洗并构建Chapter对象"""
+        reader = EpubReader(file_path)
+        chapters: List[Chapter] = []
+        raw_chars = 0
+        raw_lines = 0
+
+        for chapter_title, raw_content in reader.iter_chapters():
+            raw_chars += len(raw_content)
+            raw_lines += sum(1 for line in raw_content.split('\n') if line.strip())
+
+            content = self.text_processor.clean_text(raw_content)
+            content = self.text_processor.remove_redundant_info(content)
+            if not content:
+                continue
+            chapters.append(Chapter(
+                chapter_id=str(uuid.uuid4()),
+                chapter_number=len(chapters) + 1,
+                title=chapter_title,
+                content=content,
+                page_range=None
+            ))
+
+        chapter_stats = {
+            "strategy": f"epub_{reader.stats['toc_source']}" if reader.stats["toc_source"] else "epub_spine",
+            "toc_entries": reader.stats["toc_entries"],
+            "known_book_hit": None,
+            "fallback": False
+        }
+        extraction_stats = {
+            "spine_documents": reader.stats["spine_documents"],
+            "raw_chars": raw_chars,
+            "raw_lines": raw_lines
+        }
+        return chapters, chapter_stats, extraction_stats
+
+    async def _parse_txt(self, file_path: str) -> tuple[List[str], Dict]:
+        """
+        解析TXT文件
+
+        内存映射后分块解码，解码出的行直接流入行流水线，不生成整份原文字符串；
+        清洗后的行仍整体收集为列表交给章节识别
 
-    async def _parse_txt(self, file_path: str) -> str:
-        """解析TXT文件"""
+        返回:
+            (清洗后的行列表, 提取统计)
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-        except UnicodeDecodeError:
-            # 尝试其他编码
-            try:
-                with open(file_path, 'r', encoding='gbk') as f:
-                    text = f.read()
-            except:
-                raise ValueError("无法解码文件，请确保文件编码为UTF-8或GBK")
+            return await asyncio.to_thread(self._read_txt_lines, file_path)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"❌ TXT解析失败: {e}")
             raise
 
-        return text
+    def _read_txt_lines(self, file_path: str) -> tuple[List[str], Dict]:
+        """按检测到的编码读取TXT，解码失败时以GB18030重读一次"""
+        reader = TxtReader(file_path, chunk_size=settings.txt_chunk_size)
+        try:
+            lines, _ = self._run_line_pipeline(reader.iter_lines)
+        except UnicodeDecodeError:
+            if reader.encoding == FALLBACK_ENCODING:
+                raise ValueError("无法解码文件，请确保文件编码为UTF-8或GBK")
+            logger.warning(f"⚠️  按{reader.encoding}解码失败，改用{FALLBACK_ENCODING}重新读取")
+            reader = TxtReader(file_path, chunk_size=settings.txt_chunk_size, encoding=FALLBACK_ENCODING)
+            try:
+                lines, _ = self._run_line_pipeline(reader.iter_lines)
+            except UnicodeDecodeError:
+                raise ValueError("无法解码文件，请确保文件编码为UTF-8或GBK")
 
-    async def _parse_docx(self, file_path: str) -> str:
-        """解析DOCX文件"""
+        return lines, dict(reader.stats)
+
+    def _run_line_pipeline(self, make_source: Callable[[], Iterable[str]]) -> tuple[List[str], Dict]:
+        """
+        行流水线：提取 -> 清洗 -> 重复行过滤 -> 去首尾空行
+
+        重复页眉页脚需要全书行频，因此源会被读取两遍：第一遍清洗后只计数，
+        第二遍清洗、过滤后输出。两遍都逐行流过，不生成整份原始文本；
+        但章节识别需要对全书行做标题扫描，输出收集为列表，
+        峰值内存仍与清洗后的全文大小成正比
+
+        参数:
+            make_source: 每次调用返回一个新的原始行迭代器
+
+        返回:
+            (清洗后的行列表, {"raw_chars": 原始字符数, "raw_lines": 原始非空行数})
+        """
+        raw_stats = {"raw_chars": 0, "raw_lines": 0}
+
+        def observe_raw(lines: Iterable[str]) -> Iterator[str]:
+            for line in lines:
+                raw_stats["raw_chars"] += len(line) + 1
+                if line.strip():
+                    raw_stats["raw_lines"] += 1
+                yield line
+
+        repeated = RepeatedLineFilter()
+        repeated.consume(self.text_processor.iter_clean_lines(observe_raw(make_source())))
+        lines = list(trim_blank_lines(repeated.filter(self.text_processor.iter_clean_lines(make_source()))))
+        return lines, raw_stats
+
+    async def _parse_docx(self, file_path: str) -> List[str]:
+        """解析DOCX文件，返回非空段落列表"""
         if not DOCX_AVAILABLE:
             raise ImportError("python-docx未安装，无法解析DOCX文件")
 
+        import docx
+
         try:
             doc = docx.Document(file_path)
             paragraphs = []
@@ -217,49 +671,12 @@ class DocumentParser:
                 content = paragraph.text.strip()
                 if content:
                     paragraphs.append(content)
-            return "\n\n".join(paragraphs)
+            return paragraphs
         except Exception as e:
             logger.error(f"❌ DOCX解析失败: {e}")
             raise
 
-    def _remove_repeated_lines(self, text: str) -> str:
-        """移除重复页眉页脚等噪音行"""
-        if not text:
-            return text
-
-        lines = [line.strip() for line in text.split('\n')]
-        total = len(lines)
-        counts = Counter([line for line in lines if line])
-
-        def is_noise(line: str) -> bool:
-            if not line:
-                return False
-            if re.match(r'^\d+$', line):
-                return True
-            if re.match(r'^-?\s*\d+\s*-?$', line):
-                return True
-            if re.match(r'^第?\s*\d+\s*页$', line):
-                return True
-            if re.match(r'^[IVXLCM]+$', line):
-                return True
-            if re.match(r'^[\W_]+$', line):
-                return True
-            return False
-
-        filtered = []
-        for line in lines:
-            if not line:
-                filtered.append("")
-                continue
-            if is_noise(line):
-                continue
-            if len(line) <= 30 and counts[line] >= 3 and (counts[line] / max(total, 1)) >= 0.05:
-                continue
-            filtered.append(line)
-
-        return "\n".join(filtered).strip()
-
-    def _identify_chapters(self, text: str, file_type: str, book_title: Optional[str] = None) -> tuple[List[Chapter], Dict]:
+    def _identify_chapters(self, lines: List[str], file_type: str, book_title: Optional[str] = None) -> tuple[List[Chapter], Dict]:
         """
         识别章节结构
 
@@ -268,196 +685,26 @@ class DocumentParser:
         2. 尝试匹配已知书籍的章节列表（如《乡土中国》）
         3. 按章节分割文本
         4. 为每个章节创建Chapter对象
+
+        策略1与策略2在同一次逐行扫描中完成，见 _scan_chapter_headings
+
+        参数:
+            lines: 行流水线输出的清洗后文本行
         """
         chapters = []
+        chapter_positions, known_book_hits, patterns_matched = self._scan_chapter_headings(lines)
         stats = {
             "strategy": "pattern",
-            "patterns_matched": 0,
+            "patterns_matched": patterns_matched,
             "known_book_hit": None,
             "fallback": False
         }
 
-        # 已知书籍的章节列表
-        known_book_chapters = {
-            '乡土中国': [
-                '乡土本色',
-                '文字下乡',
-                '再论文字下乡',
-                '差序格局',
-                '系维着私人的道德',
-                '家族',
-                '男女有别',
-                '礼治秩序',
-                '无讼',
-                '无为政治',
-                '长老统治',
-                '血缘和地缘',
-                '名实的分离',
-                '从欲望到需要'
-            ],
-            '论语': [
-                '学而',
-                '为政',
-                '八佾',
-                '里仁',
-                '公冶长',
-                '雍也',
-                '述而',
-                '泰伯',
-                '子罕',
-                '乡党',
-                '先进',
-                '颜渊',
-                '子路',
-                '宪问',
-                '卫灵公',
-                '季氏',
-                '阳货',
-                '微子',
-                '子张',
-                '尧曰'
-            ]
-        }
-
-        chapter_patterns = [
-            r'^第【\d+】段.*',  # "第【X】段：Y卷"（理想国格式）
-            r'^第[一二三四五六七八九十百零\d]+章\s*',  # "第X章"
-            r'^第[一二三四五六七八九十百零\d]+卷\s*',  # "第X卷"
-            r'^第[一二三四五六七八九十百零\d]+篇\s*',  # "第X篇"（论语格式）
-            r'^[\u4e00-\u9fff]{1,3}第[一二三四五六七八九十百零\d]+[卷篇章期]\s*',  # "学而第一卷"、"为政第二篇"（必须以卷/篇/章/期结尾）
-            r'^[\u4e00-\u9fff]{1,3}第\d+[卷篇章期]\s*',  # "公冶长第五卷"、"先进第十一篇"（必须以卷/篇/章/期结尾）
-            r'^Chapter\s*\d+',  # "Chapter X"
-            r'^(Chapter|CHAPTER)\s+[IVXLC]+',  # "CHAPTER IV"
-            r'^(Part|PART)\s+\d+',  # "Part 1"
-            r'^(Part|PART)\s+[IVXLC]+',  # "PART II"
-            r'^第[一二三四五六七八九十百零\d]+节\s*',  # "第X节"
-            r'^[一二三四五六七八九十百零\d]+\.\s',  # "一. "、"1. "
-            r'^[一二三四五六七八九十百零]+、\s',  # "一、"、"二、"
-        ]
-
-        def normalize_title(raw: str) -> str:
-            if not raw:
-                return ""
-            cleaned = re.sub(r'[\s\u3000]+', '', raw)
-            cleaned = re.sub(r'[·•\-\—\―\–\:\：\.\。]', '', cleaned)
-            cleaned = re.sub(r'[章节卷篇]', '', cleaned)
-            cleaned = cleaned.replace('第', '')
-            return cleaned
-
-        # 查找所有章节标题位置
-        chapter_positions = []
-        lines = text.split('\n')
-
-        def is_noise_line(line: str) -> bool:
-            if not line:
-                return True
-            if re.match(r'^[①②③④⑤⑥⑦⑧⑨⑩\[\d]]', line):
-                return True
-            if re.match(r'^\d+$', line):
-                return True
-            if re.match(r'^-?\s*\d+\s*-?$', line):
-                return True
-            if re.match(r'^第?\s*\d+\s*页$', line):
-                return True
-            if re.match(r'^(注|按|又按|译注|校注|说明)[：:]?', line):
-                return True
-            if line.startswith("参见") or line.startswith("见"):
-                return True
-            if ("参见" in line or "见" in line) and "《" in line:
-                return True
-            # 引用型脚注（含卷/节/篇/页等细目）
-            if re.search(r'《.+》.*(卷|节|篇|页)', line):
-                return True
-            return False
-
-        # 策略1: 通用章节标题评分
-        for i, line in enumerate(lines):
-            stripped_line = line.strip()
-            if is_noise_line(stripped_line):
-                continue
-
-            score = 0
-            has_structure = False
-            # 行长度更像标题（短行）
-            if 1 <= len(stripped_line) <= 20:
-                score += 2
-            elif len(stripped_line) <= 30:
-                score += 1
-
-            # 常见标题模式
-            for pattern in chapter_patterns:
-                if re.match(pattern, stripped_line):
-                    score += 3
-                    has_structure = True
-                    break
-
-            # 章节关键词
-            if re.search(r'(章|卷|篇|节|Chapter|CHAPTER|Part|PART)', stripped_line):
-                score += 2
-                has_structure = True
-
-            # 前后空行（标题常独占行）
-            prev_line = lines[i - 1].strip() if i > 0 else ""
-            next_line = lines[i + 1].strip() if i + 1 < len(lines) else ""
-            if not prev_line:
-                score += 1
-            if not next_line:
-                score += 1
-
-            # 若缺少结构特征，提高阈值，避免脚注误判为章节
-            threshold = 4 if has_structure else 6
-            if score >= threshold:
-                title = stripped_line
-                # 进一步过滤脚注样式标题
-                if re.match(r'^[①②③④⑤⑥⑦⑧⑨⑩]', title):
-                    continue
-                if ("参见" in title or "见" in title) and "《" in title:
-                    continue
-                if re.search(r'《.+》.*(卷|节|篇|页)', title) and not re.match(r'^第[一二三四五六七八九十百零\d]+(卷|章|篇|节)', title):
-                    continue
-                if '第【' in title and '段：' in title:
-                    parts = title.split('：', 1)
-                    if len(parts) > 1:
-                        title = parts[1].strip()
-                chapter_positions.append({
-                    'line_num': i,
-                    'title': title,
-                    'content_start': i + 1
-                })
-                stats["patterns_matched"] += 1
-
-        # 策略2: 尝试匹配已知书籍的章节列表（通用辅助）
-        for book_name, chapters_list in known_book_chapters.items():
-            found_chapters = []
-            normalized_targets = {normalize_title(t): t for t in chapters_list}
-
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-                if not stripped:
-                    continue
-                normalized_line = normalize_title(stripped)
-                if normalized_line in normalized_targets:
-                    found_chapters.append({
-                        'line_num': i,
-                        'title': normalized_targets[normalized_line],
-                        'content_start': i + 1
-                    })
-                    continue
-
-                # 处理“学而第一/为政第二”等样式：前缀匹配章节名
-                for normalized_target, original_title in normalized_targets.items():
-                    if normalized_line.startswith(normalized_target) and len(normalized_line) <= len(normalized_target) + 4:
-                        found_chapters.append({
-                            'line_num': i,
-                            'title': original_title,
-                            'content_start': i + 1
-                        })
-                        break
-
-            # 如果找到至少一半章节，认为匹配成功
+        # 策略2: 已知书籍章节命中至少一半时，优先使用
+        for book_name, chapters_list in KNOWN_BOOK_CHAPTERS.items():
+            found_chapters = known_book_hits.get(book_name, [])
             threshold = max(3, len(chapters_list) // 2)
             if len(found_chapters) >= threshold:
-                found_chapters.sort(key=lambda x: x['line_num'])
                 chapter_positions = found_chapters
                 stats["strategy"] = "known_book"
                 stats["known_book_hit"] = book_name
@@ -469,7 +716,7 @@ class DocumentParser:
             logger.warning("⚠️  未检测到章节结构，按段落分割")
             stats["strategy"] = "fallback_paragraph"
             stats["fallback"] = True
-            paragraphs = self.text_processor.split_text_by_paragraph(text)
+            paragraphs = [line.strip() for line in lines if line.strip()]
 
             # 每10个段落合并为一章
             chunk_size = 10
@@ -501,9 +748,9 @@ class DocumentParser:
                     '章' in title or
                     '篇' in title or
                     'Chapter' in title.lower() or
-                    re.match(r'^第[一二三四五六七八九十百零]+、', title) or
-                    re.match(r'^[\u4e00-\u9fff]{1,3}第[\u4e00-\u9fff一二三四五六七八九十百零\d]+', title) or  # "学而第一"
-                    (re.search(r'第[一二三四五六七八九十百零\d]+$', title) and len(title) <= 5)  # "公冶长第五"
+                    _MAJOR_ORDINAL_PATTERN.match(title) or
+                    _MAJOR_NAMED_PATTERN.match(title) or  # "学而第一"
+                    (_MAJOR_SUFFIX_PATTERN.search(title) and len(title) <= 5)  # "公冶长第五"
                 )
 
                 if is_major:
@@ -572,9 +819,213 @@ class DocumentParser:
 
         return chapters, stats
 
+    def _scan_chapter_headings(self, lines: List[str]) -> tuple[List[Dict], Dict[str, List[Dict]], int]:
+        """
+        单次逐行扫描章节标题
+
+        每行只做一次strip/归一化：
+        - 通用标题评分：噪音行与标题模式均为预编译的合并表达式
+        - 已知书籍章节：归一化行沿自动机前缀匹配，同时覆盖所有已知书籍
+
+        返回:
+            (评分命中的标题位置, {书名: 命中的章节位置}, 评分命中数)
+        """
+        stripped_lines = [line.strip() for line in lines]
+        chapter_positions = []
+        known_book_hits: Dict[str, List[Dict]] = {book_name: [] for book_name in KNOWN_BOOK_CHAPTERS}
+        patterns_matched = 0
+        total_lines = len(stripped_lines)
+
+        for i, stripped_line in enumerate(stripped_lines):
+            if not stripped_line:
+                continue
+
+            # 策略2: 已知书籍章节（精确匹配优先，其次"学而第一"式前缀匹配，按章节列表顺序取第一个）
+            normalized_line = _normalize_title(stripped_line)
+            best_matches: Dict[str, tuple] = {}
+            for pattern_len, (book_name, order, original_title) in _KNOWN_TITLE_AUTOMATON.prefixes(normalized_line):
+                if pattern_len == len(normalized_line):
+                    rank = (0, order)
+                elif len(normalized_line) <= pattern_len + 4:
+                    rank = (1, order)
+                else:
+                    continue
+                if book_name not in best_matches or rank < best_matches[book_name][0]:
+                    best_matches[book_name] = (rank, original_title)
+            for book_name, (_, original_title) in best_matches.items():
+                known_book_hits[book_name].append({
+                    'line_num': i,
+                    'title': original_title,
+                    'content_start': i + 1
+                })
+
+            # 策略1: 通用章节标题评分
+            if self._is_noise_line(stripped_line):
+                continue
+
+            score = 0
+            has_structure = False
+            # 行长度更像标题（短行）
+            if len(stripped_line) <= 20:
+                score += 2
+            elif len(stripped_line) <= 30:
+                score += 1
+
+            # 常见标题模式
+            if _HEADING_PATTERN.match(stripped_line):
+                score += 3
+                has_structure = True
+
+            # 章节关键词
+            if _STRUCTURE_KEYWORD_PATTERN.search(stripped_line):
+                score += 2
+                has_structure = True
+
+            # 前后空行（标题常独占行）
+            if i == 0 or not stripped_lines[i - 1]:
+                score += 1
+            if i + 1 >= total_lines or not stripped_lines[i + 1]:
+                score += 1
+
+            # 若缺少结构特征，提高阈值，避免脚注误判为章节
+            threshold = 4 if has_structure else 6
+            if score < threshold:
+                continue
+
+            title = stripped_line
+            # 进一步过滤脚注样式标题
+            if _FOOTNOTE_MARK_PATTERN.match(title):
+                continue
+            if ("参见" in title or "见" in title) and "《" in title:
+                continue
+            if _CITATION_PATTERN.search(title) and not _NUMBERED_HEADING_PATTERN.match(title):
+                continue
+            if '第【' in title and '段：' in title:
+                parts = title.split('：', 1)
+                if len(parts) > 1:
+                    title = parts[1].strip()
+            chapter_positions.append({
+                'line_num': i,
+                'title': title,
+                'content_start': i + 1
+            })
+            patterns_matched += 1
+
+        return chapter_positions, known_book_hits, patterns_matched
+
+    def _is_noise_line(self, line: str) -> bool:
+        """判断是否为页码、脚注、引用注释等噪音行"""
+        if not line:
+            return True
+        if _NOISE_LINE_PATTERN.match(line):
+            return True
+        if line.startswith("参见") or line.startswith("见"):
+            return True
+        if ("参见" in line or "见" in line) and "《" in line:
+            return True
+        # 引用型脚注（含卷/节/篇/页等细目）
+        if _CITATION_PATTERN.search(line):
+            return True
+        return False
+
+    async def build_token_store(self, chapters: List, file_hash: Optional[str] = None) -> tuple[BookTokenStore, Dict]:
+        """
+        对整本书分句（句子索引）、批量分词，构建分词存储
+
+        开启自定义词典时，先用默认词典分词，再由章节标题、书籍概念词与高PMI词组合编译本书词典，
+        只对包含这些词的句子重新分词
+
+        参数:
+            chapters: 按章节顺序排列、带content属性的章节（Chapter或ChapterORM）
+            file_hash: 文件内容哈希（用于读取按书保存的概念词）
+
+        返回:
+            (分词存储, 分句与分词的耗时统计)
+        """
+        contents = [chapter.content or "" for chapter in chapters]
+        # 全书只分句一次（各章批量送入分句管线），句子以位置数组保存，文本按需切片
+        sentences, split_stats = await asyncio.to_thread(self.text_processor.build_sentence_index, contents)
+        logger.info(
+            f"✂️  分句完成: {sentences.num_sentences} 句，后端={split_stats['backend']}，"
+            f"分块={split_stats['chunks']}，进程数={split_stats['processes']}，耗时 {split_stats['seconds']}s"
+        )
+
+        # 整本书的句子一次性批量分词（多进程）
+        started = time.perf_counter()
+        texts = list(sentences.iter_texts(contents))
+        token_lists = await segment_batch(texts, workers=settings.nlp_workers)
+        store = await asyncio.to_thread(BookTokenStore.build, sentences, token_lists)
+        nlp_stats = {
+            "sentence_split": split_stats,
+            "segmentation_seconds": round(time.perf_counter() - started, 3)
+        }
+
+        if self.custom_dictionary.enabled:
+            started = time.perf_counter()
+            words = await asyncio.to_thread(
+                self.custom_dictionary.collect,
+                store, contents, [getattr(chapter, "title", "") for chapter in chapters], file_hash
+            )
+            dictionary = await asyncio.to_thread(self.custom_dictionary.compile, words)
+            affected = await asyncio.to_thread(texts_containing, texts, words) if dictionary else []
+            if affected:
+                retokenized = await segment_batch(
+                    [texts[index] for index in affected], workers=settings.nlp_workers, dictionary=dictionary
+                )
+                for index, tokens in zip(affected, retokenized):
+                    token_lists[index] = tokens
+                store = await asyncio.to_thread(BookTokenStore.build, sentences, token_lists)
+            nlp_stats["custom_dict"] = {
+                "words": len(words),
+                "resegmented_sentences": len(affected),
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+            logger.info(f"📗 自定义词典: {len(words)} 个词，重新分词 {len(affected)} 句")
+
+        return store, nlp_stats
+
+    async def load_token_store(self, file_hash: Optional[str], chapters: List) -> BookTokenStore:
+        """
+        读取著作的分词存储，不存在时（旧数据、缓存被清理）重新构建并保存
+
+        参数:
+            file_hash: 文件内容哈希
+            chapters: 按章节顺序排列的章节，需与入库时一致
+        """
+        store = self.token_store_cache.get(file_hash, self.cache_version) if file_hash else None
+        if store is not None and store.num_chapters == len(chapters):
+            return store
+
+        store, _ = await self.build_token_store(chapters, file_hash)
+        if file_hash:
+            self.token_store_cache.put(file_hash, self.cache_version, store)
+        return store
+
+    async def load_tfidf(self, file_hash: Optional[str], chapters: List) -> BookTfidf:
+        """读取著作的TF-IDF模型，不存在时由分词存储重新构建并保存"""
+        tfidf = self.cached_tfidf(file_hash)
+        if tfidf is not None and tfidf.num_chapters == len(chapters):
+            return tfidf
+
+        store = await self.load_token_store(file_hash, chapters)
+        tfidf = await asyncio.to_thread(self.text_processor.build_tfidf_model, store)
+        if file_hash:
+            self.tfidf_cache.put(file_hash, self.cache_version, tfidf)
+        return tfidf
+
+    def cached_token_store(self, file_hash: Optional[str]) -> Optional[BookTokenStore]:
+        """只读缓存的分词存储（含句子索引，供同步调用方使用，不存在时返回None）"""
+        return self.token_store_cache.get(file_hash, self.cache_version) if file_hash else None
+
+    def cached_tfidf(self, file_hash: Optional[str]) -> Optional[BookTfidf]:
+        """只读缓存的TF-IDF模型（供同步调用方使用，不存在时返回None）"""
+        return self.tfidf_cache.get(file_hash, self.cache_version) if file_hash else None
+
     async def _extract_core_viewpoints(
         self,
         chapters: List[Chapter],
+        token_store: BookTokenStore,
+        tfidf: BookTfidf,
         max_viewpoints_per_chapter: int = 5
     ) -> List[CoreViewpoint]:
         """
@@ -584,36 +1035,55 @@ class DocumentParser:
         1. 对每个章节提取关键句
         2. 对关键句进行总结
         3. 提取关键词
+
+        关键句打分读取分词存储，关键词取自整书TF-IDF模型的句子关键词矩阵，不再重复分词；
+        观点记录原句在章节正文中的字符位置，证据构建时直接按位置定位段落；
+        全书的观点最后做一次近似重复聚类（PDF重复的页眉、引文、重复收录的章节），
+        每类保留最靠前的一条，其余记入代表的duplicates
         """
         core_viewpoints = []
 
-        for chapter in chapters:
+        for chapter_index, chapter in enumerate(chapters):
             # 提取关键句
-            key_sentences = self.text_processor.extract_key_sentences(
-                chapter.content,
+            key_sentences = self.text_processor.key_sentences_from_store(
+                token_store,
+                chapter_index,
                 top_k=max_viewpoints_per_chapter
             )
 
-            for sentence, score in key_sentences:
+            for sentence_index, score in key_sentences:
+                start_offset, end_offset = token_store.sentences.spans[sentence_index].tolist()
+                sentence = chapter.content[start_offset:end_offset]
                 # 提取关键词
-                keywords = self.text_processor.extract_keywords(
-                    sentence,
-                    top_k=5,
-                    with_weight=False
-                )
+                keywords = tfidf.sentence_keywords(sentence_index, top_k=5)
 
                 # 创建核心观点对象
                 viewpoint = CoreViewpoint(
                     viewpoint_id=str(uuid.uuid4()),
                     content=sentence,
-                    original_text=sentence,  # 这里可以精确定位到原文
+                    original_text=sentence,  # 即章节正文[start_offset:end_offset]
                     chapter_id=chapter.chapter_id,
                     context=sentence[:100] + "..." if len(sentence) > 100 else sentence,
-                    keywords=keywords
+                    keywords=keywords,
+                    start_offset=start_offset,
+                    end_offset=end_offset
                 )
                 core_viewpoints.append(viewpoint)
 
-        return core_viewpoints
+        if not settings.near_dup_enabled:
+            return core_viewpoints
+        representatives = cluster_near_duplicates(
+            [viewpoint.content for viewpoint in core_viewpoints],
+            max_distance=settings.near_dup_max_distance,
+            min_chars=settings.near_dup_min_chars
+        )
+        unique_viewpoints = []
+        for index, representative in enumerate(representatives):
+            if representative == index:
+                unique_viewpoints.append(core_viewpoints[index])
+            else:
+                core_viewpoints[representative].duplicates.append({"chapter_id": core_viewpoints[index].chapter_id})
+        return unique_viewpoints
 
 
 # 全局单例
@@ -1,95 +1,395 @@
 """
 证据库构建服务
 """
-from typing import List
+import hashlib
+import json
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import ContextManager, Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session
 from loguru import logger
 import uuid
 
-from app.models.orm import ChapterORM, ParagraphORM, EvidenceORM, CoreViewpointORM
+from app.models.orm import BookORM, ChapterORM, ParagraphORM, EvidenceORM, CoreViewpointORM
 from app.utils.text_processor import get_text_processor
+from app.utils.sentence_index import main_paragraph, paragraph_bounds, strip_span
+from app.utils.aho_corasick import AhoCorasick
+from app.utils.book_text import byte_offsets, get_book_text_store
+from app.utils.near_duplicates import cluster_near_duplicates
+from app.utils.config import settings
+from app.services.document_parser import get_document_parser
+from app.crud.crud_search import index_missing
+
+
+# 构建逻辑变化时递增，使已构建的章节全部重建
+EVIDENCE_BUILDER_VERSION = 5
+# 旧数据没有观点位置时，按引文前若干字定位（引文结尾可能被截断或改写）
+PREFIX_CHARS = 15
+# 每条INSERT语句批量写入的行数（executemany）
+INSERT_BATCH_ROWS = 1000
+# 累计超过该行数后写入并提交一次事务（按整章累计，章节的删除与写入总在同一事务中）
+COMMIT_ROWS = 5000
+
+
+def _insert_rows(db: Session, model, rows: List[Dict]):
+    """批量写入（Core INSERT，按INSERT_BATCH_ROWS分批executemany）"""
+    for start in range(0, len(rows), INSERT_BATCH_ROWS):
+        db.execute(insert(model), rows[start:start + INSERT_BATCH_ROWS])
 
 
 class EvidenceBuilder:
-    """证据库构建器"""
+    """
+    证据库构建器
+
+    段落与证据按章节整体替换：章节正文、观点与构建配置的摘要记为chapters.evidence_hash，
+    重复构建时摘要未变的章节直接跳过；有变化的章节先删除旧的段落与证据，再批量写入。
+    全书正文写入BookTextStore，段落与证据只保存在章节内的字节位置，正文与前后文在读取时切出
+    """
 
     def __init__(self):
         self.text_processor = get_text_processor()
+        self.book_text_store = get_book_text_store()
 
-    def build_paragraphs(self, db: Session, chapter: ChapterORM) -> List[ParagraphORM]:
-        paragraphs = self.text_processor.split_text_by_paragraph(chapter.content or "")
-        result: List[ParagraphORM] = []
-        for idx, content in enumerate(paragraphs, start=1):
-            paragraph = ParagraphORM(
-                paragraph_id=uuid.uuid4().hex,
-                book_id=chapter.book_id,
-                chapter_id=chapter.chapter_id,
-                paragraph_number=idx,
-                content=content,
-                word_count=len(content)
-            )
-            result.append(paragraph)
-        return result
+    def chapter_hash(self, chapter: ChapterORM, viewpoints: List[CoreViewpointORM], with_keywords: bool) -> str:
+        """章节构建摘要：正文、观点（ID、原文、位置）、段落关键词来源与去重配置"""
+        fingerprint = json.dumps(
+            [
+                EVIDENCE_BUILDER_VERSION,
+                settings.near_dup_enabled, settings.near_dup_max_distance, settings.near_dup_min_chars,
+                with_keywords,
+                chapter.content or "",
+                sorted(
+                    (viewpoint.viewpoint_id, viewpoint.original_text or viewpoint.content or "", viewpoint.start_offset)
+                    for viewpoint in viewpoints
+                )
+            ],
+            ensure_ascii=False
+        )
+        return hashlib.md5(fingerprint.encode("utf-8")).hexdigest()
+
+    def build_paragraphs(self, chapter: ChapterORM, chapter_hash: str = "") -> List[Dict]:
+        """
+        章节的段落行（非空行，去除首尾空白），记录各段在章节正文中的字符位置与字节位置
+
+        段落ID由章节ID、构建摘要与段落序号决定：未变化的章节重建时ID不变，
+        其他章节引用的代表段落依然有效
+        """
+        content = chapter.content or ""
+        spans = [strip_span(content, *bounds) for bounds in zip(*paragraph_bounds(content))]
+        offsets = byte_offsets(content, [offset for span in spans for offset in span])
+        rows: List[Dict] = []
+        for idx, (start, end) in enumerate(spans, start=1):
+            rows.append({
+                "paragraph_id": hashlib.md5(f"{chapter.chapter_id}:{chapter_hash}:{idx}".encode("utf-8")).hexdigest(),
+                "book_id": chapter.book_id,
+                "chapter_id": chapter.chapter_id,
+                "paragraph_number": idx,
+                "content": content[start:end],
+                "word_count": end - start,
+                "duplicates": [],
+                "start_offset": start,
+                "end_offset": end,
+                "byte_start": offsets[2 * idx - 2],
+                "byte_end": offsets[2 * idx - 1]
+            })
+        return rows
 
-    def build_evidences(self, db: Session, chapter: ChapterORM, viewpoints: List[CoreViewpointORM], paragraphs: List[ParagraphORM]) -> List[EvidenceORM]:
-        evidences: List[EvidenceORM] = []
-        para_texts = [p.content for p in paragraphs]
+    def anchor_viewpoints(self, content: str, viewpoints: List[CoreViewpointORM]) -> List[Optional[Tuple[int, int]]]:
+        """
+        各观点原文在章节正文中的[起始, 结束)位置（找不到时为None）
 
-        for viewpoint in viewpoints:
+        解析时已记录位置的观点直接使用；旧数据没有位置，把所有引文（及其前PREFIX_CHARS个字，
+        应对结尾被截断或改写的引文）加入Aho-Corasick自动机，一次扫描章节正文定位
+        """
+        anchors: List[Optional[Tuple[int, int]]] = [None] * len(viewpoints)
+        automaton = AhoCorasick()
+        for index, viewpoint in enumerate(viewpoints):
             snippet = viewpoint.original_text or viewpoint.content
             if not snippet:
                 continue
+            start = viewpoint.start_offset
+            if start is not None and content.startswith(snippet, start):
+                anchors[index] = (start, start + len(snippet))
+                continue
+            automaton.add(snippet, (index, True))
+            if len(snippet) > PREFIX_CHARS:
+                automaton.add(snippet[:PREFIX_CHARS], (index, False))
+        if not len(automaton):
+            return anchors
 
-            match_index = -1
-            for idx, para in enumerate(para_texts):
-                if snippet[:15] in para:
-                    match_index = idx
-                    break
-
-            paragraph_id = paragraphs[match_index].paragraph_id if match_index >= 0 else None
-            context_before = paragraphs[match_index - 1].content if match_index > 0 else None
-            context_after = paragraphs[match_index + 1].content if match_index >= 0 and match_index + 1 < len(paragraphs) else None
-
-            evidence_text = snippet
-            evidence = EvidenceORM(
-                evidence_id=uuid.uuid4().hex,
-                book_id=chapter.book_id,
-                chapter_id=chapter.chapter_id,
-                paragraph_id=paragraph_id,
-                viewpoint_id=viewpoint.viewpoint_id,
-                evidence_text=evidence_text,
-                context_before=context_before,
-                context_after=context_after,
-                keywords=viewpoint.keywords or [],
-                score=1.0
-            )
-            evidences.append(evidence)
+        # 完整引文优先于前缀，各取最早出现的位置
+        prefix_anchors: Dict[int, Tuple[int, int]] = {}
+        for start, end, (index, complete) in automaton.finditer(content):
+            if complete:
+                if anchors[index] is None:
+                    anchors[index] = (start, end)
+            else:
+                prefix_anchors.setdefault(index, (start, end))
+        for index, anchor in prefix_anchors.items():
+            if anchors[index] is None:
+                anchors[index] = anchor
+        return anchors
+
+    def build_evidences(
+        self,
+        chapter: ChapterORM,
+        viewpoints: List[CoreViewpointORM],
+        paragraphs: List[Dict],
+        paragraph_keywords: Optional[List[List[str]]] = None,
+        paragraph_representatives: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        为章节内的观点构建证据行
+
+        观点所在段落按字符位置二分查找（跨段的引文归入包含其字数最多的段落）；
+        证据记录该段落的字节位置，前后文在请求时按窗口大小从全书正文切出，不再复制相邻段落
+
+        参数:
+            paragraphs: build_paragraphs返回的段落行
+            paragraph_keywords: 各段落的关键词（来自整书TF-IDF模型），
+                命中段落时作为证据关键词，否则沿用观点关键词
+            paragraph_representatives: 各段落所在近似重复类的代表段落，
+                证据指向代表段落（重复段落不单独入库）
+        """
+        evidences: List[Dict] = []
+        starts = [p["start_offset"] for p in paragraphs]
+        ends = [p["end_offset"] for p in paragraphs]
+        anchors = self.anchor_viewpoints(chapter.content or "", viewpoints)
+
+        for viewpoint, anchor in zip(viewpoints, anchors):
+            snippet = viewpoint.original_text or viewpoint.content
+            if not snippet:
+                continue
+
+            match_index = main_paragraph(starts, ends, *anchor) if anchor is not None and paragraphs else -1
+
+            paragraph_id = None
+            if match_index >= 0:
+                matched = paragraph_representatives[match_index] if paragraph_representatives else paragraphs[match_index]
+                paragraph_id = matched["paragraph_id"]
+            located = paragraphs[match_index] if match_index >= 0 else None
+
+            keywords = paragraph_keywords[match_index] if paragraph_keywords and match_index >= 0 else None
+            evidences.append({
+                "evidence_id": uuid.uuid4().hex,
+                "book_id": chapter.book_id,
+                "chapter_id": chapter.chapter_id,
+                "paragraph_id": paragraph_id,
+                "viewpoint_id": viewpoint.viewpoint_id,
+                "evidence_text": snippet,
+                "byte_start": located["byte_start"] if located else None,
+                "byte_end": located["byte_end"] if located else None,
+                "keywords": keywords or viewpoint.keywords or [],
+                "score": 1.0
+            })
 
         return evidences
 
-    def build_for_book(self, db: Session, book_id: str):
-        chapters = db.query(ChapterORM).filter(ChapterORM.book_id == book_id).all()
+    def build_for_book(
+        self,
+        db: Session,
+        book_id: str,
+        force: bool = False,
+        write_lock: Optional[ContextManager] = None
+    ) -> Dict:
+        """
+        构建（或增量重建）一本书的证据库
+
+        先在内存中算出各章的段落与证据行，累计到COMMIT_ROWS后集中写入并提交；
+        所有写库语句都在写入阶段执行，构建本身不占用数据库写锁
+
+        参数:
+            force: 忽略章节摘要，全部重建
+            write_lock: 写入并提交时持有的锁（批量导入时与其他写库任务串行，None表示不加锁）
+
+        返回:
+            构建统计 {"chapters", "rebuilt", "skipped", "skipped_chapters", "paragraphs", "evidences",
+                      "rows", "text_bytes", "seconds", "rows_per_sec"}
+        """
+        started = time.perf_counter()
+        chapters = (
+            db.query(ChapterORM)
+            .filter(ChapterORM.book_id == book_id)
+            .order_by(ChapterORM.chapter_number)
+            .all()
+        )
         if not chapters:
             logger.warning("⚠️ 未找到章节，无法构建证据库")
-            return
+            return {"chapters": 0, "rebuilt": 0, "skipped": 0, "skipped_chapters": [],
+                    "paragraphs": 0, "evidences": 0, "rows": 0, "text_bytes": 0, "seconds": 0.0, "rows_per_sec": 0.0}
 
-        for chapter in chapters:
-            paragraphs = self.build_paragraphs(db, chapter)
-            chapter.paragraph_count = len(paragraphs)
-            for p in paragraphs:
-                db.add(p)
+        # 入库时保存的整书TF-IDF模型（按章节顺序索引）
+        book = db.query(BookORM).filter(BookORM.book_id == book_id).first()
+        tfidf = get_document_parser().cached_tfidf(book.file_hash if book else None)
+        if tfidf is not None and tfidf.num_chapters != len(chapters):
+            tfidf = None
+
+        chapter_viewpoints: Dict[str, List[CoreViewpointORM]] = defaultdict(list)
+        for viewpoint in db.query(CoreViewpointORM).filter(CoreViewpointORM.book_id == book_id).all():
+            chapter_viewpoints[viewpoint.chapter_id].append(viewpoint)
+        hashes = [self.chapter_hash(chapter, chapter_viewpoints[chapter.chapter_id], tfidf is not None) for chapter in chapters]
+
+        # 全书段落一次做近似重复聚类：每类只保存最靠前的段落，其余段落记入代表的duplicates
+        chapter_paragraphs = [self.build_paragraphs(chapter, chapter_hash) for chapter, chapter_hash in zip(chapters, hashes)]
+        all_paragraphs = [p for paragraphs in chapter_paragraphs for p in paragraphs]
+        representatives = self._paragraph_representatives(all_paragraphs)
+
+        dirty = self._dirty_chapters(chapters, hashes, chapter_paragraphs, representatives, force)
+        skipped_chapters = [chapter.chapter_number for chapter, rebuild in zip(chapters, dirty) if not rebuild]
+        self._write_book_text(db, book_id, chapters, dirty)
+
+        inserted = {"paragraphs": 0, "evidences": 0}
+        pending: List[Tuple[ChapterORM, str, int, List[Dict], List[Dict]]] = []
+        pending_rows = 0
+        offset = 0
+        for chapter_index, chapter in enumerate(chapters):
+            paragraphs = chapter_paragraphs[chapter_index]
+            paragraph_representatives = representatives[offset:offset + len(paragraphs)]
+            offset += len(paragraphs)
+            if not dirty[chapter_index]:
+                continue
 
-            viewpoints = (
-                db.query(CoreViewpointORM)
-                .filter(CoreViewpointORM.chapter_id == chapter.chapter_id)
-                .all()
+            paragraph_keywords = [
+                tfidf.paragraph_keywords(chapter_index, index)
+                for index in range(len(paragraphs))
+            ] if tfidf is not None else None
+            evidences = self.build_evidences(
+                chapter, chapter_viewpoints[chapter.chapter_id], paragraphs,
+                paragraph_keywords=paragraph_keywords,
+                paragraph_representatives=paragraph_representatives
             )
-            evidences = self.build_evidences(db, chapter, viewpoints, paragraphs)
-            for e in evidences:
-                db.add(e)
+            # 段落正文不入库（content留空），读取与建索引时按字节位置从全书正文切出
+            stored_paragraphs = [
+                {**p, "content": ""}
+                for p, representative in zip(paragraphs, paragraph_representatives) if representative is p
+            ]
+
+            # 段落数只计实际入库的行（被合并的近似重复段落记在代表段落的duplicates中），
+            # 与按章节获取段落返回的行数一致；paragraph_number保留原始位置
+            pending.append((chapter, hashes[chapter_index], len(stored_paragraphs), stored_paragraphs, evidences))
+            inserted["paragraphs"] += len(stored_paragraphs)
+            inserted["evidences"] += len(evidences)
+            pending_rows += len(stored_paragraphs) + len(evidences)
+            if pending_rows >= COMMIT_ROWS:
+                self._write(db, book_id, pending, write_lock)
+                pending = []
+                pending_rows = 0
+        self._write(db, book_id, pending, write_lock)
+
+        seconds = time.perf_counter() - started
+        rows = inserted["paragraphs"] + inserted["evidences"]
+        stats = {
+            "chapters": len(chapters),
+            "rebuilt": len(chapters) - len(skipped_chapters),
+            "skipped": len(skipped_chapters),
+            "skipped_chapters": skipped_chapters,
+            "paragraphs": inserted["paragraphs"],
+            "evidences": inserted["evidences"],
+            "rows": rows,
+            "text_bytes": self.book_text_store.size(book_id),
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else 0.0
+        }
+        logger.info(
+            f"✅ 证据库构建完成: {book_id}（重建 {stats['rebuilt']} 章，跳过 {stats['skipped']} 章，"
+            f"写入 {rows} 行，{stats['rows_per_sec']} 行/秒）"
+        )
+        return stats
+
+    def _write_book_text(self, db: Session, book_id: str, chapters: List[ChapterORM], dirty: List[bool]):
+        """
+        有章节重建（或正文文件缺失、章节尚无字节范围）时重写全书正文，并更新各章的字节范围
+
+        段落与证据的偏移相对于所在章节，未重建章节的行在重写后依然有效
+        """
+        if not (any(dirty) or any(chapter.text_start is None for chapter in chapters)
+                or not self.book_text_store.exists(book_id)):
+            return
+        ranges = self.book_text_store.write(book_id, [chapter.content or "" for chapter in chapters])
+        # 字节范围随第一次写入一起刷新到数据库（见_write）
+        for chapter, (start, end) in zip(chapters, ranges):
+            chapter.text_start, chapter.text_end = start, end
+
+    def _write(
+        self,
+        db: Session,
+        book_id: str,
+        pending: List[Tuple[ChapterORM, str, int, List[Dict], List[Dict]]],
+        write_lock: Optional[ContextManager]
+    ):
+        """
+        整章替换并提交：删除旧行（触发器同步移出全文索引）后批量写入，
+        新行进入全文索引，与构建结果同一事务提交
+
+        参数:
+            pending: [(章节, 构建摘要, 入库段落数, 段落行, 证据行)]
+        """
+        with write_lock or nullcontext():
+            db.flush()
+            for chapter, chapter_hash, paragraph_count, paragraphs, evidences in pending:
+                db.execute(delete(EvidenceORM).where(EvidenceORM.chapter_id == chapter.chapter_id))
+                db.execute(delete(ParagraphORM).where(ParagraphORM.chapter_id == chapter.chapter_id))
+                _insert_rows(db, ParagraphORM, paragraphs)
+                _insert_rows(db, EvidenceORM, evidences)
+                db.execute(
+                    update(ChapterORM)
+                    .where(ChapterORM.chapter_id == chapter.chapter_id)
+                    .values(paragraph_count=paragraph_count, evidence_hash=chapter_hash)
+                )
+            index_missing(db, book_id)
+            db.commit()
+
+    def _dirty_chapters(
+        self,
+        chapters: List[ChapterORM],
+        hashes: List[str],
+        chapter_paragraphs: List[List[Dict]],
+        representatives: List[Dict],
+        force: bool
+    ) -> List[bool]:
+        """
+        需要重建的章节：摘要有变化的章节，以及与它们共享近似重复段落类的章节
+        （代表段落与其duplicates分属不同章节时，任一章重建都会改变另一章的行）
+        """
+        dirty = [force or chapter.evidence_hash != chapter_hash for chapter, chapter_hash in zip(chapters, hashes)]
+        chapter_of = {chapter.chapter_id: index for index, chapter in enumerate(chapters)}
+        linked = set()
+        all_paragraphs = (p for paragraphs in chapter_paragraphs for p in paragraphs)
+        for p, representative in zip(all_paragraphs, representatives):
+            if representative["chapter_id"] != p["chapter_id"]:
+                linked.add((chapter_of[p["chapter_id"]], chapter_of[representative["chapter_id"]]))
+
+        changed = True
+        while changed:
+            changed = False
+            for a, b in linked:
+                if dirty[a] != dirty[b]:
+                    dirty[a] = dirty[b] = True
+                    changed = True
+        return dirty
 
-        db.commit()
-        logger.info(f"✅ 证据库构建完成: {book_id}")
+    def _paragraph_representatives(self, paragraphs: List[Dict]) -> List[Dict]:
+        """各段落所在近似重复类的代表段落（未开启去重时为自身）"""
+        if not settings.near_dup_enabled:
+            return list(paragraphs)
+        indices = cluster_near_duplicates(
+            [p["content"] for p in paragraphs],
+            max_distance=settings.near_dup_max_distance,
+            min_chars=settings.near_dup_min_chars
+        )
+        representatives = [paragraphs[index] for index in indices]
+        for p, representative in zip(paragraphs, representatives):
+            if representative is not p:
+                representative["duplicates"].append({
+                    "chapter_id": p["chapter_id"],
+                    "paragraph_number": p["paragraph_number"]
+                })
+        merged = sum(1 for p, representative in zip(paragraphs, representatives) if representative is not p)
+        if merged:
+            logger.info(f"🧹 合并近似重复段落: {merged}/{len(paragraphs)}")
+        return representatives
 
 
 def get_evidence_builder() -> EvidenceBuilder:
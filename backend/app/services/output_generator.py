@@ -2,11 +2,18 @@
 输出内容生成服务
 根据说者Persona与受众Persona生成 canonical/plan/final
 """
+import re
 import json
+from itertools import islice
 from typing import Dict, Any, Optional
 from loguru import logger
 
 from app.utils.openai_client import get_openai_client
+from app.utils.sentence_index import iter_sentence_spans
+
+
+# 兜底要点按句号分句
+_PLAN_SENTENCE_PATTERN = re.compile(r'[^。]+')
 
 
 class OutputGenerator:
@@ -135,8 +142,11 @@ class OutputGenerator:
         if len(preview) > 600:
             preview = preview[:600] + "..."
 
-        sentences = [s for s in preview.replace("\n", " ").split("。") if s.strip()]
-        plan_lines = [f"- {s.strip()}" for s in sentences[:5]]
+        flattened = preview.replace("\n", " ")
+        plan_lines = [
+            f"- {flattened[start:end]}"
+            for start, end in islice(iter_sentence_spans(flattened, _PLAN_SENTENCE_PATTERN), 5)
+        ]
         plan = "\n".join(plan_lines) if plan_lines else "- 提炼要点"
 
         return {
@@ -15,6 +15,7 @@ from app.models.persona import (
 )
 from app.models.book import Book
 from app.utils.openai_client import get_openai_client
+from app.utils.custom_dict import get_custom_dictionary
 
 
 class PersonaBuilder:
@@ -204,6 +205,9 @@ class PersonaBuilder:
             }
         )
 
+        # 核心概念并入该书的自定义词典，重新解析时作为整词切分
+        get_custom_dictionary().save_book_words(book.file_hash, persona.key_concepts or {})
+
         logger.info(f"✅ Persona构建完成: {book.author}")
         return persona
 
@@ -0,0 +1,100 @@
+"""
+Aho-Corasick多模式匹配
+用于一次扫描同时匹配大量固定字符串（章节标题、引文片段等）
+"""
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick自动机
+
+    使用方式：
+        automaton = AhoCorasick()
+        automaton.add("学而", value)
+        automaton.build()
+        automaton.prefixes("学而第一")   # 以文本开头为起点的匹配
+        automaton.finditer(text)         # 文本中任意位置的匹配
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态上结束的模式：[(模式长度, 值), ...]
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+
+    def __len__(self) -> int:
+        return sum(len(outputs) for outputs in self._output)
+
+    def add(self, pattern: str, value: Any = None):
+        """添加模式串（空串忽略）"""
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), value))
+        self._built = False
+
+    def build(self):
+        """构建失败指针（BFS）"""
+        queue = deque()
+        for next_state in self._goto[0].values():
+            self._fail[next_state] = 0
+            queue.append(next_state)
+
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+
+        self._built = True
+
+    def prefixes(self, text: str) -> Iterator[Tuple[int, Any]]:
+        """
+        匹配文本开头的模式（只沿goto边前进，不需要失败指针）
+
+        产出:
+            (模式长度, 值)，按长度递增
+        """
+        state = 0
+        for ch in text:
+            state = self._goto[state].get(ch)
+            if state is None:
+                return
+            yield from self._output[state]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """
+        扫描文本中所有模式出现位置
+
+        产出:
+            (起始位置, 结束位置, 值)
+        """
+        if not self._built:
+            self.build()
+
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+
+            matched = state
+            while matched:
+                for pattern_len, value in self._output[matched]:
+                    yield index - pattern_len + 1, index + 1, value
+                matched = self._fail[matched]
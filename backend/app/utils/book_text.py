@@ -0,0 +1,216 @@
+"""
+全书正文存储
+构建证据库时把整本书的规范化正文（各章按顺序以换行连接）写为一个UTF-8文件，
+章节记录其在文件中的字节范围，段落与证据只记录在章节内的字节范围。
+读取时mmap映射整个文件，正文、前后文都是按偏移切出的memoryview，不经数据库、不复制
+"""
+import mmap
+import os
+import tempfile
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.utils.config import settings
+
+
+BOOK_TEXT_SUFFIX = ".txt"
+COMPRESSED_SUFFIX = ".txt.z"
+# 同时保持打开（mmap或解压到内存）的书数
+OPEN_BOOKS = 16
+# 请求前后文时允许的最大段落数
+MAX_CONTEXT_PARAGRAPHS = 20
+
+
+def byte_offsets(content: str, char_offsets: Sequence[int]) -> List[int]:
+    """
+    字符位置 -> UTF-8字节位置
+
+    参数:
+        char_offsets: 升序的字符位置（逐段累加编码长度，整体只编码一遍正文）
+    """
+    offsets = []
+    position = 0
+    byte_position = 0
+    for offset in char_offsets:
+        byte_position += len(content[position:offset].encode("utf-8"))
+        position = offset
+        offsets.append(byte_position)
+    return offsets
+
+
+class BookText:
+    """
+    一本书的正文字节（mmap映射或解压后的bytes）
+
+    所有位置均为字节偏移；slice返回memoryview，解码交给调用方（如接口序列化时）
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def slice(self, start: int, end: int) -> memoryview:
+        return self.view[max(start, 0):max(end, 0)]
+
+    def text(self, start: int, end: int) -> str:
+        return str(self.slice(start, end), "utf-8", errors="replace")
+
+    def context(
+        self,
+        lower: int,
+        upper: int,
+        start: int,
+        end: int,
+        paragraphs: int
+    ) -> Tuple[memoryview, memoryview]:
+        """
+        前后文窗口：[start, end)所在段落之前与之后各paragraphs个非空行（段落），不越出[lower, upper)
+
+        参数:
+            lower, upper: 所在章节的字节范围
+            start, end: 段落的字节范围（start为行首，end为行尾）
+
+        返回:
+            (前文, 后文)，多个段落之间保留换行
+        """
+        before = start
+        taken = 0
+        while taken < paragraphs and before - 1 > lower:
+            # before-1处为上一行的换行符，上一行从再往前一个换行符之后开始
+            line_start = self.buffer.rfind(b"\n", lower, before - 1) + 1 or lower
+            if line_start < before - 1:
+                taken += 1
+            before = line_start
+
+        after = end
+        taken = 0
+        while taken < paragraphs and after + 1 < upper:
+            newline = self.buffer.find(b"\n", after + 1, upper)
+            line_end = newline if newline >= 0 else upper
+            if line_end > after + 1:
+                taken += 1
+            after = line_end
+
+        return self.slice(before, max(start - 1, before)), self.slice(min(end + 1, after), after)
+
+
+class BookTextStore:
+    """
+    全书正文文件
+
+    - 文件名为 {book_id}.txt（开启压缩时为 {book_id}.txt.z，zlib压缩）
+    - 写入先落临时文件再原子替换；已映射的旧文件在引用释放前仍然有效
+    - 打开的书按LRU保留OPEN_BOOKS本，文件被替换后按修改时间与大小自动重新打开
+    """
+
+    def __init__(self, store_dir: Optional[Path] = None, compress: Optional[bool] = None):
+        self.store_dir = Path(store_dir or settings.book_text_dir)
+        self.compress = settings.book_text_compress if compress is None else compress
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self._open: "OrderedDict[str, Tuple[Tuple[str, int, int], BookText]]" = OrderedDict()
+
+    def _path(self, book_id: str, compressed: bool) -> Path:
+        return self.store_dir / f"{book_id}{COMPRESSED_SUFFIX if compressed else BOOK_TEXT_SUFFIX}"
+
+    def _existing_path(self, book_id: str) -> Optional[Path]:
+        """已有的正文文件（优先当前压缩配置对应的文件）"""
+        for compressed in (self.compress, not self.compress):
+            path = self._path(book_id, compressed)
+            if path.exists():
+                return path
+        return None
+
+    def exists(self, book_id: str) -> bool:
+        return self._existing_path(book_id) is not None
+
+    def write(self, book_id: str, texts: Sequence[str]) -> List[Tuple[int, int]]:
+        """
+        写入全书正文
+
+        参数:
+            texts: 各章正文（按章节顺序）
+
+        返回:
+            各章在文件（解压后）中的[起始, 结束)字节范围
+        """
+        encoded = [text.encode("utf-8") for text in texts]
+        ranges = []
+        position = 0
+        for chunk in encoded:
+            ranges.append((position, position + len(chunk)))
+            position += len(chunk) + 1
+        payload = b"\n".join(encoded)
+        if self.compress:
+            payload = zlib.compress(payload, 6)
+
+        path = self._path(book_id, self.compress)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        # 压缩配置切换后，另一种格式的旧文件作废
+        self._path(book_id, not self.compress).unlink(missing_ok=True)
+        self._open.pop(book_id, None)
+        logger.info(f"📄 全书正文已写入: {path.name}（{len(texts)} 章，{len(payload)} 字节）")
+        return ranges
+
+    def open(self, book_id: str) -> Optional[BookText]:
+        """打开全书正文（不存在时返回None）"""
+        path = self._existing_path(book_id)
+        if path is None:
+            self._open.pop(book_id, None)
+            return None
+        stat = path.stat()
+        key = (path.name, stat.st_mtime_ns, stat.st_size)
+        cached = self._open.get(book_id)
+        if cached and cached[0] == key:
+            self._open.move_to_end(book_id)
+            return cached[1]
+
+        with open(path, "rb") as f:
+            if path.name.endswith(COMPRESSED_SUFFIX):
+                buffer = zlib.decompress(f.read())
+            elif stat.st_size == 0:
+                buffer = b""
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        book_text = BookText(buffer)
+        # 淘汰时只释放引用：仍被memoryview引用的映射在引用释放后才关闭
+        self._open[book_id] = (key, book_text)
+        while len(self._open) > OPEN_BOOKS:
+            self._open.popitem(last=False)
+        return book_text
+
+    def size(self, book_id: str) -> int:
+        """正文文件的磁盘字节数"""
+        path = self._existing_path(book_id)
+        return path.stat().st_size if path else 0
+
+    def delete(self, book_id: str):
+        """删除全书正文文件"""
+        self._open.pop(book_id, None)
+        for compressed in (False, True):
+            self._path(book_id, compressed).unlink(missing_ok=True)
+
+
+# 全局单例
+_book_text_store: Optional[BookTextStore] = None
+
+
+def get_book_text_store() -> BookTextStore:
+    """获取全书正文存储单例"""
+    global _book_text_store
+    if _book_text_store is None:
+        _book_text_store = BookTextStore()
+    return _book_text_store
@@ -26,6 +26,33 @@ class Settings(BaseSettings):
     prompts_dir: Path = Path("./data/prompts")
     logs_dir: Path = Path("./logs")
 
+    # 上传配置
+    upload_chunk_size: int = 1024 * 1024  # 上传文件分块读取大小（字节）
+
+    # 文档解析配置
+    pdf_parse_workers: int = 0  # PDF并行提取进程数，0表示按CPU核数自动选择
+    pdf_pages_per_shard: int = 16  # 每个提取分片的页数
+    pdf_fast_path: bool = True  # 优先使用PyPDF2快速提取，质量不达标的页面再用pdfplumber
+    txt_chunk_size: int = 1024 * 1024  # TXT分块解码大小（字节）
+    parse_cache_enabled: bool = True  # 按文件内容哈希缓存解析结果
+    parse_cache_dir: Path = Path("./data/parse_cache")
+    token_store_enabled: bool = True  # 入库时保存整本书的分词结果，供后续NLP任务复用
+    token_store_dir: Path = Path("./data/token_store")
+    nlp_workers: int = 0  # 分词等NLP任务的进程数，0表示按CPU核数自动选择
+    spacy_sentence_split: bool = True  # 已安装spaCy时用其规则分句器批量分句（否则按正则分句）
+    spacy_batch_size: int = 32  # nlp.pipe每批的文本块数
+    spacy_chunk_chars: int = 100_000  # 送入spaCy的单个文本块最大字数（按换行切分）
+    custom_dict_enabled: bool = True  # 按书生成jieba自定义词典（章节标题、核心概念、高PMI词组合）并重新切分相关句子
+    custom_dict_dir: Path = Path("./data/custom_dict")
+    custom_dict_domain_file: Optional[Path] = None  # 领域词表（jieba用户词典格式），并入每本书的自定义词典
+    near_dup_enabled: bool = True  # 入库时对核心观点与段落做SimHash近似重复聚类，每类只保留一个代表
+    near_dup_max_distance: int = 3  # SimHash（64位）最大汉明距离
+    near_dup_min_chars: int = 12  # 去除标点空白后不足该字数的文本不参与去重
+    book_text_dir: Path = Path("./data/book_text")  # 构建证据库时写出的全书规范化正文，段落与证据只存字节偏移
+    book_text_compress: bool = False  # zlib压缩全书正文（省空间，但读取时整本解压到内存，不再mmap）
+    evidence_context_paragraphs: int = 1  # 证据前后文默认各取的段落数（请求时按偏移从全书正文切出）
+    nlp_warmup: bool = True  # 启动后在后台预加载分词词典、NLP模型与PDF解析库（关闭则在首次使用时加载）
+
     # 数据库配置
     database_url: str = "sqlite:///./data/dialogue_podcast.db"
 
@@ -0,0 +1,295 @@
+"""
+jieba自定义词典
+按书籍收集自定义词（章节标题、Persona核心概念、书中高PMI的相邻词组合）并合并领域词表，
+预先算好词频后写为jieba用户词典格式的小词表（每行"词 词频"）。
+默认词典只由jieba编译、缓存一次，各书只保存额外的词；分词进程在默认词典的副本上加入这些词
+（见segmenter.load_tokenizer）。词表按内容寻址存放，词表相同的书籍共用一份，只保留最近使用的若干份。
+词典不编译为jieba缓存格式，也不在分词进程之间共享内存：每个进程各自复制默认词典的词频表（约15MB）
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.parse_cache import get_parse_cache
+from app.utils.segmenter import JIEBA_AVAILABLE, load_jieba
+from app.utils.tfidf import get_tfidf_cache
+from app.utils.token_store import BookTokenStore, get_token_store_cache
+
+
+COMPILED_SUFFIX = ".dict.txt"
+# 旧版本整份序列化的前缀词典（每份约9MB），启动时清理
+LEGACY_COMPILED_SUFFIX = ".jieba.cache"
+# 保留的词表份数（按最近使用时间）
+MAX_COMPILED = 64
+# 按书保存的概念词（内容哈希命名，jieba用户词典格式）
+BOOK_WORDS_SUFFIX = ".words.txt"
+
+# 章节标题与PMI组合词的最大字数（更长的多为短语，强行合并反而影响分词）
+MAX_TITLE_CHARS = 4
+# 概念词、领域词的最大字数
+MAX_CONCEPT_CHARS = 8
+# 相邻词组合：至少出现的次数、最低PMI（自然对数）、最多保留的个数
+NGRAM_MIN_COUNT = 5
+NGRAM_MIN_PMI = 3.0
+NGRAM_LIMIT = 200
+
+_CJK_WORD = re.compile(r'^[\u4e00-\u9fff]+$')
+# 标题中的序号："第一章 乡土本色"、"学而第一"、"为政第二篇"
+_TITLE_NUMBERING = re.compile(
+    r'^第[【\[]?[一二三四五六七八九十百零\d]+[】\]]?[章卷篇节回部段]?[\s:：、.]*'
+    r'|[\s:：、.]*第?[一二三四五六七八九十百零\d]+[章卷篇节回部段]?$'
+)
+
+
+def _is_candidate(word: str, max_chars: int) -> bool:
+    return 2 <= len(word) <= max_chars and bool(_CJK_WORD.match(word))
+
+
+def title_words(titles: Iterable[str]) -> List[str]:
+    """章节标题去掉序号后的专名（如"学而第一" -> "学而"、"第六章 差序格局" -> "差序格局"）"""
+    words = []
+    for title in titles:
+        word = _TITLE_NUMBERING.sub('', (title or '').strip()).strip()
+        if _is_candidate(word, MAX_TITLE_CHARS):
+            words.append(word)
+    return words
+
+
+def pmi_ngrams(
+    store: BookTokenStore,
+    text: str,
+    min_count: int = NGRAM_MIN_COUNT,
+    min_pmi: float = NGRAM_MIN_PMI,
+    limit: int = NGRAM_LIMIT
+) -> Dict[str, int]:
+    """
+    书中高PMI的相邻词组合（被默认词典切开的专名、术语）
+
+    PMI = log(c(ab) · N / (c(a) · c(b)))，只统计句内相邻的词对；
+    分词存储已过滤单字与标点，相邻的两个词在原文中未必相连，组合后需在正文中出现至少min_count次
+
+    参数:
+        store: 默认词典的分词结果
+        text: 全书正文（用于核对组合词确实连续出现）
+
+    返回:
+        {组合词: 出现次数}，按PMI降序
+    """
+    ids = store.token_ids.astype(np.int64)
+    if len(ids) < 2:
+        return {}
+
+    # 去掉跨句的词对（pairs[k]为第k、k+1个词）
+    adjacent = np.ones(len(ids) - 1, dtype=bool)
+    boundaries = store.sentence_offsets[1:-1]
+    boundaries = boundaries[(boundaries > 0) & (boundaries < len(ids))]
+    adjacent[boundaries - 1] = False
+
+    vocab_size = len(store.vocab)
+    pairs, counts = np.unique(ids[:-1][adjacent] * vocab_size + ids[1:][adjacent], return_counts=True)
+    frequent = counts >= min_count
+    pairs, counts = pairs[frequent], counts[frequent]
+    if len(pairs) == 0:
+        return {}
+
+    unigram = np.bincount(ids, minlength=vocab_size).astype(np.float64)
+    first, second = pairs // vocab_size, pairs % vocab_size
+    pmi = np.log(counts * float(len(ids)) / (unigram[first] * unigram[second]))
+
+    vocab = store.vocab
+    result: Dict[str, int] = {}
+    for index in np.argsort(-pmi, kind="stable").tolist():
+        if pmi[index] < min_pmi or len(result) >= limit:
+            break
+        word = vocab[first[index]] + vocab[second[index]]
+        if word in result or not _is_candidate(word, MAX_TITLE_CHARS):
+            continue
+        occurrences = text.count(word)
+        if occurrences >= min_count:
+            result[word] = occurrences
+    return result
+
+
+def texts_containing(texts: Sequence[str], words: Iterable[str]) -> List[int]:
+    """包含任一自定义词的文本下标（只有这些句子的切分可能受自定义词典影响）"""
+    words = sorted(words, key=len, reverse=True)
+    if not words:
+        return []
+    pattern = re.compile('|'.join(map(re.escape, words)))
+    return [index for index, text in enumerate(texts) if pattern.search(text)]
+
+
+def read_word_file(path: Path) -> List[str]:
+    """读取jieba用户词典格式的词表（每行"词 [词频] [词性]"，只取词）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.split()[0] for line in f if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        return []
+
+
+class CustomDictionary:
+    """
+    自定义词典的收集与编译
+
+    - {内容哈希}.words.txt：按书保存的概念词（Persona构建后写入；词有变化时作废该书的解析缓存，
+      下次解析该书时生效）
+    - {词表摘要}.dict.txt：编译结果（词与词频），文件名由词表内容决定，词表不变则直接复用
+    """
+
+    def __init__(self, dict_dir: Optional[Path] = None, enabled: Optional[bool] = None):
+        self.dict_dir = Path(dict_dir or settings.custom_dict_dir)
+        self.enabled = (settings.custom_dict_enabled if enabled is None else enabled) and JIEBA_AVAILABLE
+        if self.enabled:
+            self.dict_dir.mkdir(parents=True, exist_ok=True)
+            self.prune()
+
+    def domain_words(self) -> List[str]:
+        """领域词表（custom_dict_domain_file，所有书籍共用）"""
+        if not settings.custom_dict_domain_file:
+            return []
+        return [
+            word for word in read_word_file(Path(settings.custom_dict_domain_file))
+            if 2 <= len(word) <= MAX_CONCEPT_CHARS
+        ]
+
+    def book_words(self, file_hash: Optional[str]) -> List[str]:
+        """按书保存的概念词"""
+        if not self.enabled or not file_hash:
+            return []
+        return read_word_file(self.dict_dir / f"{file_hash}{BOOK_WORDS_SUFFIX}")
+
+    def save_book_words(self, file_hash: Optional[str], words: Iterable[str]):
+        """
+        保存书籍的概念词（如Persona的key_concepts），与已有词合并
+
+        有新词时作废该文件的解析缓存（及分词存储、TF-IDF模型），下次解析按新词表重新分词
+        """
+        if not self.enabled or not file_hash:
+            return
+        existing = self.book_words(file_hash)
+        merged = dict.fromkeys(existing)
+        merged.update(dict.fromkeys(
+            word.strip() for word in words
+            if word and 2 <= len(word.strip()) <= MAX_CONCEPT_CHARS
+        ))
+        if len(merged) == len(existing):
+            return
+        path = self.dict_dir / f"{file_hash}{BOOK_WORDS_SUFFIX}"
+        try:
+            self._write_atomic(path, "\n".join(merged).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"⚠️  保存书籍概念词失败: {e}")
+            return
+        removed = sum(
+            cache.invalidate(file_hash)
+            for cache in (get_parse_cache(), get_token_store_cache(), get_tfidf_cache())
+        )
+        logger.info(f"📗 书籍概念词已更新: {len(merged) - len(existing)} 个新词，作废缓存 {removed} 条")
+
+    def collect(
+        self,
+        store: BookTokenStore,
+        contents: Sequence[str],
+        titles: Iterable[str] = (),
+        file_hash: Optional[str] = None
+    ) -> Dict[str, Optional[int]]:
+        """
+        收集一本书的自定义词
+
+        返回:
+            {词: 词频}，词频为None时编译时按jieba.suggest_freq取能保证整词切出的最小值
+        """
+        words: Dict[str, Optional[int]] = {}
+        for word in self.domain_words() + self.book_words(file_hash) + title_words(titles):
+            words.setdefault(word, None)
+        for word in pmi_ngrams(store, "\n".join(contents)):
+            words.setdefault(word, None)
+        return words
+
+    def compile(self, words: Dict[str, Optional[int]]) -> Optional[str]:
+        """
+        确定自定义词的词频，写为jieba用户词典格式的词表（只含额外的词，不复制默认词典）
+
+        未指定词频的词按默认词典的suggest_freq取能保证整词切出的最小值
+
+        返回:
+            词表路径（没有自定义词或写入失败时返回None，使用默认词典）
+        """
+        if not self.enabled or not words:
+            return None
+
+        entries = sorted(words.items(), key=lambda item: item[0])
+        digest = hashlib.sha1(repr(entries).encode("utf-8")).hexdigest()[:16]
+        path = self.dict_dir / f"{digest}{COMPILED_SUFFIX}"
+        if path.exists():
+            # 更新修改时间，清理时按最近使用保留
+            os.utime(path)
+            return str(path)
+
+        base = load_jieba().dt
+        base.check_initialized()
+        lines = [f"{word} {freq if freq else base.suggest_freq(word)}" for word, freq in entries]
+        try:
+            self._write_atomic(path, "\n".join(lines).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"⚠️  写入自定义词典失败: {e}")
+            return None
+        logger.info(f"📗 自定义词典已编译: {len(entries)} 个词 -> {path.name}")
+        self.prune()
+        return str(path)
+
+    def prune(self, keep: int = MAX_COMPILED) -> int:
+        """
+        清理编译结果：删除旧版本的整份前缀词典，词表只保留最近使用的keep份
+
+        返回:
+            删除的文件数
+        """
+        removed = 0
+        stale = list(self.dict_dir.glob(f"*{LEGACY_COMPILED_SUFFIX}"))
+        compiled = sorted(
+            self.dict_dir.glob(f"*{COMPILED_SUFFIX}"),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True
+        )
+        for path in stale + compiled[keep:]:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"🧹 清理自定义词典编译结果 {removed} 份")
+        return removed
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.dict_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        finally:
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
+
+
+# 全局单例
+_custom_dictionary: Optional[CustomDictionary] = None
+
+
+def get_custom_dictionary() -> CustomDictionary:
+    """获取自定义词典单例"""
+    global _custom_dictionary
+    if _custom_dictionary is None:
+        _custom_dictionary = CustomDictionary()
+    return _custom_dictionary
@@ -0,0 +1,373 @@
+"""
+EPUB流式读取工具
+按spine顺序读取正文，使用nav/NCX目录确定章节标题与边界，逐章产出文本
+"""
+import codecs
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import defaultdict, deque
+from html.parser import HTMLParser
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import unquote
+
+
+# 读取压缩包成员时的分块大小
+CHUNK_SIZE = 64 * 1024
+
+_NS = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "ncx": "http://www.daisy.org/z3986/2005/ncx/",
+    "xhtml": "http://www.w3.org/1999/xhtml",
+    "epub": "http://www.idpf.org/2007/ops",
+}
+
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    增量HTML文本提取器
+
+    - 通过feed()分块输入，不需要完整文档
+    - 块级元素转换为换行，跳过script/style/head
+    - 遇到目录锚点（id）时回调，用于在文档内部切分章节
+    """
+
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "tr", "section", "article", "blockquote", "pre",
+        "h1", "h2", "h3", "h4", "h5", "h6", "dt", "dd", "hr", "table", "ul", "ol"
+    }
+    SKIP_TAGS = {"script", "style", "head"}
+    HEADING_TAGS = {"h1", "h2", "h3"}
+
+    def __init__(self, anchors: Optional[Set[str]] = None, on_anchor: Optional[Callable[[str], None]] = None):
+        super().__init__(convert_charrefs=True)
+        self.anchors = anchors or set()
+        self.on_anchor = on_anchor
+        self.parts: List[str] = []
+        self.first_heading: Optional[str] = None
+        self._skip_depth = 0
+        self._heading_parts: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+            return
+
+        element_id = dict(attrs).get("id")
+        if element_id and element_id in self.anchors and self.on_anchor:
+            self.on_anchor(element_id)
+
+        if tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag in self.HEADING_TAGS and self.first_heading is None:
+            self._heading_parts = []
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            return
+        if tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag in self.HEADING_TAGS and self._heading_parts is not None:
+            heading = "".join(self._heading_parts).strip()
+            if heading:
+                self.first_heading = heading
+            self._heading_parts = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self.parts.append(data)
+        if self._heading_parts is not None:
+            self._heading_parts.append(data)
+
+    def take_text(self) -> str:
+        """取出并清空已累积的文本"""
+        text = "".join(self.parts)
+        self.parts = []
+        return text
+
+
+class EpubReader:
+    """
+    EPUB读取器
+
+    直接读取zip容器，只解析OPF/目录等元数据；正文按spine顺序逐个文档分块解码，
+    内存占用与单章大小相关，而不是整本书
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.stats: Dict = {
+            "spine_documents": 0,
+            "toc_source": None,
+            "toc_entries": 0
+        }
+
+    def iter_chapters(self) -> Iterator[Tuple[str, str]]:
+        """
+        逐章产出 (标题, 正文)
+
+        有目录时按目录条目切分（条目可指向文档内锚点）；
+        没有目录时每个spine文档作为一章，标题取首个标题元素
+        """
+        with zipfile.ZipFile(self.file_path) as archive:
+            opf_path = self._find_opf_path(archive)
+            manifest, spine, ncx_id = self._read_package(archive, opf_path)
+            toc = self._read_toc(archive, opf_path, manifest, ncx_id)
+            self.stats["spine_documents"] = len(spine)
+            self.stats["toc_entries"] = len(toc)
+
+            if toc:
+                yield from self._iter_toc_chapters(archive, spine, toc)
+            else:
+                yield from self._iter_spine_chapters(archive, spine)
+
+    def _iter_toc_chapters(
+        self,
+        archive: zipfile.ZipFile,
+        spine: List[str],
+        toc: List[Tuple[str, str, Optional[str]]]
+    ) -> Iterator[Tuple[str, str]]:
+        """按目录条目切分章节"""
+        # 每个文档中的章节起点：{文档路径: {锚点或None: 条目序号}}
+        starts: Dict[str, Dict[Optional[str], int]] = defaultdict(dict)
+        for index, (_, path, fragment) in enumerate(toc):
+            starts[path].setdefault(fragment, index)
+
+        ready: Deque[Tuple[str, str]] = deque()
+        state = {"title": None, "parts": []}
+
+        def begin(index: int, extractor: Optional[HTMLTextExtractor]):
+            # 当前累积内容归入上一章，然后开启新章
+            if extractor is not None:
+                state["parts"].append(extractor.take_text())
+            if state["title"] is not None:
+                ready.append((state["title"], _strip_title("".join(state["parts"]), state["title"])))
+            state["title"] = toc[index][0]
+            state["parts"] = []
+
+        for path in spine:
+            doc_starts = starts.get(path, {})
+            extractor = HTMLTextExtractor(
+                anchors={fragment for fragment in doc_starts if fragment},
+                on_anchor=lambda fragment, doc_starts=doc_starts: begin(doc_starts[fragment], extractor)
+            )
+            if None in doc_starts:
+                begin(doc_starts[None], None)
+
+            for _ in self._feed_document(archive, path, extractor):
+                if state["title"] is not None:
+                    state["parts"].append(extractor.take_text())
+                else:
+                    # 第一个目录条目之前的内容（封面、版权页等）直接丢弃
+                    extractor.take_text()
+                while ready:
+                    yield ready.popleft()
+
+        if state["title"] is not None:
+            ready.append((state["title"], _strip_title("".join(state["parts"]), state["title"])))
+        while ready:
+            yield ready.popleft()
+
+    def _iter_spine_chapters(self, archive: zipfile.ZipFile, spine: List[str]) -> Iterator[Tuple[str, str]]:
+        """无目录时按spine文档切分章节"""
+        for number, path in enumerate(spine, start=1):
+            extractor = HTMLTextExtractor()
+            parts = []
+            for _ in self._feed_document(archive, path, extractor):
+                parts.append(extractor.take_text())
+            text = "".join(parts)
+            if not text.strip():
+                continue
+            title = extractor.first_heading or f"章节 {number}"
+            yield title, _strip_title(text, title)
+
+    def _feed_document(self, archive: zipfile.ZipFile, path: str, extractor: HTMLTextExtractor) -> Iterator[None]:
+        """分块解码文档并送入解析器，每处理一个分块产出一次"""
+        try:
+            member = archive.open(path)
+        except KeyError:
+            return
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with member:
+            while True:
+                chunk = member.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                extractor.feed(decoder.decode(chunk))
+                yield
+        extractor.feed(decoder.decode(b"", final=True))
+        extractor.close()
+        yield
+
+    def _find_opf_path(self, archive: zipfile.ZipFile) -> str:
+        """从META-INF/container.xml中找到OPF文件路径"""
+        root = ET.fromstring(archive.read("META-INF/container.xml"))
+        rootfile = root.find(".//container:rootfile", _NS)
+        if rootfile is None or not rootfile.get("full-path"):
+            raise ValueError("EPUB缺少OPF描述文件")
+        return rootfile.get("full-path")
+
+    def _read_package(
+        self,
+        archive: zipfile.ZipFile,
+        opf_path: str
+    ) -> Tuple[Dict[str, Dict[str, str]], List[str], Optional[str]]:
+        """
+        解析OPF
+
+        返回:
+            (manifest {id: {"path", "media_type", "properties"}}, spine文档路径列表, NCX条目ID)
+        """
+        root = ET.fromstring(archive.read(opf_path))
+        base = posixpath.dirname(opf_path)
+
+        manifest = {}
+        for item in root.findall(".//opf:manifest/opf:item", _NS):
+            manifest[item.get("id")] = {
+                "path": _join_href(base, item.get("href", "")),
+                "media_type": item.get("media-type", ""),
+                "properties": item.get("properties", "")
+            }
+
+        spine_element = root.find(".//opf:spine", _NS)
+        spine = []
+        ncx_id = None
+        if spine_element is not None:
+            ncx_id = spine_element.get("toc")
+            for itemref in spine_element.findall("opf:itemref", _NS):
+                item = manifest.get(itemref.get("idref"))
+                if item and itemref.get("linear", "yes") != "no":
+                    spine.append(item["path"])
+
+        return manifest, spine, ncx_id
+
+    def _read_toc(
+        self,
+        archive: zipfile.ZipFile,
+        opf_path: str,
+        manifest: Dict[str, Dict[str, str]],
+        ncx_id: Optional[str]
+    ) -> List[Tuple[str, str, Optional[str]]]:
+        """
+        读取目录，优先EPUB3 nav，其次EPUB2 NCX
+
+        返回:
+            [(标题, 文档路径, 锚点), ...]，只保留第一层（顶层条目过少时取下一层）
+        """
+        nav_item = next((item for item in manifest.values() if "nav" in item["properties"].split()), None)
+        if nav_item:
+            entries = self._read_nav(archive, nav_item["path"])
+            if entries:
+                self.stats["toc_source"] = "nav"
+                return _select_toc_level(entries)
+
+        ncx_item = manifest.get(ncx_id) if ncx_id else None
+        if ncx_item is None:
+            ncx_item = next((item for item in manifest.values() if item["media_type"] == "application/x-dtbncx+xml"), None)
+        if ncx_item:
+            entries = self._read_ncx(archive, ncx_item["path"])
+            if entries:
+                self.stats["toc_source"] = "ncx"
+                return _select_toc_level(entries)
+
+        return []
+
+    def _read_nav(self, archive: zipfile.ZipFile, nav_path: str) -> List[Tuple[int, str, str, Optional[str]]]:
+        """解析EPUB3 nav文档中的toc列表"""
+        try:
+            root = ET.fromstring(archive.read(nav_path))
+        except (KeyError, ET.ParseError):
+            return []
+
+        base = posixpath.dirname(nav_path)
+        toc_nav = None
+        for nav in root.iter(f"{{{_NS['xhtml']}}}nav"):
+            if nav.get(f"{{{_NS['epub']}}}type") == "toc":
+                toc_nav = nav
+                break
+        if toc_nav is None:
+            return []
+
+        entries = []
+
+        def walk(ol, depth: int):
+            for li in ol.findall("xhtml:li", _NS):
+                link = li.find("xhtml:a", _NS)
+                if link is not None and link.get("href"):
+                    title = "".join(link.itertext()).strip()
+                    path, fragment = _split_href(base, link.get("href"))
+                    if title:
+                        entries.append((depth, title, path, fragment))
+                child = li.find("xhtml:ol", _NS)
+                if child is not None:
+                    walk(child, depth + 1)
+
+        top = toc_nav.find("xhtml:ol", _NS)
+        if top is not None:
+            walk(top, 0)
+        return entries
+
+    def _read_ncx(self, archive: zipfile.ZipFile, ncx_path: str) -> List[Tuple[int, str, str, Optional[str]]]:
+        """解析EPUB2 NCX navMap"""
+        try:
+            root = ET.fromstring(archive.read(ncx_path))
+        except (KeyError, ET.ParseError):
+            return []
+
+        base = posixpath.dirname(ncx_path)
+        entries = []
+
+        def walk(parent, depth: int):
+            for point in parent.findall("ncx:navPoint", _NS):
+                label = point.find("ncx:navLabel/ncx:text", _NS)
+                content = point.find("ncx:content", _NS)
+                if label is not None and content is not None and content.get("src"):
+                    title = (label.text or "").strip()
+                    path, fragment = _split_href(base, content.get("src"))
+                    if title:
+                        entries.append((depth, title, path, fragment))
+                walk(point, depth + 1)
+
+        nav_map = root.find("ncx:navMap", _NS)
+        if nav_map is not None:
+            walk(nav_map, 0)
+        return entries
+
+
+def _join_href(base: str, href: str) -> str:
+    """把OPF/目录中的相对链接解析为压缩包内路径"""
+    return posixpath.normpath(posixpath.join(base, unquote(href))) if base else posixpath.normpath(unquote(href))
+
+
+def _split_href(base: str, href: str) -> Tuple[str, Optional[str]]:
+    """拆分 "chapter.xhtml#anchor" 为 (压缩包内路径, 锚点)"""
+    path, _, fragment = href.partition("#")
+    return _join_href(base, path), (fragment or None)
+
+
+def _select_toc_level(entries: List[Tuple[int, str, str, Optional[str]]], min_entries: int = 2) -> List[Tuple[str, str, Optional[str]]]:
+    """取条目数不少于min_entries的最浅目录层级"""
+    depths = sorted({depth for depth, _, _, _ in entries})
+    for depth in depths:
+        level = [(title, path, fragment) for d, title, path, fragment in entries if d == depth]
+        if len(level) >= min_entries:
+            return level
+    return [(title, path, fragment) for _, title, path, fragment in entries]
+
+
+def _strip_title(text: str, title: str) -> str:
+    """去掉正文开头与章节标题重复的标题行"""
+    stripped = text.lstrip()
+    first_line, _, rest = stripped.partition("\n")
+    if "".join(first_line.split()) == "".join(title.split()):
+        return rest
+    return text
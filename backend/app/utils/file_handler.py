@@ -3,10 +3,12 @@
 提供文件上传、类型验证、大小限制等功能
 """
 import os
+import asyncio
 import hashlib
+import tempfile
 import mimetypes
 from pathlib import Path
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 from loguru import logger
 from datetime import datetime
 
@@ -230,6 +232,107 @@ class FileHandler:
                 "error": str(e)
             }
 
+    def content_addressed_path(self, file_hash: str, extension: str) -> Path:
+        """内容寻址存储路径：{上传目录}/{哈希前两位}/{哈希}.{扩展名}"""
+        return self.upload_dir / file_hash[:2] / f"{file_hash}.{extension}"
+
+    async def save_upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        original_filename: str,
+        mime_type: Optional[str] = None,
+        declared_size: Optional[int] = None
+    ) -> dict:
+        """
+        流式保存上传文件
+
+        分块写入临时文件，写入的同时计算MD5；累计大小超过上限时立即中止。
+        写完后按内容哈希移动到内容寻址存储，相同内容只保留一份
+
+        参数:
+            chunks: 文件内容分块的异步迭代器
+            original_filename: 原始文件名
+            mime_type: MIME类型（可选）
+            declared_size: 客户端声明的文件大小（可选，超限时不读取内容直接拒绝）
+
+        返回:
+            {
+                "success": True/False,
+                "file_path": "保存的文件路径",
+                "filename": "保存的文件名",
+                "original_filename": "原始文件名",
+                "size": 文件大小,
+                "hash": "文件哈希值",
+                "deduplicated": 是否已存在相同内容的文件,
+                "reason": "失败原因（type/too_large/empty）",
+                "error": "错误信息（如果失败）"
+            }
+        """
+        if not self.validate_file_type(original_filename, mime_type):
+            return {"success": False, "reason": "type", "error": "不支持的文件类型"}
+        if declared_size is not None and declared_size > self.MAX_FILE_SIZE:
+            # 声明大小已超限时不读取内容，直接拒绝（接口返回413）
+            logger.warning(
+                f"❌ 文件过大（声明大小）: {declared_size / 1024 / 1024:.2f}MB "
+                f"(最大: {self.MAX_FILE_SIZE / 1024 / 1024}MB)"
+            )
+            return {"success": False, "reason": "too_large", "error": "文件大小超出限制"}
+
+        incoming_dir = self.upload_dir / ".incoming"
+        incoming_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=incoming_dir, suffix=".part")
+        tmp_path = Path(tmp_name)
+        hash_func = hashlib.md5()
+        file_size = 0
+
+        def write_chunk(f, chunk: bytes):
+            hash_func.update(chunk)
+            f.write(chunk)
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    file_size += len(chunk)
+                    if file_size > self.MAX_FILE_SIZE:
+                        # 声明大小缺失或不实时，以实际写入量为准
+                        logger.warning(f"❌ 文件过大: 已超过 {self.MAX_FILE_SIZE / 1024 / 1024}MB，中止写入")
+                        tmp_path.unlink(missing_ok=True)
+                        return {"success": False, "reason": "too_large", "error": "文件大小超出限制"}
+                    # 写盘与哈希放到线程中，不阻塞事件循环
+                    await asyncio.to_thread(write_chunk, f, chunk)
+
+            if not self.validate_file_size(file_size):
+                tmp_path.unlink(missing_ok=True)
+                return {"success": False, "reason": "empty", "error": "文件为空"}
+
+            file_hash = hash_func.hexdigest()
+            file_path = self.content_addressed_path(file_hash, self.get_file_extension(original_filename))
+            deduplicated = file_path.exists()
+            if deduplicated:
+                tmp_path.unlink(missing_ok=True)
+            else:
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, file_path)
+
+            logger.info(
+                f"✅ 文件保存成功: {original_filename} -> {file_path.name} "
+                f"({file_size / 1024:.2f}KB{', 内容已存在' if deduplicated else ''})"
+            )
+            return {
+                "success": True,
+                "file_path": str(file_path),
+                "filename": file_path.name,
+                "original_filename": original_filename,
+                "size": file_size,
+                "hash": file_hash,
+                "deduplicated": deduplicated
+            }
+
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.error(f"❌ 文件保存失败: {e}")
+            return {"success": False, "reason": "error", "error": str(e)}
+
     def delete_file(self, file_path: str) -> bool:
         """
         删除文件
@@ -299,12 +402,13 @@ class FileHandler:
             logger.error(f"❌ 列出文件失败: {e}")
             return []
 
-    def get_file_info(self, file_path: str) -> Optional[dict]:
+    def get_file_info(self, file_path: str, with_hash: bool = True) -> Optional[dict]:
         """
         获取文件信息
 
         参数:
             file_path: 文件路径
+            with_hash: 是否计算文件哈希（调用方已知哈希时可跳过整文件读取）
 
         返回:
             文件信息字典
@@ -323,7 +427,7 @@ class FileHandler:
                 "size": stat.st_size,
                 "created_time": datetime.fromtimestamp(stat.st_ctime),
                 "modified_time": datetime.fromtimestamp(stat.st_mtime),
-                "hash": self.calculate_file_hash(file_path)
+                "hash": self.calculate_file_hash(file_path) if with_hash else None
             }
 
         except Exception as e:
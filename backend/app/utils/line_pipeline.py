@@ -0,0 +1,227 @@
+"""
+文本行流水线
+每个阶段都是"行迭代器 -> 行迭代器"的生成器，可按需组合：
+
+    lines = iter_text_lines(pages)                 # 提取
+    lines = processor.iter_clean_lines(lines)      # 清洗
+    lines = repeated.filter(lines)                 # 重复页眉页脚过滤
+    lines = trim_blank_lines(lines)                # 去首尾空行
+    lines = reflow.reflow(lines)                   # 折行合并为段落
+
+需要全书统计的阶段（重复行过滤、段落重排）采用两遍模式：第一遍只计数，第二遍过滤
+"""
+import re
+from collections import Counter
+from typing import Iterable, Iterator
+
+
+# 页码、罗马数字、纯符号等噪音行
+_NOISE_LINE_PATTERN = re.compile(r'(?:\d+|-?\s*\d+\s*-?|第?\s*\d+\s*页|[IVXLCM]+|[\W_]+)$')
+
+
+def iter_text_lines(texts: Iterable[str]) -> Iterator[str]:
+    """
+    把分段文本（PDF页、DOCX段落等）展开为行流
+
+    每段之后补一个空行，与按"\\n\\n"拼接全文后再按行切分的结果一致
+    """
+    for text in texts:
+        if not text:
+            continue
+        yield from text.split('\n')
+        yield ""
+
+
+def trim_blank_lines(lines: Iterable[str]) -> Iterator[str]:
+    """去除首尾空行（中间的空行原样保留），等价于对拼接结果做strip"""
+    started = False
+    pending_blanks = 0
+    for line in lines:
+        if not line:
+            if started:
+                pending_blanks += 1
+            continue
+        for _ in range(pending_blanks):
+            yield ""
+        pending_blanks = 0
+        started = True
+        yield line
+
+
+class RepeatedLineFilter:
+    """
+    重复页眉页脚过滤
+
+    第一遍count()统计全书行频，第二遍filter()移除噪音行以及
+    出现次数>=min_count且占比>=min_ratio的短行。只统计短行，内存与正文长度无关
+    """
+
+    def __init__(self, max_length: int = 30, min_count: int = 3, min_ratio: float = 0.05):
+        self.max_length = max_length
+        self.min_count = min_count
+        self.min_ratio = min_ratio
+        self.counts: Counter = Counter()
+        self.total = 0
+
+    def count(self, lines: Iterable[str]) -> Iterator[str]:
+        """第一遍：统计行频，同时原样产出，便于与其他消费者共用一次读取"""
+        for line in lines:
+            self.total += 1
+            stripped = line.strip()
+            if stripped and len(stripped) <= self.max_length:
+                self.counts[stripped] += 1
+            yield line
+
+    def consume(self, lines: Iterable[str]):
+        """第一遍：只统计，不产出"""
+        for _ in self.count(lines):
+            pass
+
+    def is_noise(self, line: str) -> bool:
+        """判断（已strip的）行是否为噪音或高频重复行"""
+        if _NOISE_LINE_PATTERN.match(line):
+            return True
+        if len(line) <= self.max_length:
+            count = self.counts[line]
+            if count >= self.min_count and count / max(self.total, 1) >= self.min_ratio:
+                return True
+        return False
+
+    def filter(self, lines: Iterable[str]) -> Iterator[str]:
+        """第二遍：逐行过滤（行首尾空白去除，空行保留）"""
+        for line in lines:
+            line = line.strip()
+            if line and self.is_noise(line):
+                continue
+            yield line
+
+
+# 段末标点（去掉行尾的右引号、右括号后判断）
+_PARAGRAPH_END_CHARS = frozenset("。！？!?…：:.")
+_CLOSING_CHARS = "\"'”’」』）)》】]"
+# 不能出现在行首的标点：出现即说明上一行是被强制折断的
+_LINE_START_FORBIDDEN = frozenset("，。、；：？！,.;:?!）)」』”’》】…")
+_CJK_LINE_PATTERN = re.compile(r'[　-ヿ一-鿿＀-￯]')
+
+
+def display_width(line: str) -> int:
+    """行的显示宽度：全角字符（中日文、全角标点）记2，其余记1"""
+    return len(line) + len(_CJK_LINE_PATTERN.findall(line))
+
+
+class ParagraphReflow:
+    """
+    段落重排：把PDF等排版格式按版心宽度折行的"行"合并回真实段落
+
+    第一遍count()统计各行宽度，估计版心宽度（不以段末标点结尾的行宽度的中位数）；
+    折行行占非空行的比例达到min_ratio才启用，按段落存放的文本（TXT、DOCX、EPUB）原样通过。
+    第二遍reflow()逐行合并：上一行不以段末标点结尾且宽度接近版心，或本行以不能出现在行首的
+    标点开头时，本行接续上一段；单个空行（PDF页边界）两侧满足同样条件也会接续。
+    输入为清洗后的行（已去首尾空白，PDF抽取出的缩进并不可靠，不作为依据）
+    """
+
+    def __init__(self, fill_ratio: float = 0.8, min_width: int = 20, min_ratio: float = 0.3):
+        self.fill_ratio = fill_ratio
+        self.min_width = min_width
+        self.min_ratio = min_ratio
+        self.widths: list[int] = []
+        self.nonempty_lines = 0
+        self.lines_in = 0
+        self.lines_out = 0
+        self._wrap_width: int | None = None
+
+    @staticmethod
+    def ends_paragraph(line: str) -> bool:
+        """行尾（去掉右引号、右括号）是否为段末标点"""
+        stripped = line.rstrip(_CLOSING_CHARS)
+        return bool(stripped) and stripped[-1] in _PARAGRAPH_END_CHARS
+
+    def count(self, lines: Iterable[str]) -> Iterator[str]:
+        """第一遍：统计不以段末标点结尾的行宽，同时原样产出"""
+        for line in lines:
+            if line:
+                self.nonempty_lines += 1
+                if not self.ends_paragraph(line):
+                    self.widths.append(display_width(line))
+            yield line
+
+    def consume(self, lines: Iterable[str]):
+        """第一遍：只统计，不产出"""
+        for _ in self.count(lines):
+            pass
+
+    @property
+    def wrap_width(self) -> int:
+        """估计的版心宽度（未启用重排时为0）"""
+        if self._wrap_width is None:
+            self._wrap_width = 0
+            if self.widths:
+                width = sorted(self.widths)[len(self.widths) // 2]
+                wrapped = sum(1 for value in self.widths if value >= width * self.fill_ratio)
+                if width >= self.min_width and wrapped >= self.nonempty_lines * self.min_ratio:
+                    self._wrap_width = width
+        return self._wrap_width
+
+    @property
+    def enabled(self) -> bool:
+        return self.wrap_width > 0
+
+    def continues(self, previous: str, line: str) -> bool:
+        """line是否接续previous所在的段落"""
+        if line[0] in _LINE_START_FORBIDDEN:
+            return True
+        return not self.ends_paragraph(previous) and display_width(previous) >= self.wrap_width * self.fill_ratio
+
+    @staticmethod
+    def join(previous: str, line: str) -> str:
+        """拼接折行：中文直接相连，英文补空格，行尾连字符断开的单词还原"""
+        if previous[-1] == '-' and len(previous) > 1 and previous[-2].isalpha() and line[0].islower():
+            return previous[:-1] + line
+        if previous[-1].isascii() and line[0].isascii() and previous[-1].isalnum() and line[0].isalnum():
+            return previous + " " + line
+        if previous[-1] in ",;:.!?" and line[0].isascii() and line[0].isalnum():
+            return previous + " " + line
+        return previous + line
+
+    def reflow(self, lines: Iterable[str]) -> Iterator[str]:
+        """第二遍：逐行合并折行，产出段落（未启用时原样产出）"""
+        enabled = self.enabled
+        paragraph = ""
+        last_line = ""
+        blank_pending = False
+        for line in lines:
+            if line:
+                self.lines_in += 1
+            if not enabled:
+                if line:
+                    self.lines_out += 1
+                yield line
+                continue
+            if not line:
+                blank_pending = bool(paragraph)
+                continue
+            if paragraph and self.continues(last_line, line):
+                paragraph = self.join(paragraph, line)
+                last_line = line
+                blank_pending = False
+                continue
+            if paragraph:
+                self.lines_out += 1
+                yield paragraph
+                if blank_pending:
+                    yield ""
+            paragraph = last_line = line
+            blank_pending = False
+        if paragraph:
+            self.lines_out += 1
+            yield paragraph
+
+    def stats(self) -> dict:
+        """重排统计：输入行数、输出段落数与合并比例"""
+        return {
+            "applied": self.enabled,
+            "wrap_width": self.wrap_width,
+            "lines": self.lines_in,
+            "paragraphs": self.lines_out,
+            "merge_ratio": round(1 - self.lines_out / self.lines_in, 4) if self.lines_in else 0.0
+        }
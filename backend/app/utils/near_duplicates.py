@@ -0,0 +1,152 @@
+"""
+近似重复检测
+对每段文本计算64位SimHash（特征为去除标点空白后的3字符片段），用分段LSH找候选对：
+汉明距离不超过k的两个指纹，把64位切成k+1段后至少有一段完全相同，只需比较同段相同的文本，
+整体接近线性时间。候选对核实距离后用并查集聚类，每类保留最靠前的一段作代表
+"""
+import re
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+# 默认最大汉明距离（64位指纹）
+DEFAULT_MAX_DISTANCE = 3
+# 去除标点、空白后不足该字数的文本不参与聚类（太短的片段指纹不可靠，也多是"是的"一类应答）
+DEFAULT_MIN_CHARS = 12
+SHINGLE_CHARS = 3
+
+_NON_WORD = re.compile(r'[\W_]+')
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+def _normalize(text: str) -> str:
+    return _NON_WORD.sub('', text or '').lower()
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64终混函数：把片段编码散列为均匀分布的64位值（与进程无关，结果可复现）"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def simhash(texts: Sequence[str], min_chars: int = DEFAULT_MIN_CHARS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算各段文本的SimHash指纹
+
+    返回:
+        (fingerprints, valid)：uint64指纹数组；valid标记参与聚类的文本（去除标点空白后不少于min_chars字）
+    """
+    normalized = [_normalize(text) for text in texts]
+    min_chars = max(min_chars, SHINGLE_CHARS)
+    valid = np.fromiter((len(text) >= min_chars for text in normalized), dtype=bool, count=len(texts))
+    fingerprints = np.zeros(len(texts), dtype=np.uint64)
+    indices = np.flatnonzero(valid)
+    if len(indices) == 0:
+        return fingerprints, valid
+
+    # 所有文本的3字符片段一次编码：码点<2^21，三个码点拼成一个63位整数
+    joined = "".join(normalized[index] for index in indices)
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    lengths = np.fromiter((len(normalized[index]) for index in indices), dtype=np.int64, count=len(indices))
+    text_starts = np.zeros(len(indices), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=text_starts[1:])
+
+    # 片段起点：每段文本的前len-2个位置（不跨文本）
+    shingle_counts = lengths - (SHINGLE_CHARS - 1)
+    shingle_offsets = np.zeros(len(indices), dtype=np.int64)
+    np.cumsum(shingle_counts[:-1], out=shingle_offsets[1:])
+    positions = np.arange(int(shingle_counts.sum()), dtype=np.int64)
+    positions += np.repeat(text_starts - shingle_offsets, shingle_counts)
+    hashes = _mix64(
+        (codes[positions] << np.uint64(42)) | (codes[positions + 1] << np.uint64(21)) | codes[positions + 2]
+    )
+
+    # 每一位：置1的片段多于一半则指纹该位为1
+    # 位矩阵转置为64行，每行按文本连续求和（分块计算，控制内存）
+    votes = np.zeros((64, len(indices)), dtype=np.int64)
+    owners = np.repeat(np.arange(len(indices)), shingle_counts)
+    block = 1 << 18
+    for start in range(0, len(hashes), block):
+        # 按字节转置后沿行展开：第b行即各片段散列值的第b位
+        byte_rows = np.ascontiguousarray(hashes[start:start + block].view(np.uint8).reshape(-1, 8).T)
+        bits = np.unpackbits(byte_rows, axis=0, bitorder="little")
+        block_owners = owners[start:start + block]
+        owner_starts = np.flatnonzero(np.concatenate(([True], block_owners[1:] != block_owners[:-1])))
+        votes[:, block_owners[owner_starts]] += np.add.reduceat(bits, owner_starts, axis=1, dtype=np.int32)
+    set_bits = (votes * 2 > shingle_counts).astype(np.uint64)
+    fingerprints[indices] = (set_bits << _BITS[:, None]).sum(axis=0, dtype=np.uint64)
+    return fingerprints, valid
+
+
+def hamming_distance(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """两组uint64指纹逐对的汉明距离"""
+    diff = np.bitwise_xor(left, right)
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _find(parents: List[int], index: int) -> int:
+    root = index
+    while parents[root] != root:
+        root = parents[root]
+    while parents[index] != root:
+        parents[index], index = root, parents[index]
+    return root
+
+
+def cluster_near_duplicates(
+    texts: Sequence[str],
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    min_chars: int = DEFAULT_MIN_CHARS
+) -> List[int]:
+    """
+    近似重复聚类
+
+    参数:
+        texts: 文本列表（按优先级排序，靠前的作为代表）
+        max_distance: SimHash最大汉明距离
+        min_chars: 参与聚类的最少字数
+
+    返回:
+        与texts等长的列表，representatives[i]为第i段所在类的代表下标（不重复的文本为自身）
+    """
+    parents = list(range(len(texts)))
+    if len(texts) < 2:
+        return parents
+    fingerprints, valid = simhash(texts, min_chars)
+    indices = np.flatnonzero(valid)
+    if len(indices) < 2:
+        return parents
+
+    # 分段LSH：距离≤max_distance的两个指纹至少有一段完全相同
+    bands = max_distance + 1
+    band_bits = 64 // bands
+    mask = np.uint64((1 << band_bits) - 1)
+    lefts: List[np.ndarray] = []
+    rights: List[np.ndarray] = []
+    for band in range(bands):
+        keys = (fingerprints[indices] >> np.uint64(band * band_bits)) & mask
+        # 同段相同的文本按完整指纹排序后相邻，每个与前一个及组内第一个比较（候选对数与文本数成正比），
+        # 传递关系由并查集补全
+        order = np.lexsort((fingerprints[indices], keys))
+        sorted_keys = keys[order]
+        same = np.concatenate(([False], sorted_keys[1:] == sorted_keys[:-1]))
+        group_heads = np.maximum.accumulate(np.where(same, 0, np.arange(len(order))))
+        positions = np.flatnonzero(same)
+        lefts.append(indices[order[positions - 1]])
+        rights.append(indices[order[positions]])
+        lefts.append(indices[order[group_heads[positions]]])
+        rights.append(indices[order[positions]])
+
+    left = np.concatenate(lefts)
+    right = np.concatenate(rights)
+    close = hamming_distance(fingerprints[left], fingerprints[right]) <= max_distance
+    for a, b in zip(left[close].tolist(), right[close].tolist()):
+        root_a, root_b = _find(parents, a), _find(parents, b)
+        if root_a != root_b:
+            # 以下标小的为根，即每类的代表是最靠前的文本
+            parents[max(root_a, root_b)] = min(root_a, root_b)
+    return [_find(parents, index) for index in range(len(texts))]
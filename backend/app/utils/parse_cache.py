@@ -0,0 +1,114 @@
+"""
+解析结果缓存
+按"文件内容哈希 + 解析器版本"缓存章节、核心观点与解析统计，
+同一文件重复上传或重建时直接返回，不再重新解析
+"""
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+from app.utils.config import settings
+
+
+CACHE_SUFFIX = ".json.gz"
+
+
+class ParseCache:
+    """
+    解析结果磁盘缓存
+
+    - 文件名为 {内容哈希}-{版本指纹}.json.gz，内容为gzip压缩的紧凑JSON
+    - 版本指纹由解析器版本和影响解析结果的配置组成，解析逻辑变更后旧条目自然失效
+    - 写入先落临时文件再原子替换，并发写同一条目不会产生半截文件
+    """
+
+    suffix = CACHE_SUFFIX
+
+    def __init__(self, cache_dir: Optional[Path] = None, enabled: Optional[bool] = None):
+        self.cache_dir = Path(cache_dir or settings.parse_cache_dir)
+        self.enabled = settings.parse_cache_enabled if enabled is None else enabled
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, file_hash: str, version: str) -> Path:
+        return self.cache_dir / f"{file_hash}-{version}{self.suffix}"
+
+    def get(self, file_hash: str, version: str) -> Optional[Dict]:
+        """读取缓存条目，不存在或损坏时返回None"""
+        if not self.enabled or not file_hash:
+            return None
+
+        path = self._entry_path(file_hash, version)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  解析缓存损坏，已忽略: {path.name} ({e})")
+            self._unlink(path)
+            return None
+
+    def put(self, file_hash: str, version: str, payload: Dict):
+        """写入缓存条目（失败只记录日志，不影响解析流程）"""
+        if not self.enabled or not file_hash:
+            return
+
+        path = self._entry_path(file_hash, version)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️  写入解析缓存失败: {e}")
+            if tmp_path:
+                self._unlink(Path(tmp_path))
+
+    def invalidate(self, file_hash: Optional[str] = None, keep_version: Optional[str] = None) -> int:
+        """
+        删除缓存条目
+
+        参数:
+            file_hash: 只删除该文件的条目（None表示全部文件）
+            keep_version: 保留该版本指纹的条目（用于清理旧版本）
+
+        返回:
+            删除的条目数
+        """
+        if not self.cache_dir.exists():
+            return 0
+
+        pattern = f"{file_hash}-*{self.suffix}" if file_hash else f"*{self.suffix}"
+        removed = 0
+        for path in self.cache_dir.glob(pattern):
+            version = path.name[:-len(self.suffix)].split("-", 1)[-1]
+            if keep_version and version == keep_version:
+                continue
+            if self._unlink(path):
+                removed += 1
+        return removed
+
+    def _unlink(self, path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except OSError:
+            return False
+
+
+# 全局单例
+_parse_cache: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> ParseCache:
+    """获取解析缓存单例"""
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache()
+    return _parse_cache
@@ -0,0 +1,312 @@
+"""
+PDF分页提取工具
+按页区间分片，在进程池中并行提取文本，并按页序重组
+
+提取分两级：
+- 快速层：PyPDF2直接读取文本流
+- 精确层：pdfplumber版面分析，仅用于快速层质量不达标的页面
+"""
+import re
+import time
+import asyncio
+import heapq
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from typing import List, Dict, Tuple
+
+from app.utils.segmenter import resolve_worker_count
+
+# PDF库在首次解析时才导入（pdfplumber导入约需0.2秒），启动时只检测是否安装
+PDFPLUMBER_AVAILABLE = find_spec("pdfplumber") is not None
+PYPDF2_AVAILABLE = find_spec("PyPDF2") is not None
+
+
+TIER_FAST = "pypdf2"
+TIER_LAYOUT = "pdfplumber"
+
+# 耗时统计中保留的最慢页面数
+SLOWEST_PAGES = 10
+
+# 快速层质量阈值
+MIN_CHAR_DENSITY = 0.5  # 非空白字符占比
+MAX_BROKEN_GLYPH_RATIO = 0.01  # 乱码/私有区/控制字符占比
+CJK_PAGE_RATIO = 0.3  # 中文字符占比超过该值时视为中文页面
+MAX_CJK_GAP_RATIO = 0.05  # 中文页面中"汉字 汉字"断裂的占比
+
+_CJK_CHAR = re.compile(r'[\u4e00-\u9fff]')
+_CJK_GAP = re.compile(r'(?<=[\u4e00-\u9fff])[ \t]+(?=[\u4e00-\u9fff])')
+_BROKEN_GLYPH = re.compile(r'[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0c\x0e-\x1f]|\(cid:\d+\)')
+_VISIBLE_CHAR = re.compile(r'\S')
+
+
+def score_page_text(text: str) -> Dict:
+    """
+    评估快速层提取结果的质量
+
+    返回:
+        {"passed": 是否可用, "reason": 不达标原因, 各项指标...}
+    """
+    visible = len(_VISIBLE_CHAR.findall(text))
+    if visible == 0:
+        return {"passed": False, "reason": "empty"}
+
+    density = visible / len(text)
+    cjk_ratio = len(_CJK_CHAR.findall(text)) / visible
+    broken_ratio = len(_BROKEN_GLYPH.findall(text)) / visible
+    cjk_gap_ratio = len(_CJK_GAP.findall(text)) / visible if cjk_ratio >= CJK_PAGE_RATIO else 0.0
+
+    reason = None
+    if broken_ratio > MAX_BROKEN_GLYPH_RATIO:
+        reason = "broken_glyphs"
+    elif density < MIN_CHAR_DENSITY:
+        reason = "low_density"
+    elif cjk_gap_ratio > MAX_CJK_GAP_RATIO:
+        reason = "fragmented_cjk"
+
+    return {
+        "passed": reason is None,
+        "reason": reason,
+        "density": round(density, 3),
+        "cjk_ratio": round(cjk_ratio, 3),
+        "broken_ratio": round(broken_ratio, 4)
+    }
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """获取PDF总页数"""
+    if PYPDF2_AVAILABLE:
+        from PyPDF2 import PdfReader
+        return len(PdfReader(file_path).pages)
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def plan_page_shards(total_pages: int, pages_per_shard: int) -> List[Tuple[int, int]]:
+    """
+    按固定页数切分页区间
+
+    返回:
+        [(start, end), ...]，左闭右开
+    """
+    pages_per_shard = max(pages_per_shard, 1)
+    return [
+        (start, min(start + pages_per_shard, total_pages))
+        for start in range(0, total_pages, pages_per_shard)
+    ]
+
+
+def extract_page_range(file_path: str, start: int, end: int, fast_path: bool = True) -> List[Dict]:
+    """
+    提取[start, end)页的文本
+
+    先用PyPDF2快速提取，质量不达标的页面再用pdfplumber重新提取。
+    作为进程池任务执行，必须保持为模块级函数以便序列化
+
+    返回:
+        [{"page": 页码(从1开始), "text": 文本, "seconds": 耗时, "tier": 提取层级}, ...]
+    """
+    results = []
+    reader = None
+    if fast_path and PYPDF2_AVAILABLE:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(file_path)
+    pdf = None
+    try:
+        for page_num in range(start, end):
+            started = time.perf_counter()
+            fallback_reason = None
+
+            if reader is not None:
+                page_text = reader.pages[page_num].extract_text() or ""
+                quality = score_page_text(page_text)
+                if quality["passed"]:
+                    # PyPDF2常在相邻汉字间插入空格，这里顺手修复
+                    results.append({
+                        "page": page_num + 1,
+                        "text": _CJK_GAP.sub("", page_text),
+                        "seconds": round(time.perf_counter() - started, 4),
+                        "tier": TIER_FAST
+                    })
+                    continue
+                fallback_reason = quality["reason"]
+
+            if pdf is None:
+                import pdfplumber
+                pdf = pdfplumber.open(file_path)
+            page = pdf.pages[page_num]
+            page_text = page.extract_text() or ""
+            # 释放页面缓存，避免长文档占用过多内存
+            page.close()
+            result = {
+                "page": page_num + 1,
+                "text": page_text,
+                "seconds": round(time.perf_counter() - started, 4),
+                "tier": TIER_LAYOUT
+            }
+            if fallback_reason:
+                result["fallback_reason"] = fallback_reason
+            results.append(result)
+    finally:
+        if pdf is not None:
+            pdf.close()
+    return results
+
+
+def read_pdf_outline(file_path: str) -> List[Dict]:
+    """
+    读取PDF书签目录
+
+    返回:
+        [{"title": 标题, "page": 目标页(从0开始), "depth": 层级}, ...]，按书签顺序
+    """
+    if not PYPDF2_AVAILABLE:
+        return []
+
+    from PyPDF2 import PdfReader
+
+    try:
+        reader = PdfReader(file_path)
+        outline = reader.outline
+    except Exception:
+        return []
+
+    entries: List[Dict] = []
+
+    def walk(items, depth: int):
+        for item in items:
+            # PyPDF2用嵌套列表表示上一条书签的子级
+            if isinstance(item, list):
+                walk(item, depth + 1)
+                continue
+            try:
+                target = item.page
+                # 部分生成器直接写入页序号而非页对象引用
+                if isinstance(target, int):
+                    page = int(target)
+                else:
+                    page = reader.get_destination_page_number(item)
+            except Exception:
+                continue
+            title = (getattr(item, "title", None) or "").strip()
+            if page is None or page < 0 or not title:
+                continue
+            entries.append({"title": title, "page": page, "depth": depth})
+
+    walk(outline or [], 0)
+    return entries
+
+
+def select_outline_level(entries: List[Dict], min_entries: int = 3) -> List[Dict]:
+    """
+    选择作为章节的书签层级
+
+    取条目数不少于min_entries的最浅层级（跳过"封面/目录"这类单独的顶层书签），按页码排序
+    """
+    by_depth: Dict[int, List[Dict]] = defaultdict(list)
+    for entry in entries:
+        by_depth[entry["depth"]].append(entry)
+
+    for depth in sorted(by_depth):
+        if len(by_depth[depth]) >= min_entries:
+            return sorted(by_depth[depth], key=lambda entry: entry["page"])
+    return []
+
+
+def summarize_page_timings(page_results: List[Dict], slowest: int = SLOWEST_PAGES) -> Dict:
+    """
+    汇总逐页提取耗时
+
+    只保留总耗时、分位数、最慢的slowest页，以及回退到精确层的页面及原因，
+    统计随解析结果写入缓存与数据库，不逐页展开
+
+    返回:
+        {"total_seconds", "p50_seconds", "p95_seconds", "max_seconds",
+         "slowest_pages": [{"page", "seconds", "tier"}, ...]（按耗时降序）,
+         "fallback_pages": [{"page", "reason"}, ...]}
+    """
+    seconds = sorted(item["seconds"] for item in page_results)
+
+    def percentile(ratio: float) -> float:
+        if not seconds:
+            return 0.0
+        return seconds[min(int(len(seconds) * ratio), len(seconds) - 1)]
+
+    return {
+        "total_seconds": round(sum(seconds), 4),
+        "p50_seconds": percentile(0.5),
+        "p95_seconds": percentile(0.95),
+        "max_seconds": seconds[-1] if seconds else 0.0,
+        "slowest_pages": [
+            {"page": item["page"], "seconds": item["seconds"], "tier": item["tier"]}
+            for item in heapq.nlargest(slowest, page_results, key=lambda item: item["seconds"])
+        ],
+        "fallback_pages": [
+            {"page": item["page"], "reason": item["fallback_reason"]}
+            for item in page_results
+            if "fallback_reason" in item
+        ]
+    }
+
+
+async def extract_pdf_pages(
+    file_path: str,
+    workers: int = 0,
+    pages_per_shard: int = 16,
+    fast_path: bool = True
+) -> Tuple[List[str], Dict]:
+    """
+    分片并行提取PDF文本
+
+    参数:
+        file_path: PDF文件路径
+        workers: 进程数（0表示按CPU核数）
+        pages_per_shard: 每个分片的页数
+        fast_path: 是否启用PyPDF2快速层
+
+    返回:
+        (按页序排列的页面文本列表, 提取统计)
+    """
+    if not PDFPLUMBER_AVAILABLE:
+        raise ImportError("pdfplumber未安装，无法解析PDF文件")
+
+    started = time.perf_counter()
+    total_pages = await asyncio.to_thread(count_pdf_pages, file_path)
+    shards = plan_page_shards(total_pages, pages_per_shard)
+    workers = min(resolve_worker_count(workers), max(len(shards), 1))
+
+    if workers <= 1 or len(shards) <= 1:
+        # 页数较少时直接在线程中提取，避免进程启动开销，同时不阻塞事件循环
+        mode = "sequential"
+        shard_results = [await asyncio.to_thread(extract_page_range, file_path, 0, total_pages, fast_path)]
+    else:
+        mode = "sharded"
+        loop = asyncio.get_running_loop()
+        # 使用spawn启动子进程，避免在多线程服务进程中fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            shard_results = await asyncio.gather(*[
+                loop.run_in_executor(pool, extract_page_range, file_path, start, end, fast_path)
+                for start, end in shards
+            ])
+
+    # gather保持提交顺序，分片内部按页序返回，这里再按页码排序兜底
+    page_results = sorted(
+        (item for shard in shard_results for item in shard),
+        key=lambda item: item["page"]
+    )
+
+    tiers = Counter(item["tier"] for item in page_results)
+    stats = {
+        "mode": mode,
+        "workers": workers,
+        "pages": total_pages,
+        "shards": len(shards),
+        "tiers": dict(tiers),
+        "fast_path_ratio": round(tiers.get(TIER_FAST, 0) / max(total_pages, 1), 3),
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+        "page_timings": summarize_page_timings(page_results)
+    }
+    return [item["text"] for item in page_results], stats
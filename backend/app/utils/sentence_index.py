@@ -0,0 +1,196 @@
+"""
+句子索引
+全书只分句一次：每个句子记为所在章节正文中的[起始, 结束)字符位置，按章节顺序存为整数数组，
+句子文本按需切片。观点提取、证据构建与原文定位共用同一份索引，不再各自分句
+"""
+import re
+from bisect import bisect_right
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+
+# 书籍正文的分句规则（中文句号、问号、感叹号、分号）
+# 句末标点及紧随其后的右引号、右括号归入前一句，与spaCy规则分句器的切分一致：
+# “学而时习之，不亦说乎？”子曰 -> [“学而时习之，不亦说乎？”] [子曰]
+SENTENCE_PATTERN = re.compile(r'[^。！？；]+[。！？；]*[”’」』）》"\')]*')
+
+
+def strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """去除区间首尾空白后的位置（与str.strip一致，空区间返回start == end）"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def iter_sentence_spans(text: str, pattern: re.Pattern = SENTENCE_PATTERN) -> Iterator[Tuple[int, int]]:
+    """
+    按正则逐个产出句子位置（去除首尾空白，跳过空句），不复制句子文本
+
+    pattern的每个匹配视为一个句子
+    """
+    for match in pattern.finditer(text):
+        start, end = strip_span(text, *match.span())
+        if start < end:
+            yield start, end
+
+
+def iter_text_chunks(text: str, max_chars: int) -> Iterator[Tuple[int, str]]:
+    """
+    把长文本按换行切成不超过max_chars的分块（没有换行时硬切）
+
+    返回: (分块起始位置, 分块文本)
+    """
+    start = 0
+    while len(text) - start > max_chars:
+        cut = text.rfind('\n', start, start + max_chars)
+        end = cut + 1 if cut > start else start + max_chars
+        yield start, text[start:end]
+        start = end
+    if start < len(text):
+        yield start, text[start:]
+
+
+def paragraph_bounds(content: str) -> Tuple[List[int], List[int]]:
+    """各非空行（段落）的起止位置，段落划分与TextProcessor.split_text_by_paragraph一致"""
+    starts = []
+    ends = []
+    position = 0
+    for line in content.split('\n'):
+        if line.strip():
+            starts.append(position)
+            ends.append(position + len(line))
+        position += len(line) + 1
+    return starts, ends
+
+
+def main_paragraph(starts: Sequence[int], ends: Sequence[int], start: int, end: int) -> int:
+    """
+    区间[start, end)所属的段落下标：跨行的区间归入包含其字数最多的段落
+
+    参数:
+        starts/ends: 各段落的起止位置（升序）
+    """
+    first = max(bisect_right(starts, start) - 1, 0)
+    last = max(bisect_right(starts, end - 1) - 1, 0)
+    if first == last:
+        return first
+    return max(
+        range(first, last + 1),
+        key=lambda index: min(end, ends[index]) - max(start, starts[index])
+    )
+
+
+class SentenceIndex:
+    """
+    整书句子索引
+
+    - spans[i] 为第i句（全书下标）在所属章节正文中的[起始, 结束)位置
+    - chapter_offsets[c]:chapter_offsets[c+1] 为第c章（按章节顺序的下标）的句子区间
+    - paragraphs[i] 为句子所属的章内段落下标（从0开始）；跨越换行的句子归入包含其字数最多的段落
+    """
+
+    def __init__(self, spans: np.ndarray, paragraphs: np.ndarray, chapter_offsets: np.ndarray):
+        self.spans = spans
+        self.paragraphs = paragraphs
+        self.chapter_offsets = chapter_offsets
+
+    @classmethod
+    def build(cls, contents: Sequence[str], chapter_spans: Sequence[Sequence[Tuple[int, int]]]) -> "SentenceIndex":
+        """
+        参数:
+            contents: 各章正文
+            chapter_spans: 各章的句子位置 [(起始, 结束), ...]
+        """
+        spans: List[Tuple[int, int]] = []
+        paragraphs: List[int] = []
+        chapter_offsets = [0]
+        for content, sentence_spans in zip(contents, chapter_spans):
+            starts, ends = paragraph_bounds(content)
+            for start, end in sentence_spans:
+                spans.append((start, end))
+                paragraphs.append(main_paragraph(starts, ends, start, end))
+            chapter_offsets.append(len(spans))
+
+        return cls(
+            spans=np.array(spans, dtype=np.int32).reshape(-1, 2),
+            paragraphs=np.array(paragraphs, dtype=np.int32),
+            chapter_offsets=np.array(chapter_offsets, dtype=np.int64)
+        )
+
+    @property
+    def num_chapters(self) -> int:
+        return len(self.chapter_offsets) - 1
+
+    @property
+    def num_sentences(self) -> int:
+        return len(self.spans)
+
+    def nbytes(self) -> int:
+        return self.spans.nbytes + self.paragraphs.nbytes + self.chapter_offsets.nbytes
+
+    def chapter_range(self, chapter_index: int) -> Tuple[int, int]:
+        """第chapter_index章的句子区间（全书句子下标，左闭右开）"""
+        return int(self.chapter_offsets[chapter_index]), int(self.chapter_offsets[chapter_index + 1])
+
+    def text(self, content: str, sentence_index: int) -> str:
+        """从所属章节正文中切出句子"""
+        start, end = self.spans[sentence_index].tolist()
+        return content[start:end]
+
+    def chapter_sentences(self, chapter_index: int, content: str) -> List[Tuple[int, int, str]]:
+        """章节内的句子 [(起始, 结束, 句子), ...]"""
+        start, end = self.chapter_range(chapter_index)
+        return [
+            (begin, finish, content[begin:finish])
+            for begin, finish in self.spans[start:end].tolist()
+        ]
+
+    def iter_texts(self, contents: Sequence[str]) -> Iterator[str]:
+        """按全书顺序产出每个句子的文本"""
+        for chapter_index, content in enumerate(contents):
+            start, end = self.chapter_range(chapter_index)
+            for begin, finish in self.spans[start:end].tolist():
+                yield content[begin:finish]
+
+    def paragraph_range(self, chapter_index: int, paragraph_index: int) -> Tuple[int, int]:
+        """章内第paragraph_index段的句子区间（全书句子下标，左闭右开）"""
+        start, end = self.chapter_range(chapter_index)
+        paragraphs = self.paragraphs[start:end]
+        return (
+            start + int(np.searchsorted(paragraphs, paragraph_index, side="left")),
+            start + int(np.searchsorted(paragraphs, paragraph_index, side="right"))
+        )
+
+    def sentence_at(self, chapter_index: int, position: int) -> int:
+        """
+        章内字符位置所在的句子（全书下标）
+
+        位置落在两句之间（标点、空白）时归入下一句；超出最后一句时返回-1
+        """
+        start, end = self.chapter_range(chapter_index)
+        if start == end:
+            return -1
+        index = start + int(np.searchsorted(self.spans[start:end, 0], position, side="right")) - 1
+        if index < start:
+            return start
+        if position >= self.spans[index, 1]:
+            index += 1
+        return index if index < end else -1
+
+    def locate(self, chapter_index: int, content: str, quote: str, prefix_length: int = 15) -> int:
+        """
+        定位引文所在的句子（全书下标），找不到时返回-1
+
+        先按完整引文查找，找不到再用前prefix_length个字查找（引文可能被截断或改写了结尾）
+        """
+        if not quote:
+            return -1
+        position = content.find(quote)
+        if position < 0 and len(quote) > prefix_length:
+            position = content.find(quote[:prefix_length])
+        if position < 0:
+            return -1
+        return self.sentence_at(chapter_index, position)
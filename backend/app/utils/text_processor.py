@@ -3,34 +3,94 @@
 提供中文分词、文本清洗、关键词提取、文本分段等功能
 """
 import re
-import string
-from typing import List, Optional, Tuple
+import time
+from concurrent.futures.process import BrokenProcessPool
+from importlib.util import find_spec
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from loguru import logger
 
-# 尝试导入NLP库
-try:
-    import jieba
-    import jieba.analyse
-    JIEBA_AVAILABLE = True
-except ImportError:
-    JIEBA_AVAILABLE = False
+from app.utils.config import settings
+from app.utils.segmenter import (
+    JIEBA_AVAILABLE, MIN_PARALLEL_CHARS, filter_tokens, get_pool, load_jieba, plan_text_shards,
+    resolve_worker_count, shutdown_pool
+)
+from app.utils.token_store import BookTokenStore
+from app.utils.tfidf import BookTfidf
+from app.utils.sentence_index import SentenceIndex, iter_sentence_spans, iter_text_chunks, strip_span
+from app.utils.textrank import encode_word_lists, textrank_scores, top_sentences
+from app.utils.text_stats import text_stats
+
+# NLP库按需导入：启动时只检测是否安装，首次使用时再加载
+# （jieba.analyse导入需加载词性标注模型与IDF表，约1秒；spaCy模型更慢）
+if not JIEBA_AVAILABLE:
     logger.warning("⚠️  jieba未安装，部分功能将受限")
 
-try:
-    import spacy
-    SPACY_AVAILABLE = True
-    # 尝试加载中文模型
-    try:
-        nlp = spacy.load("zh_core_web_sm")
-    except OSError:
-        logger.warning("⚠️  spaCy中文模型未找到，请运行: python -m spacy download zh_core_web_sm")
-        SPACY_AVAILABLE = False
-        nlp = None
-except ImportError:
-    SPACY_AVAILABLE = False
-    nlp = None
+SPACY_INSTALLED = find_spec("spacy") is not None
+if not SPACY_INSTALLED:
     logger.warning("⚠️  spaCy未安装，部分功能将受限")
 
+# spaCy规则分句器使用的句末标点（与正则分句规则一致）
+_SENTENCE_PUNCT_CHARS = ["。", "！", "？", "；"]
+
+# 进程池子进程中的分句管线（首次分句时创建）
+_worker_sentence_nlp = None
+
+
+def build_sentence_pipeline():
+    """
+    分句专用的spaCy管线：空白中文管线 + 规则分句器
+
+    不加载词性、依存、实体等模型组件，只做分句
+    """
+    import spacy
+    sentence_nlp = spacy.blank("zh")
+    sentence_nlp.add_pipe("sentencizer", config={"punct_chars": _SENTENCE_PUNCT_CHARS})
+    return sentence_nlp
+
+
+def pipeline_sentence_spans(nlp, chunks: List[str], batch_size: int) -> List[List[Tuple[int, int]]]:
+    """用spaCy管线对各分块分句，返回每个分块内的句子位置（首尾空白已去除、空句已跳过）"""
+    result = []
+    for chunk, doc in zip(chunks, nlp.pipe(chunks, batch_size=batch_size)):
+        spans = []
+        for sent in doc.sents:
+            start, end = strip_span(chunk, sent.start_char, sent.end_char)
+            if start < end:
+                spans.append((start, end))
+        result.append(spans)
+    return result
+
+
+def _pool_sentence_spans(chunks: List[str], batch_size: int) -> List[List[Tuple[int, int]]]:
+    """进程池任务：在子进程中分句（管线按进程缓存）"""
+    global _worker_sentence_nlp
+    if _worker_sentence_nlp is None:
+        _worker_sentence_nlp = build_sentence_pipeline()
+    return pipeline_sentence_spans(_worker_sentence_nlp, chunks, batch_size)
+
+
+# 清洗规则（整段清洗与逐行清洗共用）
+_HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+_PAGE_NUMBER_PATTERNS = [
+    re.compile(r'第\s*\d+\s*页'),
+    re.compile(r'-\s*\d+\s*-'),
+]
+# 版权声明模式
+_COPYRIGHT_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r'版权所有.*?[保留|所有]',
+        r'Copyright\s*©.*?\d{4}',
+        r'ISBN\s*[\d-]+',
+        r'责任编辑\s*[:：].*',
+        r'封面设计\s*[:：].*',
+        r'出版发行\s*[:：].*',
+        r'印刷\s*[:：].*',
+        r'版次\s*[:：].*',
+        r'印次\s*[:：].*',
+    )
+]
+
 
 class TextProcessor:
     """
@@ -46,18 +106,34 @@ class TextProcessor:
 
     def __init__(self):
         """初始化文本处理器"""
-        self.jieba_initialized = False
-
-        if JIEBA_AVAILABLE:
-            # 设置jieba日志级别
-            import jieba
-            jieba.setLogLevel(jieba.logging.INFO)
-            self.jieba_initialized = True
-            logger.info("✅ jieba初始化成功")
-
-        if SPACY_AVAILABLE and nlp:
-            self.nlp = nlp
-            logger.info("✅ spaCy初始化成功")
+        # 模型在首次使用时加载（见load_jieba_analyse、nlp、_sentence_pipeline）
+        self.jieba_initialized = JIEBA_AVAILABLE
+        self._nlp = None
+        self._nlp_loaded = False
+
+        # 分句专用的精简管线（首次分句时创建）
+        self._sentence_nlp = None
+
+    @staticmethod
+    def load_jieba_analyse():
+        """导入jieba.analyse（首次调用时加载词性标注模型与IDF表）"""
+        load_jieba()
+        import jieba.analyse
+        return jieba.analyse
+
+    @property
+    def nlp(self):
+        """spaCy中文模型（首次访问时加载，未安装时为None）"""
+        if not self._nlp_loaded:
+            self._nlp_loaded = True
+            if SPACY_INSTALLED:
+                import spacy
+                try:
+                    self._nlp = spacy.load("zh_core_web_sm")
+                    logger.info("✅ spaCy初始化成功")
+                except OSError:
+                    logger.warning("⚠️  spaCy中文模型未找到，请运行: python -m spacy download zh_core_web_sm")
+        return self._nlp
 
     def clean_text(self, text: str) -> str:
         """
@@ -73,11 +149,11 @@ class TextProcessor:
             return ""
 
         # 去除HTML标签
-        text = re.sub(r'<[^>]+>', '', text)
+        text = _HTML_TAG_PATTERN.sub('', text)
 
         # 去除页码（如"第123页"、"- 124 -"等模式）
-        text = re.sub(r'第\s*\d+\s*页', '', text)
-        text = re.sub(r'-\s*\d+\s*-', '', text)
+        for pattern in _PAGE_NUMBER_PATTERNS:
+            text = pattern.sub('', text)
 
         # 统一换行符
         text = text.replace('\r\n', '\n').replace('\r', '\n')
@@ -107,27 +183,40 @@ class TextProcessor:
         if not text:
             return ""
 
-        # 版权声明模式
-        copyright_patterns = [
-            r'版权所有.*?[保留|所有]',
-            r'Copyright\s*©.*?\d{4}',
-            r'ISBN\s*[\d-]+',
-            r'责任编辑\s*[:：].*',
-            r'封面设计\s*[:：].*',
-            r'出版发行\s*[:：].*',
-            r'印刷\s*[:：].*',
-            r'版次\s*[:：].*',
-            r'印次\s*[:：].*',
-        ]
-
-        for pattern in copyright_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+        for pattern in _COPYRIGHT_PATTERNS:
+            text = pattern.sub('', text)
 
         # 去除多余空行
         text = re.sub(r'\n{3,}', '\n\n', text)
 
         return text.strip()
 
+    def iter_clean_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        逐行清洗文本（clean_text + remove_redundant_info的流式版本）
+
+        规则与整段清洗一致：去HTML标签、页码、版权信息和行首尾空白，
+        连续空行合并为一个，首尾空行去除。只持有当前行，适合超大文本
+        """
+        started = False
+        pending_blank = False
+        for line in lines:
+            line = _HTML_TAG_PATTERN.sub('', line)
+            for pattern in _PAGE_NUMBER_PATTERNS:
+                line = pattern.sub('', line)
+            line = line.strip()
+            for pattern in _COPYRIGHT_PATTERNS:
+                line = pattern.sub('', line)
+
+            if not line:
+                pending_blank = started
+                continue
+            if pending_blank:
+                yield ""
+                pending_blank = False
+            started = True
+            yield line
+
     def segment_chinese(self, text: str) -> List[str]:
         """
         中文分词
@@ -138,10 +227,8 @@ class TextProcessor:
             logger.warning("⚠️  jieba未初始化，返回空列表")
             return []
 
-        words = jieba.lcut(text)
         # 过滤单字和标点
-        words = [w for w in words if len(w) > 1 and w not in string.punctuation]
-        return words
+        return filter_tokens(load_jieba().lcut(text))
 
     def extract_keywords(
         self,
@@ -165,16 +252,51 @@ class TextProcessor:
             logger.warning("⚠️  jieba未初始化，返回空列表")
             return [] if not with_weight else []
 
+        analyse = self.load_jieba_analyse()
         if with_weight:
-            keywords = jieba.analyse.extract_tags(text, topK=top_k, withWeight=True)
+            keywords = analyse.extract_tags(text, topK=top_k, withWeight=True)
         else:
-            keywords = jieba.analyse.extract_tags(text, topK=top_k, withWeight=False)
+            keywords = analyse.extract_tags(text, topK=top_k, withWeight=False)
 
         return keywords
 
+    def keywords_from_tokens(self, tokens: List[str], top_k: int = 20) -> List[str]:
+        """
+        基于已分好的词提取关键词
+
+        与extract_keywords使用相同的TF-IDF规则（jieba的IDF表与停用词），结果一致，
+        但不再重复分词，适合批量分词之后使用
+        """
+        if not self.jieba_initialized or not tokens:
+            return []
+
+        tfidf = self.load_jieba_analyse().default_tfidf
+        freq = {}
+        for word in tokens:
+            if len(word.strip()) < 2 or word.lower() in tfidf.stop_words:
+                continue
+            freq[word] = freq.get(word, 0.0) + 1.0
+        total = sum(freq.values())
+        for word in freq:
+            freq[word] *= tfidf.idf_freq.get(word, tfidf.median_idf) / total
+
+        return sorted(freq, key=freq.__getitem__, reverse=True)[:top_k]
+
+    def build_tfidf_model(self, store: BookTokenStore) -> BookTfidf:
+        """
+        基于分词存储构建整书TF-IDF模型
+
+        IDF按书内段落统计，停用词沿用jieba.analyse的停用词表
+        """
+        stop_words = self.load_jieba_analyse().default_tfidf.stop_words if self.jieba_initialized else ()
+        return BookTfidf.build(store, stop_words=stop_words)
+
     def split_text_by_paragraph(self, text: str) -> List[str]:
         """
-        按段落分割文本
+        按段落分割文本（每个非空行为一段）
+
+        解析得到的章节正文已在入库前做过段落重排（见ParagraphReflow），
+        PDF的折行已合并，按行切分即得到真实段落
 
         返回: 段落列表
         """
@@ -195,20 +317,118 @@ class TextProcessor:
 
         返回: 句子列表
         """
+        return [text[start:end] for start, end in self.sentence_spans(text)]
+
+    @property
+    def spacy_sentence_split(self) -> bool:
+        """是否使用spaCy分句（已安装spaCy且配置开启）"""
+        return SPACY_INSTALLED and settings.spacy_sentence_split
+
+    def _sentence_pipeline(self):
+        """分句专用的spaCy管线（首次分句时创建，见build_sentence_pipeline）"""
+        if self._sentence_nlp is None:
+            self._sentence_nlp = build_sentence_pipeline()
+        return self._sentence_nlp
+
+    def sentence_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        按句子分割文本，只返回位置（不复制句子文本）
+
+        首尾空白已去除、空句已跳过
+
+        返回: [(起始位置, 结束位置), ...]
+        """
         if not text:
             return []
+        return self.sentence_spans_batch([text])[0][0]
 
-        if SPACY_AVAILABLE and self.nlp:
-            # 使用spaCy分句
-            doc = self.nlp(text)
-            sentences = [sent.text.strip() for sent in doc.sents]
-        else:
-            # 简单的正则表达式分句
-            # 匹配中文句号、问号、感叹号
-            sentences = re.split(r'[。！？；]+', text)
-            sentences = [s.strip() for s in sentences if s.strip()]
+    def sentence_spans_batch(self, texts: List[str]) -> Tuple[List[List[Tuple[int, int]]], Dict]:
+        """
+        批量分句（整本书的各章一次性处理）
+
+        使用spaCy时，各章按换行切成不超过spacy_chunk_chars的分块，统一送入nlp.pipe，
+        文本量较大时按分片提交到与批量分词共用的spawn进程池；未使用spaCy时按正则分句
 
-        return sentences
+        不使用nlp.pipe的n_process：spaCy按multiprocessing默认方式（Linux上为fork）启动子进程，
+        而分句通常在服务进程的线程中执行（asyncio.to_thread），fork多线程进程会复制
+        loguru、SQLite连接与jieba的锁状态
+
+        返回:
+            (每个文本的句子位置列表, 分句统计{backend, texts, chunks, processes, seconds})
+        """
+        started = time.perf_counter()
+        spans: List[List[Tuple[int, int]]] = [[] for _ in texts]
+
+        if not self.spacy_sentence_split:
+            for index, text in enumerate(texts):
+                spans[index] = list(iter_sentence_spans(text)) if text else []
+            return spans, {
+                "backend": "regex",
+                "texts": len(texts),
+                "chunks": len(texts),
+                "processes": 1,
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+
+        chunks = [
+            (index, offset, chunk)
+            for index, text in enumerate(texts) if text
+            for offset, chunk in iter_text_chunks(text, settings.spacy_chunk_chars)
+        ]
+        total_chars = sum(len(text) for text in texts)
+        processes = resolve_worker_count(settings.nlp_workers) if total_chars >= MIN_PARALLEL_CHARS else 1
+        processes = max(min(processes, len(chunks)), 1)
+
+        chunk_texts = [chunk for _, _, chunk in chunks]
+        chunk_spans = None
+        if processes > 1:
+            shards = plan_text_shards(chunk_texts, total_chars // (processes * 4) + 1)
+            try:
+                pool = get_pool(processes)
+                # map保持提交顺序，分片又是连续区间，直接拼接即与分块对齐
+                chunk_spans = [
+                    shard_spans
+                    for shard in pool.map(
+                        _pool_sentence_spans,
+                        [chunk_texts[start:end] for start, end in shards],
+                        [settings.spacy_batch_size] * len(shards)
+                    )
+                    for shard_spans in shard
+                ]
+            except BrokenProcessPool:
+                # 子进程异常退出时丢弃进程池（下次调用重建），本次退回单进程分句
+                shutdown_pool()
+                processes = 1
+        if chunk_spans is None:
+            chunk_spans = pipeline_sentence_spans(self._sentence_pipeline(), chunk_texts, settings.spacy_batch_size)
+
+        for (index, offset, _), sentence_spans in zip(chunks, chunk_spans):
+            spans[index].extend((offset + start, offset + end) for start, end in sentence_spans)
+
+        return spans, {
+            "backend": "spacy",
+            "texts": len(texts),
+            "chunks": len(chunks),
+            "processes": processes,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    def split_sentences_with_offsets(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        按句子分割文本并保留位置
+
+        返回: [(起始位置, 结束位置, 句子), ...]，text[起始:结束] == 句子
+        """
+        return [(start, end, text[start:end]) for start, end in self.sentence_spans(text)]
+
+    def build_sentence_index(self, contents: List[str]) -> Tuple[SentenceIndex, Dict]:
+        """
+        对整本书（按章节顺序的正文）批量分句一次，构建句子索引
+
+        返回: (句子索引, 分句统计)
+        """
+        spans, stats = self.sentence_spans_batch(contents)
+        return SentenceIndex.build(contents, spans), stats
 
     def extract_key_sentences(
         self,
@@ -217,7 +437,7 @@ class TextProcessor:
         window_size: int = 3
     ) -> List[Tuple[str, int]]:
         """
-        提取关键句（基于TextRank简化版）
+        提取关键句（基于TextRank）
 
         参数:
             text: 文本
@@ -237,33 +457,70 @@ class TextProcessor:
             # 如果句子数量少于top_k，全部返回
             return [(s, 1.0) for s in sentences]
 
-        # 简化的TextRank算法
-        # 1. 分词并过滤停用词
-        word_lists = []
-        for sent in sentences:
-            words = self.segment_chinese(sent)
-            word_lists.append(words)
-
-        # 2. 构建词共现矩阵
-        from collections import defaultdict
-        word_freq = defaultdict(int)
-
-        for words in word_lists:
-            unique_words = set(words)
-            for word in unique_words:
-                word_freq[word] += 1
-
-        # 3. 计算句子得分
-        sentence_scores = []
-        for i, words in enumerate(word_lists):
-            score = sum(word_freq[w] for w in words)
-            # 归一化
-            score = score / max(len(words), 1)
-            sentence_scores.append((sentences[i], score))
-
-        # 4. 排序并返回top_k
-        sentence_scores.sort(key=lambda x: x[1], reverse=True)
-        return sentence_scores[:top_k]
+        word_lists = [self.segment_chinese(sent) for sent in sentences]
+        return [
+            (sentences[index], score)
+            for index, score in self.rank_key_sentences(word_lists, top_k=top_k)
+        ]
+
+    def rank_key_sentences(self, word_lists: List[List[str]], top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        基于已分好的词为句子打分（TextRank）
+
+        参数:
+            word_lists: 每个句子的词列表
+            top_k: 返回前k个句子
+
+        返回:
+            [(句子下标, 重要性分数), ...]，按分数降序
+        """
+        if len(word_lists) <= top_k:
+            return [(index, 1.0) for index in range(len(word_lists))]
+
+        token_ids, offsets = encode_word_lists(word_lists)
+        scores = textrank_scores(token_ids, offsets)
+        return [(index, float(scores[index])) for index in top_sentences(scores, top_k)]
+
+    def key_sentences_from_store(
+        self,
+        store: BookTokenStore,
+        chapter_index: int,
+        top_k: int = 5
+    ) -> List[Tuple[int, float]]:
+        """
+        基于分词存储为章节句子打分（TextRank，直接使用存储中的词ID，不重新分词）
+
+        返回:
+            [(全书句子下标, 重要性分数), ...]，按分数降序
+        """
+        start, end = store.chapter_sentence_range(chapter_index)
+        if end - start <= top_k:
+            return [(index, 1.0) for index in range(start, end)]
+
+        scores = textrank_scores(store.token_ids, store.sentence_offsets[start:end + 1])
+        return [(start + index, float(scores[index])) for index in top_sentences(scores, top_k)]
+
+    def keywords_from_store(
+        self,
+        store: BookTokenStore,
+        sentence_index: Optional[int] = None,
+        chapter_index: Optional[int] = None,
+        top_k: int = 20
+    ) -> List[str]:
+        """
+        基于分词存储提取句子或章节的关键词（不重新分词）
+
+        参数:
+            sentence_index: 全书句子下标（优先）
+            chapter_index: 章节下标（sentence_index为None时使用）
+        """
+        if sentence_index is not None:
+            tokens = store.sentence_tokens(sentence_index)
+        elif chapter_index is not None:
+            tokens = [word for words in store.chapter_token_lists(chapter_index) for word in words]
+        else:
+            return []
+        return self.keywords_from_tokens(tokens, top_k=top_k)
 
     def truncate_text(
         self,
@@ -296,15 +553,7 @@ class TextProcessor:
         """
         if not text:
             return 0
-
-        # 统计中文字符
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-
-        # 统计英文单词
-        english_text = re.sub(r'[\u4e00-\u9fff]', ' ', text)
-        english_words = len(english_text.split())
-
-        return chinese_chars + english_words
+        return text_stats(text)["words"]
 
     def detect_language(self, text: str) -> str:
         """
@@ -314,16 +563,7 @@ class TextProcessor:
         """
         if not text:
             return 'unknown'
-
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        total_chars = len(text)
-
-        if chinese_chars / total_chars > 0.3:
-            return 'zh'
-        elif chinese_chars / total_chars < 0.1:
-            return 'en'
-        else:
-            return 'mixed'
+        return text_stats(text)["language"]
 
 
 # 全局单例
@@ -0,0 +1,174 @@
+"""
+文本统计
+把多段文本（通常是整本书的各章）一次编码为码点数组，逐字符分类后按段向量化汇总：
+中文/拉丁字母/数字字符数、字数、语言、段落数、句子数与术语候选密度一次算出，
+不再由各处分别用正则重复扫描、构造中间字符串
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+# 句末标点（含换行），与诊断评估的分句规则一致
+SENTENCE_TERMINATORS = "。！？!?\n"
+
+# str.split()/str.strip()视为空白的字符
+_WHITESPACE = np.zeros(0x3001, dtype=bool)
+_WHITESPACE[[
+    *range(0x09, 0x0E), *range(0x1C, 0x21), 0x85, 0xA0, 0x1680,
+    *range(0x2000, 0x200B), 0x2028, 0x2029, 0x202F, 0x205F, 0x3000
+]] = True
+
+# 字符类别（用于连续同类字符的分段）
+_OTHER, _LATIN, _DIGIT, _CJK = 0, 1, 2, 3
+# 术语候选的最短长度：英文单词3个字母、中文连续4个汉字，数字不限
+_MIN_TERM_LENGTH = {_LATIN: 3, _DIGIT: 1, _CJK: 4}
+
+
+def classify_language(chinese_chars: int, total_chars: int) -> str:
+    """按中文字符占比判断语言：'zh'、'en'、'mixed'，空文本为'unknown'"""
+    if total_chars == 0:
+        return 'unknown'
+    if chinese_chars / total_chars > 0.3:
+        return 'zh'
+    elif chinese_chars / total_chars < 0.1:
+        return 'en'
+    else:
+        return 'mixed'
+
+
+def _count_per_text(positions: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """按位置所在的文本计数"""
+    owners = np.searchsorted(starts, positions, side="right") - 1
+    return np.bincount(owners, minlength=len(starts))
+
+
+def _count_distinct_per_text(groups: np.ndarray, positions: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    统计每段文本中出现的不同分组数（分组编号随位置单调不减，如行号、句号）
+
+    参数:
+        groups: 各位置所属的分组编号
+        positions: 位置（与groups等长，升序）
+    """
+    if len(groups) == 0:
+        return np.zeros(len(starts), dtype=np.int64)
+    first = np.ones(len(groups), dtype=bool)
+    first[1:] = groups[1:] != groups[:-1]
+    return _count_per_text(positions[first], starts)
+
+
+def compute_text_stats(texts: Sequence[str], terminators: str = SENTENCE_TERMINATORS) -> List[Dict]:
+    """
+    一次计算多段文本的统计信息
+
+    参数:
+        texts: 文本列表（如整本书按顺序的各章正文）
+        terminators: 句末字符（句子以这些字符或文本结尾结束，去除空白后为空的不计）
+
+    返回:
+        与texts一一对应的统计 [{
+            "chars": 字符数, "cjk_chars": 中文字符数, "latin_chars": 拉丁字母数, "digits": 数字字符数,
+            "english_words": 英文单词数（去掉中文后按空白切分的片段数）,
+            "words": 字数（中文按字、英文按词，与TextProcessor.count_words一致）,
+            "language": 语言, "paragraphs": 非空行数, "sentences": 句子数,
+            "avg_sentence_length": 平均句长（字符）,
+            "term_candidates": 术语候选数（≥3字母的英文词、数字串、≥4字的连续汉字），
+            "term_density": 术语候选数 / 词形单位数（中文按字、英文按词、数字按串）
+        }, ...]
+    """
+    if not texts:
+        return []
+
+    # 各段之间及末尾补一个换行：换行是空白、行边界与句边界，统计不会跨段
+    joined = "\n".join(texts) + "\n"
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+
+    cjk = (codes >= 0x4E00) & (codes <= 0x9FFF)
+    folded = codes | 0x20
+    latin = (folded >= ord('a')) & (folded <= ord('z'))
+    digit = ((codes >= ord('0')) & (codes <= ord('9'))) | ((codes >= 0xFF10) & (codes <= 0xFF19))
+    whitespace = _WHITESPACE[np.minimum(codes, 0x3000)] & (codes <= 0x3000)
+    visible = ~whitespace
+
+    cjk_chars = np.add.reduceat(cjk, starts)
+    latin_chars = np.add.reduceat(latin, starts)
+    digits = np.add.reduceat(digit, starts)
+
+    # 英文单词：去掉中文后按空白切分的片段，即"非空白且非中文"的连续段
+    separator = whitespace | cjk
+    word_start = ~separator
+    word_start[1:] &= separator[:-1]
+    english_words = np.add.reduceat(word_start, starts)
+
+    # 段落（非空行）与句子：含可见字符的行/句
+    visible_positions = np.flatnonzero(visible)
+    line_ids = np.cumsum(codes == ord('\n'))[visible_positions]
+    paragraphs = _count_distinct_per_text(line_ids, visible_positions, starts)
+
+    is_terminator = np.isin(codes, np.frombuffer(terminators.encode("utf-32-le"), dtype=np.uint32))
+    # 句末字符属于它所结束的句子
+    sentence_ids = (np.cumsum(is_terminator) - is_terminator)[visible_positions]
+    sentences = _count_distinct_per_text(sentence_ids, visible_positions, starts)
+
+    # 同类字符的连续段：英文词、数字串、汉字串
+    classes = np.zeros(len(codes), dtype=np.int8)
+    classes[latin] = _LATIN
+    classes[digit] = _DIGIT
+    classes[cjk] = _CJK
+    run_starts = np.flatnonzero(np.concatenate(([True], classes[1:] != classes[:-1])))
+    run_lengths = np.diff(np.append(run_starts, len(codes)))
+    run_classes = classes[run_starts]
+    word_like = (run_classes == _LATIN) | (run_classes == _DIGIT)
+    min_lengths = np.zeros(_CJK + 1, dtype=np.int64)
+    for run_class, min_length in _MIN_TERM_LENGTH.items():
+        min_lengths[run_class] = min_length
+    is_term = (run_classes != _OTHER) & (run_lengths >= min_lengths[run_classes])
+    word_like_counts = _count_per_text(run_starts[word_like], starts)
+    term_counts = _count_per_text(run_starts[is_term], starts)
+
+    results = []
+    for index, chars in enumerate(lengths.tolist()):
+        cjk_count = int(cjk_chars[index])
+        sentence_count = int(sentences[index])
+        # 词形单位：中文按字、英文按词、数字按串
+        word_like_count = cjk_count + int(word_like_counts[index])
+        results.append({
+            "chars": chars,
+            "cjk_chars": cjk_count,
+            "latin_chars": int(latin_chars[index]),
+            "digits": int(digits[index]),
+            "english_words": int(english_words[index]),
+            "words": cjk_count + int(english_words[index]),
+            "language": classify_language(cjk_count, chars),
+            "paragraphs": int(paragraphs[index]),
+            "sentences": sentence_count,
+            "avg_sentence_length": round(chars / max(sentence_count, 1), 2),
+            "term_candidates": int(term_counts[index]),
+            "term_density": round(int(term_counts[index]) / word_like_count, 4) if word_like_count else 0.0
+        })
+    return results
+
+
+def text_stats(text: str, terminators: str = SENTENCE_TERMINATORS) -> Dict:
+    """单段文本的统计信息（见compute_text_stats）"""
+    return compute_text_stats([text or ""], terminators)[0]
+
+
+def summarize_text_stats(stats: Sequence[Dict]) -> Dict:
+    """
+    汇总compute_text_stats的逐段结果为全书统计（不再扫描文本）
+
+    返回:
+        {"chars": 字符数, "lines": 非空行数, "words": 字数, "language": 语言}
+    """
+    chars = sum(entry["chars"] for entry in stats)
+    return {
+        "chars": chars,
+        "lines": sum(entry["paragraphs"] for entry in stats),
+        "words": sum(entry["words"] for entry in stats),
+        "language": classify_language(sum(entry["cjk_chars"] for entry in stats), chars)
+    }
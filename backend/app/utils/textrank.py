@@ -0,0 +1,134 @@
+"""
+句子级TextRank
+句子之间按共有词数计算相似度，构造相似度矩阵后用幂迭代求PageRank得分。
+长章节切成相互重叠的句子窗口分别计算，窗口内是向量化的矩阵运算，整体代价随句子数近似线性增长
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+
+# 每个窗口的句子数
+WINDOW_SIZE = 200
+# 相邻窗口重叠的句子数（重叠部分取平均，避免窗口边界处得分跳变）
+WINDOW_OVERLAP = 50
+DAMPING = 0.85
+MAX_ITER = 100
+TOLERANCE = 1e-6
+
+
+def similarity_matrix(token_ids: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    计算句子相似度矩阵
+
+    sim(i, j) = |Si ∩ Sj| / (log(1+|Si|) + log(1+|Sj|))，对角线为0
+
+    与TextRank原始公式相比分母加1平滑：原公式中只有一两个词的短句分母接近0，
+    相似度被放大，会挤占关键句名额
+
+    参数:
+        token_ids: 句子的词ID拼接成的扁平数组
+        offsets: 长度为句子数+1的偏移数组，第i句为token_ids[offsets[i]:offsets[i+1]]
+    """
+    sentence_count = len(offsets) - 1
+    if sentence_count <= 0 or len(token_ids) == 0:
+        return np.zeros((max(sentence_count, 0), max(sentence_count, 0)))
+
+    lengths = np.diff(offsets)
+    rows = np.repeat(np.arange(sentence_count), lengths)
+    # 压缩为窗口内的局部词表，矩阵列数只与窗口内的词数有关
+    _, columns = np.unique(token_ids, return_inverse=True)
+
+    incidence = np.zeros((sentence_count, int(columns.max()) + 1), dtype=np.float32)
+    incidence[rows, columns] = 1.0
+
+    # 共有词数（按去重后的词计）
+    overlap = incidence @ incidence.T
+    np.fill_diagonal(overlap, 0.0)
+
+    log_lengths = np.log1p(incidence.sum(axis=1))
+    denominator = log_lengths[:, None] + log_lengths[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity = np.where(denominator > 1e-12, overlap / denominator, 0.0)
+    return similarity
+
+
+def pagerank(similarity: np.ndarray, damping: float = DAMPING, max_iter: int = MAX_ITER, tol: float = TOLERANCE) -> np.ndarray:
+    """
+    加权PageRank幂迭代
+
+    score = (1 - d) + d * Mᵀ · score，M为按行归一化的相似度矩阵；
+    没有任何相似句的孤立句子得分为1 - d
+    """
+    count = similarity.shape[0]
+    if count == 0:
+        return np.zeros(0)
+
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, row_sums, out=np.zeros_like(similarity), where=row_sums > 0).T
+
+    scores = np.ones(count)
+    for _ in range(max_iter):
+        updated = (1 - damping) + damping * (transition @ scores)
+        converged = np.abs(updated - scores).max() < tol
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def textrank_scores(
+    token_ids: np.ndarray,
+    offsets: np.ndarray,
+    window_size: int = WINDOW_SIZE,
+    overlap: int = WINDOW_OVERLAP
+) -> np.ndarray:
+    """
+    计算每个句子的TextRank得分
+
+    句子数超过window_size时按窗口分别计算：每个窗口的得分先归一化为均值1，
+    重叠部分取平均，使不同窗口的得分可以直接比较
+
+    参数:
+        token_ids: 句子的词ID拼接成的扁平数组
+        offsets: 长度为句子数+1的偏移数组（可以不从0开始）
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sentence_count = len(offsets) - 1
+    if sentence_count <= 0:
+        return np.zeros(0)
+
+    step = max(window_size - overlap, 1)
+    starts = list(range(0, max(sentence_count - overlap, 1), step))
+
+    totals = np.zeros(sentence_count)
+    counts = np.zeros(sentence_count)
+    for start in starts:
+        end = min(start + window_size, sentence_count)
+        window_offsets = offsets[start:end + 1]
+        window_ids = token_ids[window_offsets[0]:window_offsets[-1]]
+        scores = pagerank(similarity_matrix(window_ids, window_offsets - window_offsets[0]))
+        mean = scores.mean()
+        if mean > 0:
+            scores = scores / mean
+        totals[start:end] += scores
+        counts[start:end] += 1
+
+    return totals / np.maximum(counts, 1)
+
+
+def top_sentences(scores: np.ndarray, top_k: int) -> List[int]:
+    """得分最高的top_k个句子下标（得分相同时保持原文顺序）"""
+    return np.argsort(-scores, kind="stable")[:top_k].tolist()
+
+
+def encode_word_lists(word_lists: Sequence[Sequence[str]]):
+    """把词列表编码为(扁平词ID数组, 偏移数组)，供未使用分词存储的调用方使用"""
+    word_index = {}
+    ids = []
+    offsets = [0]
+    for words in word_lists:
+        for word in words:
+            ids.append(word_index.setdefault(word, len(word_index)))
+        offsets.append(len(ids))
+    return np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64)
@@ -0,0 +1,213 @@
+"""
+整书TF-IDF模型
+以书内段落为文档统计IDF（比jieba通用IDF表更贴合古文、译著等特定语料），
+一次向量化计算出全书每个句子、段落、章节的关键词矩阵，随分词存储一起持久化
+"""
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from app.utils.config import settings
+from app.utils.token_store import BookTokenStore, NpzCache, VOCAB_SEPARATOR
+
+
+TFIDF_SUFFIX = ".tfidf.npz"
+# 每个句子/段落/章节保留的关键词数
+KEYWORDS_PER_UNIT = 10
+
+
+def top_keywords(
+    token_ids: np.ndarray,
+    units: np.ndarray,
+    unit_count: int,
+    weights: np.ndarray,
+    top_k: int = KEYWORDS_PER_UNIT
+) -> np.ndarray:
+    """
+    按TF-IDF为每个单元（句子/段落/章节）选出关键词
+
+    得分 = (1 + log词频) × IDF；词频取对数，避免"我们""他们"等高频虚词在章节这类长单元中压过实词
+
+    参数:
+        token_ids: 全书词ID数组
+        units: 每个词所属的单元下标（与token_ids等长）
+        unit_count: 单元数
+        weights: 每个词ID的IDF（<=0的词不参与，如停用词、每段都出现的词）
+        top_k: 每个单元保留的关键词数
+
+    返回:
+        (unit_count, top_k)的词ID矩阵，按TF-IDF降序，不足处填-1
+    """
+    result = np.full((unit_count, top_k), -1, dtype=np.int32)
+
+    keep = weights[token_ids] > 0
+    ids = token_ids[keep].astype(np.int64)
+    units = units[keep].astype(np.int64)
+    if len(ids) == 0:
+        return result
+
+    # (单元, 词)对的出现次数即词频；单元内按得分排序，得分相同按词ID（书中首次出现顺序）
+    vocab_size = len(weights)
+    pairs, counts = np.unique(units * vocab_size + ids, return_counts=True)
+    pair_units = pairs // vocab_size
+    pair_ids = pairs % vocab_size
+    order = np.lexsort((-((1 + np.log(counts)) * weights[pair_ids]), pair_units))
+    pair_units = pair_units[order]
+    pair_ids = pair_ids[order]
+
+    # 每个词在所属单元内的名次
+    ranks = np.arange(len(order)) - np.searchsorted(pair_units, pair_units, side="left")
+    selected = ranks < top_k
+    result[pair_units[selected], ranks[selected]] = pair_ids[selected]
+    return result
+
+
+class BookTfidf:
+    """
+    整书TF-IDF模型
+
+    - idf[word_id] = log(段落数 / 包含该词的段落数)，停用词与单字为0
+    - sentence_keyword_ids / paragraph_keyword_ids / chapter_keyword_ids 为各单元的关键词ID矩阵
+    - paragraph_keys 为升序的"章节下标 * paragraph_stride + 章内段落下标"，用于定位段落行
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        idf: np.ndarray,
+        sentence_keyword_ids: np.ndarray,
+        paragraph_keyword_ids: np.ndarray,
+        paragraph_keys: np.ndarray,
+        paragraph_stride: int,
+        chapter_keyword_ids: np.ndarray
+    ):
+        self.vocab = vocab
+        self.idf = idf
+        self.sentence_keyword_ids = sentence_keyword_ids
+        self.paragraph_keyword_ids = paragraph_keyword_ids
+        self.paragraph_keys = paragraph_keys
+        self.paragraph_stride = paragraph_stride
+        self.chapter_keyword_ids = chapter_keyword_ids
+
+    @classmethod
+    def build(cls, store: BookTokenStore, stop_words: Iterable[str] = (), top_k: int = KEYWORDS_PER_UNIT) -> "BookTfidf":
+        """由分词存储构建（一次性计算全书所有单元的关键词）"""
+        sentence_count = store.num_sentences
+        token_ids = store.token_ids.astype(np.int64)
+
+        # 每个词所属的句子，每个句子所属的章节与全书段落
+        sentence_of_token = np.repeat(np.arange(sentence_count), np.diff(store.sentence_offsets))
+        chapter_of_sentence = np.repeat(np.arange(store.num_chapters), np.diff(store.chapter_offsets))
+        paragraph_stride = int(store.sentence_paragraphs.max()) + 1 if sentence_count else 1
+        paragraph_keys, paragraph_of_sentence = np.unique(
+            chapter_of_sentence.astype(np.int64) * paragraph_stride + store.sentence_paragraphs,
+            return_inverse=True
+        )
+        paragraph_of_token = paragraph_of_sentence[sentence_of_token]
+
+        # 段落频率 -> IDF
+        vocab_size = len(store.vocab)
+        paragraph_count = max(len(paragraph_keys), 1)
+        pairs = np.unique(paragraph_of_token * vocab_size + token_ids)
+        document_freq = np.bincount(pairs % vocab_size, minlength=vocab_size)
+        idf = np.log(paragraph_count / np.maximum(document_freq, 1))
+
+        # 与jieba.analyse相同的过滤规则：去首尾空白后不足2字或属于停用词
+        stop_words = {word.lower() for word in stop_words}
+        excluded = np.fromiter(
+            (len(word.strip()) < 2 or word.lower() in stop_words for word in store.vocab),
+            dtype=bool,
+            count=vocab_size
+        )
+        idf[excluded] = 0.0
+
+        return cls(
+            vocab=store.vocab,
+            idf=idf.astype(np.float32),
+            sentence_keyword_ids=top_keywords(token_ids, sentence_of_token, sentence_count, idf, top_k),
+            paragraph_keyword_ids=top_keywords(token_ids, paragraph_of_token, len(paragraph_keys), idf, top_k),
+            paragraph_keys=paragraph_keys,
+            paragraph_stride=paragraph_stride,
+            chapter_keyword_ids=top_keywords(token_ids, chapter_of_sentence[sentence_of_token], store.num_chapters, idf, top_k)
+        )
+
+    @property
+    def num_chapters(self) -> int:
+        return len(self.chapter_keyword_ids)
+
+    def _decode(self, row: np.ndarray, top_k: int) -> List[str]:
+        vocab = self.vocab
+        return [vocab[word_id] for word_id in row[:top_k].tolist() if word_id >= 0]
+
+    def sentence_keywords(self, sentence_index: int, top_k: int = 5) -> List[str]:
+        """句子关键词（全书句子下标）"""
+        return self._decode(self.sentence_keyword_ids[sentence_index], top_k)
+
+    def paragraph_keywords(self, chapter_index: int, paragraph_index: int, top_k: int = 5) -> List[str]:
+        """段落关键词（章节下标 + 章内段落下标）；段落内没有句子起点时返回空列表"""
+        if paragraph_index >= self.paragraph_stride:
+            return []
+        key = chapter_index * self.paragraph_stride + paragraph_index
+        row = int(np.searchsorted(self.paragraph_keys, key))
+        if row >= len(self.paragraph_keys) or self.paragraph_keys[row] != key:
+            return []
+        return self._decode(self.paragraph_keyword_ids[row], top_k)
+
+    def chapter_keywords(self, chapter_index: int, top_k: int = 5) -> List[str]:
+        """章节关键词"""
+        return self._decode(self.chapter_keyword_ids[chapter_index], top_k)
+
+    def save(self, file):
+        """保存为npz（file可以是路径或已打开的二进制文件）"""
+        vocab_bytes = VOCAB_SEPARATOR.join(self.vocab).encode("utf-8")
+        np.savez(
+            file,
+            vocab=np.frombuffer(vocab_bytes, dtype=np.uint8),
+            idf=self.idf,
+            sentence_keyword_ids=self.sentence_keyword_ids,
+            paragraph_keyword_ids=self.paragraph_keyword_ids,
+            paragraph_keys=self.paragraph_keys,
+            paragraph_stride=np.array(self.paragraph_stride),
+            chapter_keyword_ids=self.chapter_keyword_ids
+        )
+
+    @classmethod
+    def load(cls, file) -> "BookTfidf":
+        with np.load(file) as data:
+            vocab_text = data["vocab"].tobytes().decode("utf-8")
+            return cls(
+                vocab=vocab_text.split(VOCAB_SEPARATOR) if vocab_text else [],
+                idf=data["idf"],
+                sentence_keyword_ids=data["sentence_keyword_ids"],
+                paragraph_keyword_ids=data["paragraph_keyword_ids"],
+                paragraph_keys=data["paragraph_keys"],
+                paragraph_stride=int(data["paragraph_stride"]),
+                chapter_keyword_ids=data["chapter_keyword_ids"]
+            )
+
+
+class TfidfCache(NpzCache):
+    """TF-IDF模型的磁盘缓存（与分词存储放在同一目录）"""
+
+    suffix = TFIDF_SUFFIX
+    label = "TF-IDF模型"
+    record_type = BookTfidf
+
+    def __init__(self, cache_dir: Optional[Path] = None, enabled: Optional[bool] = None):
+        super().__init__(
+            cache_dir=cache_dir or settings.token_store_dir,
+            enabled=settings.token_store_enabled if enabled is None else enabled
+        )
+
+
+# 全局单例
+_tfidf_cache: Optional[TfidfCache] = None
+
+
+def get_tfidf_cache() -> TfidfCache:
+    """获取TF-IDF模型缓存单例"""
+    global _tfidf_cache
+    if _tfidf_cache is None:
+        _tfidf_cache = TfidfCache()
+    return _tfidf_cache
@@ -0,0 +1,256 @@
+"""
+整书分词存储
+入库时把整本书的分词结果编码为"书内词表 + 整数数组"，借助句子索引按章节/段落/句子切片，
+关键句、关键词、证据构建、诊断等环节直接读取，不再重复调用jieba
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.utils.config import settings
+from app.utils.parse_cache import ParseCache
+from app.utils.sentence_index import SentenceIndex
+
+
+TOKEN_STORE_SUFFIX = ".tokens.npz"
+
+# 词表持久化时的分隔符（分词结果中不会出现NUL字符）
+VOCAB_SEPARATOR = "\x00"
+
+
+class BookTokenStore:
+    """
+    整书分词结果
+
+    全书所有句子的词按顺序拼接为一个扁平的整数数组，通过偏移数组切片：
+
+    - token_ids[sentence_offsets[i]:sentence_offsets[i+1]] 为第i句（全书下标）的词ID
+    - 句子的位置、所属章节与段落来自句子索引sentences（见SentenceIndex）
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        token_ids: np.ndarray,
+        sentence_offsets: np.ndarray,
+        sentences: SentenceIndex
+    ):
+        self.vocab = vocab
+        self.token_ids = token_ids
+        self.sentence_offsets = sentence_offsets
+        self.sentences = sentences
+        self._word_index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def build(cls, sentences: SentenceIndex, token_lists: Sequence[List[str]]) -> "BookTokenStore":
+        """
+        由句子索引与分词结果构建
+
+        参数:
+            sentences: 整书句子索引
+            token_lists: 全书句子按顺序的词列表（与句子索引一一对应）
+        """
+        word_index: Dict[str, int] = {}
+        ids: List[int] = []
+        sentence_offsets = [0]
+        for words in token_lists:
+            for word in words:
+                word_id = word_index.get(word)
+                if word_id is None:
+                    word_id = word_index[word] = len(word_index)
+                ids.append(word_id)
+            sentence_offsets.append(len(ids))
+
+        store = cls(
+            vocab=list(word_index),
+            token_ids=np.array(ids, dtype=np.uint32 if len(word_index) > 0xFFFF else np.uint16),
+            sentence_offsets=np.array(sentence_offsets, dtype=np.int64),
+            sentences=sentences
+        )
+        store._word_index = word_index
+        return store
+
+    # ---------- 基本信息 ----------
+
+    @property
+    def chapter_offsets(self) -> np.ndarray:
+        return self.sentences.chapter_offsets
+
+    @property
+    def sentence_spans(self) -> np.ndarray:
+        return self.sentences.spans
+
+    @property
+    def sentence_paragraphs(self) -> np.ndarray:
+        return self.sentences.paragraphs
+
+    @property
+    def num_chapters(self) -> int:
+        return len(self.chapter_offsets) - 1
+
+    @property
+    def num_sentences(self) -> int:
+        return len(self.sentence_offsets) - 1
+
+    @property
+    def num_tokens(self) -> int:
+        return len(self.token_ids)
+
+    def nbytes(self) -> int:
+        """数组占用的字节数（不含词表）"""
+        return self.token_ids.nbytes + self.sentence_offsets.nbytes + self.sentences.nbytes()
+
+    def stats(self) -> Dict:
+        return {
+            "chapters": self.num_chapters,
+            "sentences": self.num_sentences,
+            "tokens": self.num_tokens,
+            "vocab": len(self.vocab),
+            "bytes": self.nbytes()
+        }
+
+    def word_id(self, word: str) -> Optional[int]:
+        """词 -> 书内词ID（不在词表中返回None）"""
+        if self._word_index is None:
+            self._word_index = {word: index for index, word in enumerate(self.vocab)}
+        return self._word_index.get(word)
+
+    # ---------- 句子 ----------
+
+    def chapter_sentence_range(self, chapter_index: int) -> Tuple[int, int]:
+        """第chapter_index章的句子区间（全书句子下标，左闭右开）"""
+        return self.sentences.chapter_range(chapter_index)
+
+    def sentence_ids(self, sentence_index: int) -> np.ndarray:
+        """句子的词ID数组（视图，不复制）"""
+        return self.token_ids[self.sentence_offsets[sentence_index]:self.sentence_offsets[sentence_index + 1]]
+
+    def sentence_tokens(self, sentence_index: int) -> List[str]:
+        """句子的词列表"""
+        vocab = self.vocab
+        return [vocab[word_id] for word_id in self.sentence_ids(sentence_index).tolist()]
+
+    def chapter_token_lists(self, chapter_index: int) -> List[List[str]]:
+        """章节内每个句子的词列表"""
+        start, end = self.chapter_sentence_range(chapter_index)
+        return [self.sentence_tokens(index) for index in range(start, end)]
+
+    # ---------- 段落 ----------
+
+    def paragraph_sentence_range(self, chapter_index: int, paragraph_index: int) -> Tuple[int, int]:
+        """章内第paragraph_index段的句子区间（全书句子下标，左闭右开）"""
+        return self.sentences.paragraph_range(chapter_index, paragraph_index)
+
+    def paragraph_ids(self, chapter_index: int, paragraph_index: int) -> np.ndarray:
+        """段落的词ID数组"""
+        start, end = self.paragraph_sentence_range(chapter_index, paragraph_index)
+        return self.token_ids[self.sentence_offsets[start]:self.sentence_offsets[end]]
+
+    def paragraph_tokens(self, chapter_index: int, paragraph_index: int) -> List[str]:
+        """段落的词列表"""
+        vocab = self.vocab
+        return [vocab[word_id] for word_id in self.paragraph_ids(chapter_index, paragraph_index).tolist()]
+
+    # ---------- 持久化 ----------
+
+    def save(self, file):
+        """保存为npz（file可以是路径或已打开的二进制文件）"""
+        vocab_bytes = VOCAB_SEPARATOR.join(self.vocab).encode("utf-8")
+        np.savez(
+            file,
+            vocab=np.frombuffer(vocab_bytes, dtype=np.uint8),
+            token_ids=self.token_ids,
+            sentence_offsets=self.sentence_offsets,
+            sentence_spans=self.sentence_spans,
+            sentence_paragraphs=self.sentence_paragraphs,
+            chapter_offsets=self.chapter_offsets
+        )
+
+    @classmethod
+    def load(cls, file) -> "BookTokenStore":
+        with np.load(file) as data:
+            vocab_text = data["vocab"].tobytes().decode("utf-8")
+            return cls(
+                vocab=vocab_text.split(VOCAB_SEPARATOR) if vocab_text else [],
+                token_ids=data["token_ids"],
+                sentence_offsets=data["sentence_offsets"],
+                sentences=SentenceIndex(
+                    spans=data["sentence_spans"],
+                    paragraphs=data["sentence_paragraphs"],
+                    chapter_offsets=data["chapter_offsets"]
+                )
+            )
+
+
+class NpzCache(ParseCache):
+    """
+    npz格式的派生数据缓存（分词存储、TF-IDF模型等）
+
+    与解析缓存共用"内容哈希 + 版本指纹"的命名与清理规则；
+    子类指定suffix、label与record_type（需提供save(file)与load(file)）
+    """
+
+    label = "npz缓存"
+    record_type = None
+
+    def get(self, file_hash: str, version: str):
+        """读取缓存条目，不存在或损坏时返回None"""
+        if not self.enabled or not file_hash:
+            return None
+
+        path = self._entry_path(file_hash, version)
+        try:
+            return self.record_type.load(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️  {self.label}损坏，已忽略: {path.name} ({e})")
+            self._unlink(path)
+            return None
+
+    def put(self, file_hash: str, version: str, record):
+        """写入缓存条目（失败只记录日志）"""
+        if not self.enabled or not file_hash:
+            return
+
+        path = self._entry_path(file_hash, version)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                record.save(f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️  写入{self.label}失败: {e}")
+            if tmp_path:
+                self._unlink(Path(tmp_path))
+
+
+class TokenStoreCache(NpzCache):
+    """分词存储的磁盘缓存"""
+
+    suffix = TOKEN_STORE_SUFFIX
+    label = "分词存储"
+    record_type = BookTokenStore
+
+    def __init__(self, cache_dir: Optional[Path] = None, enabled: Optional[bool] = None):
+        super().__init__(
+            cache_dir=cache_dir or settings.token_store_dir,
+            enabled=settings.token_store_enabled if enabled is None else enabled
+        )
+
+
+# 全局单例
+_token_store_cache: Optional[TokenStoreCache] = None
+
+
+def get_token_store_cache() -> TokenStoreCache:
+    """获取分词存储缓存单例"""
+    global _token_store_cache
+    if _token_store_cache is None:
+        _token_store_cache = TokenStoreCache()
+    return _token_store_cache
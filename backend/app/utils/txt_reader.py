@@ -0,0 +1,127 @@
+"""
+TXT流式读取工具
+内存映射文件，按前缀样本检测编码，分块增量解码并逐行产出
+"""
+import codecs
+import mmap
+import re
+from typing import Dict, Iterator, Optional
+
+
+# 编码检测样本大小
+SAMPLE_SIZE = 64 * 1024
+# 默认解码分块大小
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# UTF-8解码失败时的回退编码（GB18030兼容GBK）
+FALLBACK_ENCODING = "gb18030"
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_NON_ASCII = re.compile(rb"[\x80-\xff]")
+
+
+def detect_encoding(buffer) -> str:
+    """
+    根据前缀样本检测编码
+
+    - 有BOM时直接按BOM判断
+    - 否则在第一个非ASCII字节附近取样，能按UTF-8解码则为UTF-8，否则回退GB18030
+
+    参数:
+        buffer: bytes或mmap对象
+    """
+    head = bytes(buffer[:4])
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    # 纯ASCII前缀无法区分编码，直接定位到第一个非ASCII字节（在C层扫描，不复制数据）
+    match = _NON_ASCII.search(buffer)
+    if match is None:
+        return "utf-8"
+
+    start = max(match.start() - 4, 0)
+    sample = bytes(buffer[start:start + SAMPLE_SIZE])
+    # 样本起点可能落在多字节字符中间，先跳过UTF-8续字节
+    offset = 0
+    while offset < len(sample) and 0x80 <= sample[offset] < 0xC0 and offset < 4:
+        offset += 1
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        # final=False：样本尾部被截断的多字节字符不算错误
+        decoder.decode(sample[offset:], final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+class TxtReader:
+    """
+    TXT读取器
+
+    文件通过mmap映射，按chunk_size分块增量解码，读取器自身只保留当前分块与未结束的行
+    （调用方收集产出的行时，内存占用由调用方决定）
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: Optional[str] = None):
+        self.file_path = file_path
+        self.chunk_size = max(chunk_size, 4096)
+        self.encoding = encoding
+        self._tail = ""
+        self.stats: Dict = {
+            "encoding": encoding,
+            "bytes": 0,
+            "raw_chars": 0,
+            "raw_lines": 0
+        }
+
+    def iter_lines(self) -> Iterator[str]:
+        """
+        逐行产出文本（不含换行符，\\r\\n与\\r统一为\\n）
+
+        解码失败时抛出UnicodeDecodeError，由调用方决定是否换编码重读
+        """
+        with open(self.file_path, "rb") as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                return
+
+            with mapped:
+                if self.encoding is None:
+                    self.encoding = detect_encoding(mapped)
+                self.stats.update({"encoding": self.encoding, "bytes": len(mapped), "raw_chars": 0, "raw_lines": 0})
+
+                decoder = codecs.getincrementaldecoder(self.encoding)()
+                pending = ""
+                for start in range(0, len(mapped), self.chunk_size):
+                    chunk = decoder.decode(mapped[start:start + self.chunk_size], final=False)
+                    yield from self._split_lines(pending + chunk, keep_tail=True)
+                    pending = self._tail
+
+                pending += decoder.decode(b"", final=True)
+                yield from self._split_lines(pending, keep_tail=False)
+
+    def _split_lines(self, text: str, keep_tail: bool) -> Iterator[str]:
+        """按行切分；keep_tail时最后一个不完整的行留到下一分块"""
+        # 分块边界可能恰好切开\r\n，保留结尾的\r等待下一块
+        if keep_tail and text.endswith("\r"):
+            text, carry = text[:-1], "\r"
+        else:
+            carry = ""
+
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        if keep_tail:
+            self._tail = lines.pop() + carry
+        else:
+            self._tail = ""
+
+        for line in lines:
+            self.stats["raw_chars"] += len(line) + 1
+            if line.strip():
+                self.stats["raw_lines"] += 1
+            yield line
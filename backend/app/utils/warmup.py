@@ -0,0 +1,232 @@
+"""
+NLP模型与解析库预热
+应用启动时只导入路由与配置，分词词典、NLP模型、PDF/DOCX解析库都在首次使用时才加载；
+开启nlp_warmup后，启动完成时在后台线程中依次预加载这些组件，
+并记录各组件的就绪状态，供/api/health查询；
+未开启时各组件标记为lazy，查询时按本进程实际已加载的模块刷新为ready
+"""
+import asyncio
+import importlib
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.utils.config import settings
+
+
+# 组件状态
+STATUS_PENDING = "pending"  # 尚未加载
+STATUS_LOADING = "loading"  # 正在加载
+STATUS_READY = "ready"  # 已加载
+STATUS_SKIPPED = "skipped"  # 未安装或未启用，无需加载
+STATUS_FAILED = "failed"  # 加载失败（首次使用时会再次尝试）
+STATUS_LAZY = "lazy"  # 未开启预热，首次使用时才加载（尚未用到）
+
+_DONE_STATUSES = (STATUS_READY, STATUS_SKIPPED, STATUS_FAILED)
+
+
+def _load_jieba() -> bool:
+    """jieba主词典"""
+    from app.utils.segmenter import JIEBA_AVAILABLE, load_jieba
+    if not JIEBA_AVAILABLE:
+        return False
+    load_jieba().initialize()
+    return True
+
+
+def _load_jieba_analyse() -> bool:
+    """jieba.analyse（词性标注模型与IDF表）"""
+    from app.utils.text_processor import get_text_processor
+    processor = get_text_processor()
+    if not processor.jieba_initialized:
+        return False
+    processor.load_jieba_analyse()
+    return True
+
+
+def _load_spacy() -> bool:
+    """spaCy分句管线"""
+    from app.utils.text_processor import get_text_processor
+    processor = get_text_processor()
+    if not processor.spacy_sentence_split:
+        return False
+    processor._sentence_pipeline()
+    return True
+
+
+def _parser_modules() -> List[str]:
+    """已安装的PDF/DOCX解析库"""
+    from app.utils.pdf_extractor import PDFPLUMBER_AVAILABLE, PYPDF2_AVAILABLE
+    from app.services.document_parser import DOCX_AVAILABLE
+    return [
+        name for name, available in (
+            ("PyPDF2", PYPDF2_AVAILABLE),
+            ("pdfplumber", PDFPLUMBER_AVAILABLE),
+            ("docx", DOCX_AVAILABLE),
+        )
+        if available
+    ]
+
+
+def _load_parsers() -> bool:
+    """PDF/DOCX解析库"""
+    modules = _parser_modules()
+    for name in modules:
+        importlib.import_module(name)
+    return bool(modules)
+
+
+# ---------- 按需加载时的状态探测 ----------
+# 返回True表示本进程已加载，False表示无需加载（未安装或未启用），None表示尚未用到
+
+
+def _probe_jieba() -> Optional[bool]:
+    from app.utils.segmenter import JIEBA_AVAILABLE
+    if not JIEBA_AVAILABLE:
+        return False
+    jieba = sys.modules.get("jieba")
+    return True if jieba is not None and jieba.dt.initialized else None
+
+
+def _probe_jieba_analyse() -> Optional[bool]:
+    from app.utils.segmenter import JIEBA_AVAILABLE
+    if not JIEBA_AVAILABLE:
+        return False
+    return True if "jieba.analyse" in sys.modules else None
+
+
+def _probe_spacy() -> Optional[bool]:
+    from app.utils.text_processor import get_text_processor
+    processor = get_text_processor()
+    if not processor.spacy_sentence_split:
+        return False
+    return True if processor._sentence_nlp is not None else None
+
+
+def _probe_parsers() -> Optional[bool]:
+    modules = _parser_modules()
+    if not modules:
+        return False
+    # PDF分片提取在子进程中导入解析库，只有本进程导入过才算已加载
+    return True if all(name in sys.modules for name in modules) else None
+
+
+# 预热顺序：解析入库最先用到分词词典
+WARMUP_COMPONENTS: List[Tuple[str, Callable[[], bool], Callable[[], Optional[bool]]]] = [
+    ("jieba", _load_jieba, _probe_jieba),
+    ("jieba_analyse", _load_jieba_analyse, _probe_jieba_analyse),
+    ("spacy", _load_spacy, _probe_spacy),
+    ("parsers", _load_parsers, _probe_parsers),
+]
+
+
+class WarmupState:
+    """预热进度（线程安全，预热线程写入，健康检查读取）"""
+
+    def __init__(self, components: List[str]):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict] = {
+            name: {"status": STATUS_PENDING, "seconds": None}
+            for name in components
+        }
+        self.enabled = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, name: str, status: str, seconds: Optional[float] = None, error: Optional[str] = None):
+        with self._lock:
+            entry = {"status": status, "seconds": seconds}
+            if error:
+                entry["error"] = error
+            self._components[name] = entry
+
+    def refresh_lazy(self):
+        """未开启预热时按本进程实际加载情况刷新状态（首次使用时由各模块按需加载）"""
+        for name, _, probe in WARMUP_COMPONENTS:
+            with self._lock:
+                status = self._components[name]["status"]
+            if status not in (STATUS_PENDING, STATUS_LAZY):
+                continue
+            try:
+                loaded = probe()
+            except Exception:
+                continue
+            if loaded is None:
+                self.update(name, STATUS_LAZY)
+            else:
+                self.update(name, STATUS_READY if loaded else STATUS_SKIPPED)
+
+    @property
+    def ready(self) -> bool:
+        """所有组件都已加载（或无需加载）"""
+        with self._lock:
+            return all(entry["status"] in _DONE_STATUSES for entry in self._components.values())
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            components = {name: dict(entry) for name, entry in self._components.items()}
+        seconds = None
+        if self.started_at is not None:
+            seconds = round((self.finished_at or time.perf_counter()) - self.started_at, 3)
+        return {
+            "ready": all(entry["status"] in _DONE_STATUSES for entry in components.values()),
+            "warmup": self.enabled,
+            "seconds": seconds,
+            "components": components
+        }
+
+
+_state = WarmupState([name for name, _, _ in WARMUP_COMPONENTS])
+_task: Optional[asyncio.Task] = None
+
+
+def run_warmup() -> Dict:
+    """
+    依次预加载各组件（同步执行，在后台线程中调用）
+
+    单个组件失败只记录日志，不影响其他组件；首次使用时会再次尝试加载
+    """
+    _state.started_at = time.perf_counter()
+    for name, loader, _ in WARMUP_COMPONENTS:
+        _state.update(name, STATUS_LOADING)
+        started = time.perf_counter()
+        try:
+            loaded = loader()
+        except Exception as e:
+            logger.warning(f"⚠️  预加载{name}失败: {e}")
+            _state.update(name, STATUS_FAILED, round(time.perf_counter() - started, 3), str(e))
+            continue
+        _state.update(name, STATUS_READY if loaded else STATUS_SKIPPED, round(time.perf_counter() - started, 3))
+    _state.finished_at = time.perf_counter()
+
+    snapshot = _state.snapshot()
+    logger.info(f"🔥 NLP预热完成: {snapshot['seconds']}s, " + ", ".join(
+        f"{name}={entry['status']}" for name, entry in snapshot["components"].items()
+    ))
+    return snapshot
+
+
+def start_warmup() -> Optional[asyncio.Task]:
+    """在后台线程中启动预热（需在事件循环中调用；未开启nlp_warmup或已启动时不重复执行）"""
+    global _task
+    if not settings.nlp_warmup:
+        return None
+    if _task is None:
+        _state.enabled = True
+        _task = asyncio.get_running_loop().create_task(asyncio.to_thread(run_warmup))
+    return _task
+
+
+def get_readiness() -> Dict:
+    """
+    NLP组件就绪状态
+
+    ready表示各组件都已加载（或无需加载）：开启预热时随预热进度变化；
+    未开启时尚未用到的组件为lazy，用到后（本进程已加载）刷新为ready
+    """
+    if not _state.enabled:
+        _state.refresh_lazy()
+    return _state.snapshot()
@@ -1,115 +1,519 @@
 #!/usr/bin/env python3
 """
-批量上传书籍脚本
-将 books/ 目录下的所有书籍上传到系统中
+批量导入流水线
+对一批书籍依次执行 解析 -> 证据库 -> Persona -> 提纲，支持并行与断点续跑
+
+用法：
+    python batch_upload_books.py                         # 导入 ../books 下的所有书籍
+    python batch_upload_books.py ../books/论语.txt -w 4   # 指定文件与并行数
+    python batch_upload_books.py --stages parse,evidence  # 只跑部分阶段
+    python batch_upload_books.py --reparse                # 解析器更新后重新解析版本过期的书籍
+
+进度记录在清单文件（默认 data/batch_manifest.json）中，中断后再次运行会跳过已完成的阶段。
+清单同时记录每本书解析时的解析器版本（解析缓存版本指纹），--reparse只重新解析版本与当前不同的书，
+重新导入中断后再次运行即可续跑。重新解析在原book_id下原地替换章节、观点、段落与证据，
+已生成的Persona、提纲、产出与诊断保持不变
 """
+import argparse
 import asyncio
+import json
+import multiprocessing
+import os
 import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
 # 添加项目路径
 sys.path.insert(0, str(Path(__file__).parent))
 
-from app.database import SessionLocal, Base, engine
-from app.services.document_parser import get_document_parser
-from app.crud.crud_book import create_book
+from app.database import SessionLocal, init_db, ensure_schema
+from app.models.book import Book, Chapter, CoreViewpoint
+from app.models.orm import BookORM, ChapterORM, CoreViewpointORM, AuthorPersonaORM, BookSeriesORM
+from app.models.persona import AuthorPersona, ThinkingStyle
+from app.crud.crud_book import create_book, get_book_by_hash, replace_book_content
+from app.crud.crud_series import create_persona, create_book_series
+from app.utils.file_handler import get_file_handler
+
+
+STAGES = ["parse", "evidence", "persona", "outline"]
+MANIFEST_VERSION = 1
+
+# 已知书籍的作者（文件名 -> 作者）
+KNOWN_AUTHORS = {
+    "论语": "孔子",
+    "理想国": "柏拉图",
+    "乡土中国": "费孝通",
+}
+
+
+# ==================== 解析（进程池任务） ====================
+
+def current_parser_version() -> str:
+    """当前解析器版本（解析缓存的版本指纹，解析逻辑或相关配置变化时改变）"""
+    from app.services.document_parser import get_document_parser
+    return get_document_parser().cache_version
+
+
+def _init_parse_worker():
+    """解析子进程初始化：书籍之间已经并行，PDF提取与分词不再开进程池"""
+    from app.utils.config import settings
+    settings.pdf_parse_workers = 1
+    settings.nlp_workers = 1
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+
+def _parse_in_worker(file_path: str, title: str, author: str, file_hash: str, use_cache: bool) -> Book:
+    """在子进程中解析单本书（必须是模块级函数以便序列化）"""
+    from app.services.document_parser import get_document_parser
+    parser = get_document_parser()
+    return asyncio.run(parser.parse_book(
+        file_path=file_path,
+        title=title,
+        author=author,
+        use_cache=use_cache,
+        file_hash=file_hash
+    ))
+
+
+# ==================== 数据库读取 ====================
+
+def load_book(db, book_id: str) -> Book:
+    """从数据库还原完整的Book（含章节与观点）"""
+    db_book = db.query(BookORM).filter(BookORM.book_id == book_id).first()
+    if not db_book:
+        raise ValueError(f"著作不存在: {book_id}")
+
+    chapters = (
+        db.query(ChapterORM)
+        .filter(ChapterORM.book_id == book_id)
+        .order_by(ChapterORM.chapter_number)
+        .all()
+    )
+    viewpoints = db.query(CoreViewpointORM).filter(CoreViewpointORM.book_id == book_id).all()
+    return Book(
+        book_id=db_book.book_id,
+        title=db_book.title,
+        author=db_book.author,
+        language=db_book.language or "zh",
+        file_path=db_book.file_path,
+        file_type=db_book.file_type,
+        file_hash=db_book.file_hash,
+        total_words=db_book.total_words or 0,
+        parse_stats=db_book.parse_stats or {},
+        chapters=[
+            Chapter(
+                chapter_id=c.chapter_id,
+                chapter_number=c.chapter_number,
+                title=c.title,
+                content=c.content,
+                page_range=c.page_range
+            )
+            for c in chapters
+        ],
+        core_viewpoints=[
+            CoreViewpoint(
+                viewpoint_id=v.viewpoint_id,
+                content=v.content,
+                original_text=v.original_text,
+                chapter_id=v.chapter_id,
+                context=v.context or "",
+                keywords=v.keywords or []
+            )
+            for v in viewpoints
+        ]
+    )
+
+
+def load_persona(db_persona: AuthorPersonaORM) -> AuthorPersona:
+    """把Persona记录转换为提纲生成所需的模型"""
+    return AuthorPersona(
+        persona_id=db_persona.persona_id,
+        book_id=db_persona.book_id,
+        author_name=db_persona.author_name,
+        thinking_style=ThinkingStyle(db_persona.thinking_style) if db_persona.thinking_style else ThinkingStyle.ANALYTICAL,
+        logic_pattern=db_persona.logic_pattern or "",
+        reasoning_framework=db_persona.reasoning_framework or "",
+        core_philosophy=db_persona.core_philosophy or "",
+        theoretical_framework=db_persona.theoretical_framework or "",
+        key_concepts=db_persona.key_concepts or {},
+        narrative_style=db_persona.narrative_style or "",
+        language_rhythm=db_persona.language_rhythm or "",
+        sentence_structure=db_persona.sentence_structure or "",
+        rhetorical_devices=db_persona.rhetorical_devices or [],
+        value_orientation=db_persona.value_orientation or "",
+        value_judgment_framework=db_persona.value_judgment_framework or "",
+        core_positions=db_persona.core_positions or [],
+        opposed_positions=db_persona.opposed_positions or [],
+        tone=db_persona.tone or "",
+        emotion_tendency=db_persona.emotion_tendency or "",
+        expressiveness=db_persona.expressiveness or "",
+        personality_traits=db_persona.personality_traits or [],
+        communication_style=db_persona.communication_style or "",
+        attitude_toward_audience=db_persona.attitude_toward_audience or ""
+    )
+
+
+# ==================== 清单（断点续跑） ====================
+
+class Manifest:
+    """
+    批量导入清单
+
+    记录每本书的内容哈希、book_id、解析器版本与各阶段状态；每完成一个阶段立即原子写盘
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = {"version": MANIFEST_VERSION, "books": {}}
+        if path.exists():
+            try:
+                loaded = json.loads(path.read_text(encoding="utf-8"))
+                if loaded.get("version") == MANIFEST_VERSION:
+                    self.data = loaded
+            except ValueError:
+                logger.warning(f"⚠️  清单文件损坏，重新开始: {path}")
+
+    def entry(self, file_path: str, file_hash: str) -> Dict:
+        """获取书籍条目；文件内容变化时重置所有阶段"""
+        entry = self.data["books"].get(file_path)
+        if entry is None or entry.get("hash") != file_hash:
+            entry = {"hash": file_hash, "book_id": None, "parser_version": None, "stages": {}}
+            self.data["books"][file_path] = entry
+        return entry
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+# ==================== 流水线 ====================
+
+class ThreadLock:
+    """在工作线程中持有事件循环里的asyncio.Lock（供同步代码在写库时与其他阶段串行）"""
+
+    def __init__(self, lock: asyncio.Lock, loop: asyncio.AbstractEventLoop):
+        self.lock = lock
+        self.loop = loop
+
+    def __enter__(self):
+        asyncio.run_coroutine_threadsafe(self.lock.acquire(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.lock.release)
+
+
+class BatchPipeline:
+    """批量导入流水线：每本书一个任务，按阶段依次推进，不同书的不同阶段可以重叠执行"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.stages = [stage for stage in STAGES if stage in args.stages]
+        self.manifest = Manifest(Path(args.manifest))
+        self.file_handler = get_file_handler()
+
+        self.parser_version = current_parser_version() if "parse" in self.stages else None
+
+        # SQLite只允许单写者，写库操作串行执行
+        self.db_lock = asyncio.Lock()
+        self.llm_semaphore = asyncio.Semaphore(args.llm_concurrency or args.workers)
+        self.parse_pool: Optional[ProcessPoolExecutor] = None
+
+        # 阶段统计：{阶段: {"done": n, "skipped": n, "failed": n, "seconds": 累计耗时, "units": 解析字数/证据库写入行数}}
+        self.report = defaultdict(lambda: {"done": 0, "skipped": 0, "failed": 0, "seconds": 0.0, "units": 0})
+        self.stage_spans: Dict[str, List[float]] = {}
 
+    async def run(self, files: List[Path]):
+        started = time.perf_counter()
+        books = await self._dedupe(files)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=self.args.workers,
+            mp_context=context,
+            initializer=_init_parse_worker
+        ) as pool:
+            self.parse_pool = pool
+            await asyncio.gather(*[self.process_book(path, file_hash) for path, file_hash in books])
+        self.print_report(len(books), time.perf_counter() - started)
 
-# 确保数据库表存在
-Base.metadata.create_all(bind=engine)
+    async def _dedupe(self, files: List[Path]) -> List[Tuple[Path, str]]:
+        """
+        计算文件内容哈希并去重
 
+        file_hash不是唯一约束，同一批次中内容相同的文件若并行解析会都查不到已入库记录而重复入库，
+        因此每个哈希只保留第一个文件
+        """
+        hashes = await asyncio.gather(*[
+            asyncio.to_thread(self.file_handler.calculate_file_hash, str(path.resolve())) for path in files
+        ])
+        books: Dict[str, Path] = {}
+        for path, file_hash in zip(files, hashes):
+            if file_hash in books:
+                logger.warning(f"⚠️  {path.name}: 与 {books[file_hash].name} 内容相同，跳过")
+                continue
+            books[file_hash] = path
+        return [(path, file_hash) for file_hash, path in books.items()]
 
-async def upload_book_file(file_path: str, title: str, author: str):
-    """上传单本书籍"""
-    logger.info(f"📖 开始上传: {title}")
+    async def process_book(self, path: Path, file_hash: str):
+        file_path = str(path.resolve())
+        entry = self.manifest.entry(file_path, file_hash)
+        if self._needs_reparse(entry):
+            # 只作废版本过期的条目：已按当前版本完成的书直接跳过，中断后再次运行可续跑
+            logger.info(
+                f"🔁 {path.name}: 解析器版本 {entry.get('parser_version')} -> {self.parser_version}，重新解析"
+            )
+            entry["stages"] = {}
 
-    try:
-        # 1. 解析书籍
-        parser = get_document_parser()
-        book = await parser.parse_book(
-            file_path=file_path,
-            title=title,
-            author=author
+        for stage in self.stages:
+            state = entry["stages"].get(stage, {})
+            if state.get("status") == "done":
+                self.report[stage]["skipped"] += 1
+                continue
+            if stage != "parse" and not entry.get("book_id"):
+                logger.warning(f"⚠️  {path.name}: 尚未解析，跳过 {stage}")
+                break
+
+            stage_started = time.perf_counter()
+            self._mark_span(stage, stage_started)
+            try:
+                units = await getattr(self, f"stage_{stage}")(path, entry)
+            except Exception as e:
+                elapsed = time.perf_counter() - stage_started
+                self.report[stage]["failed"] += 1
+                self.report[stage]["seconds"] += elapsed
+                entry["stages"][stage] = {"status": "failed", "error": str(e), "seconds": round(elapsed, 3)}
+                self.manifest.save()
+                logger.error(f"❌ {path.name}: {stage} 失败: {e}")
+                break
+
+            elapsed = time.perf_counter() - stage_started
+            self._mark_span(stage, time.perf_counter())
+            self.report[stage]["done"] += 1
+            self.report[stage]["seconds"] += elapsed
+            self.report[stage]["units"] += units
+            entry["stages"][stage] = {"status": "done", "seconds": round(elapsed, 3)}
+            self.manifest.save()
+            logger.info(f"✅ {path.name}: {stage} 完成 ({elapsed:.2f}s)")
+
+    def _needs_reparse(self, entry: Dict) -> bool:
+        """--reparse时，已有阶段记录但解析器版本与当前不同的条目需要重新解析"""
+        return (
+            self.args.reparse and "parse" in self.stages and bool(entry["stages"])
+            and entry.get("parser_version") != self.parser_version
+        )
+
+    def _mark_span(self, stage: str, moment: float):
+        span = self.stage_spans.setdefault(stage, [moment, moment])
+        span[0] = min(span[0], moment)
+        span[1] = max(span[1], moment)
+
+    async def stage_parse(self, path: Path, entry: Dict) -> int:
+        """
+        解析并入库，返回解析字数
+
+        相同内容已入库时直接复用；--reparse时只复用按当前解析器版本解析的记录，
+        否则重新解析并在原book_id下原地替换解析产物（Persona、提纲等LLM生成的记录保留）。
+        解析缓存按版本指纹区分，命中即为当前版本的结果，重新解析时照常使用
+        """
+        async with self.db_lock:
+            existing, existing_version = await asyncio.to_thread(self._find_book, entry["hash"])
+        if existing and (not self.args.reparse or existing_version == self.parser_version):
+            entry["book_id"] = existing
+            entry["parser_version"] = existing_version
+            return 0
+
+        title = path.stem
+        author = KNOWN_AUTHORS.get(title, self.args.author)
+        loop = asyncio.get_running_loop()
+        book = await loop.run_in_executor(
+            self.parse_pool, _parse_in_worker,
+            str(path.resolve()), title, author, entry["hash"], True
+        )
+
+        async with self.db_lock:
+            if existing:
+                await asyncio.to_thread(self._with_session, replace_book_content, existing, book)
+            else:
+                await asyncio.to_thread(self._with_session, create_book, book)
+        entry["book_id"] = existing or book.book_id
+        entry["parser_version"] = (book.parse_stats or {}).get("cache", {}).get("version")
+        return book.total_words
+
+    async def stage_evidence(self, path: Path, entry: Dict) -> int:
+        """构建证据库：段落与证据的计算并行进行，只在写入并提交时持有写库锁"""
+        from app.services.evidence_builder import get_evidence_builder
+        builder = get_evidence_builder()
+        write_lock = ThreadLock(self.db_lock, asyncio.get_running_loop())
+        stats = await asyncio.to_thread(
+            self._with_session, builder.build_for_book, entry["book_id"], False, write_lock
         )
+        return stats["rows"]
+
+    async def stage_persona(self, path: Path, entry: Dict) -> int:
+        from app.services.persona_builder import get_persona_builder
+        async with self.db_lock:
+            existing = await asyncio.to_thread(self._find_persona, entry["book_id"])
+        if existing:
+            entry["persona_id"] = existing
+            return 0
+
+        book = await asyncio.to_thread(self._with_session, load_book, entry["book_id"])
+        async with self.llm_semaphore:
+            persona = await get_persona_builder().build_persona(book=book, era="根据著作背景推断", identity="作者")
+        async with self.db_lock:
+            await asyncio.to_thread(self._with_session, create_persona, persona, "根据著作背景推断", "作者")
+        entry["persona_id"] = persona.persona_id
+        return 0
+
+    async def stage_outline(self, path: Path, entry: Dict) -> int:
+        from app.services.outline_generator import get_outline_generator
+        async with self.db_lock:
+            existing = await asyncio.to_thread(self._find_series, entry["book_id"])
+        if existing:
+            return 0
+
+        book = await asyncio.to_thread(self._with_session, load_book, entry["book_id"])
+        persona = None
+        if entry.get("persona_id"):
+            db = SessionLocal()
+            try:
+                db_persona = db.query(AuthorPersonaORM).filter(AuthorPersonaORM.persona_id == entry["persona_id"]).first()
+                persona = load_persona(db_persona) if db_persona else None
+            finally:
+                db.close()
+
+        async with self.llm_semaphore:
+            series = await get_outline_generator().generate_outline(book=book, persona=persona, episodes_count=10)
+        async with self.db_lock:
+            await asyncio.to_thread(self._with_session, create_book_series, series, entry.get("persona_id"))
+        return 0
+
+    def _with_session(self, func, *args):
+        db = SessionLocal()
+        try:
+            return func(db, *args)
+        finally:
+            db.close()
 
-        logger.info(f"  ✅ 解析成功:")
-        logger.info(f"     - 章节数: {len(book.chapters)}")
-        logger.info(f"     - 观点数: {len(book.core_viewpoints)}")
-        logger.info(f"     - 字数: {book.total_words}")
+    def _find_book(self, file_hash: str) -> Tuple[Optional[str], Optional[str]]:
+        """已入库的同内容书籍：(book_id, 解析器版本)"""
+        db = SessionLocal()
+        try:
+            db_book = get_book_by_hash(db, file_hash)
+            if not db_book:
+                return None, None
+            return db_book.book_id, (db_book.parse_stats or {}).get("cache", {}).get("version")
+        finally:
+            db.close()
 
-        # 2. 保存到数据库
+    def _find_persona(self, book_id: str) -> Optional[str]:
         db = SessionLocal()
         try:
-            db_book = create_book(db=db, book=book)
-            logger.info(f"  ✅ 已保存到数据库 (ID: {db_book.book_id})")
-            return True
+            db_persona = db.query(AuthorPersonaORM).filter(AuthorPersonaORM.book_id == book_id).first()
+            return db_persona.persona_id if db_persona else None
         finally:
             db.close()
 
-    except Exception as e:
-        logger.error(f"  ❌ 上传失败: {e}")
-        return False
-
-
-async def main():
-    """批量上传所有书籍"""
-    books_dir = Path(__file__).parent.parent / "books"
-
-    # 定义要上传的书籍
-    books_to_upload = [
-        {
-            "file_path": str(books_dir / "论语.txt"),
-            "title": "论语",
-            "author": "孔子"
-        },
-        {
-            "file_path": str(books_dir / "理想国.txt"),
-            "title": "理想国",
-            "author": "柏拉图"
-        },
-        {
-            "file_path": str(books_dir / "乡土中国.pdf"),
-            "title": "乡土中国",
-            "author": "费孝通"
-        }
-    ]
+    def _find_series(self, book_id: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            db_series = db.query(BookSeriesORM).filter(BookSeriesORM.book_id == book_id).first()
+            return db_series.series_id if db_series else None
+        finally:
+            db.close()
 
-    logger.info("=" * 60)
-    logger.info("开始批量上传书籍")
-    logger.info("=" * 60)
+    def print_report(self, total_books: int, wall_seconds: float):
+        """打印各阶段吞吐（阶段耗时为该阶段首个任务开始到最后一个任务结束的墙钟时间）"""
+        logger.info("=" * 60)
+        logger.info(f"批量导入完成：{total_books} 本，总耗时 {wall_seconds:.2f}s，并行数 {self.args.workers}")
+        for stage in self.stages:
+            stats = self.report[stage]
+            span = self.stage_spans.get(stage)
+            stage_wall = span[1] - span[0] if span else 0.0
+            rate = stats["done"] / stage_wall * 60 if stage_wall > 0 else 0.0
+            line = (
+                f"  {stage:<9} 完成 {stats['done']:>3}  跳过 {stats['skipped']:>3}  失败 {stats['failed']:>3}  "
+                f"阶段耗时 {stage_wall:7.2f}s  累计 {stats['seconds']:7.2f}s  {rate:6.1f} 本/分钟"
+            )
+            if stage == "parse" and stage_wall > 0:
+                line += f"  {stats['units'] / stage_wall:,.0f} 字/秒"
+            elif stage == "evidence" and stage_wall > 0:
+                line += f"  {stats['units'] / stage_wall:,.0f} 行/秒"
+            logger.info(line)
+        logger.info("=" * 60)
 
-    success_count = 0
-    failed_count = 0
 
-    for book_info in books_to_upload:
-        file_path = book_info["file_path"]
+def collect_files(args: argparse.Namespace) -> List[Path]:
+    """收集待导入的文件（目录下所有支持的格式，或命令行指定的文件）"""
+    file_handler = get_file_handler()
+    if args.files:
+        candidates = [Path(f) for f in args.files]
+    else:
+        candidates = sorted(p for p in Path(args.books_dir).iterdir() if p.is_file())
 
-        # 检查文件是否存在
-        if not Path(file_path).exists():
-            logger.warning(f"⚠️  文件不存在: {file_path}")
-            failed_count += 1
+    files = []
+    for path in candidates:
+        if not path.exists():
+            logger.warning(f"⚠️  文件不存在: {path}")
+            continue
+        if file_handler.get_file_extension(path.name) not in file_handler.ALLOWED_EXTENSIONS:
             continue
+        files.append(path)
+    return files
 
-        # 上传书籍
-        success = await upload_book_file(
-            file_path=file_path,
-            title=book_info["title"],
-            author=book_info["author"]
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="批量导入书籍：解析 -> 证据库 -> Persona -> 提纲")
+    parser.add_argument("files", nargs="*", help="要导入的文件（默认导入 --books-dir 下的全部书籍）")
+    parser.add_argument("--books-dir", default=str(Path(__file__).parent.parent / "books"), help="书籍目录")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="解析进程数")
+    parser.add_argument("--llm-concurrency", type=int, default=0, help="Persona/提纲并发数（默认同workers）")
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        type=lambda value: [stage.strip() for stage in value.split(",") if stage.strip()],
+        help=f"要执行的阶段，逗号分隔（可选: {','.join(STAGES)}）"
+    )
+    parser.add_argument("--manifest", default="./data/batch_manifest.json", help="断点续跑清单文件")
+    parser.add_argument(
+        "--reparse", action="store_true",
+        help=(
+            "重新解析解析器版本与当前不同的书籍，在原book_id下替换章节、观点、段落与证据，"
+            "保留Persona、提纲等已生成的记录（按当前版本完成的书籍照常跳过）"
         )
+    )
+    parser.add_argument("--author", default="未知作者", help="未知书籍的默认作者")
+    args = parser.parse_args(argv)
+
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"未知阶段: {','.join(unknown)}")
+    args.workers = max(args.workers, 1)
+    return args
 
-        if success:
-            success_count += 1
-        else:
-            failed_count += 1
 
-        logger.info("")
+async def main(argv: Optional[List[str]] = None):
+    """批量导入"""
+    args = parse_args(argv)
 
-    # 打印总结
+    # 确保数据库表存在
+    init_db()
+    ensure_schema()
+
+    files = collect_files(args)
     logger.info("=" * 60)
-    logger.info(f"上传完成！成功: {success_count}, 失败: {failed_count}")
+    logger.info(f"开始批量导入：{len(files)} 本，阶段 {' -> '.join(args.stages)}，并行数 {args.workers}")
     logger.info("=" * 60)
 
+    await BatchPipeline(args).run(files)
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,54 @@
+#!/bin/bash
+# 章节识别性能基准：论语原文 + 合成的10倍体量书籍
+
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+echo "⏱️  章节识别性能基准"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import sys
+import time
+sys.path.insert(0, '.')
+
+from loguru import logger
+logger.remove()
+
+from app.services.document_parser import get_document_parser
+
+parser = get_document_parser()
+
+with open('../books/论语.txt', 'r', encoding='utf-8') as f:
+    raw = f.read()
+
+lines, _ = parser._run_line_pipeline(lambda: raw.split('\n'))
+
+samples = {
+    "论语.txt": lines,
+    "合成10倍": lines * 10,
+}
+
+REPEATS = 5
+
+for name, lines in samples.items():
+    scan_times = []
+    identify_times = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        positions, known_hits, matched = parser._scan_chapter_headings(lines)
+        scan_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        chapters, stats = parser._identify_chapters(lines, 'txt', '论语')
+        identify_times.append(time.perf_counter() - started)
+
+    best_scan = min(scan_times)
+    best_identify = min(identify_times)
+    print(f"📖 {name}: {sum(len(line) for line in lines):,} 字, {len(lines):,} 行")
+    print(f"   标题扫描: {best_scan * 1000:.1f} ms ({len(lines) / best_scan:,.0f} 行/秒)")
+    print(f"   章节识别: {best_identify * 1000:.1f} ms")
+    print(f"   策略: {stats['strategy']}, 已知书籍: {stats['known_book_hit']}, 章节数: {len(chapters)}")
+    print("")
+PYTHON_SCRIPT
@@ -0,0 +1,97 @@
+#!/bin/bash
+# 关键句打分基准：原"词的句子频率均值"打分 vs 窗口化TextRank，覆盖仓库自带的三本书
+
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+echo "⏱️  关键句打分基准"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import sys
+import time
+import asyncio
+from collections import Counter
+sys.path.insert(0, '.')
+
+from loguru import logger
+logger.remove()
+
+from app.utils.config import settings
+# 基准不读写解析缓存与分词存储
+settings.parse_cache_enabled = False
+settings.token_store_enabled = False
+
+import numpy as np
+from app.services.document_parser import get_document_parser
+from app.utils.textrank import textrank_scores, top_sentences
+
+BOOKS = ['../books/论语.txt', '../books/理想国.txt', '../books/乡土中国.pdf']
+TOP_K = 5
+REPEATS = 3
+
+
+def frequency_scores(store, start, end):
+    """原打分：句中各词的句子频率之和 / 句子词数"""
+    word_lists = [store.sentence_ids(index).tolist() for index in range(start, end)]
+    freq = Counter(word for words in word_lists for word in set(words))
+    return np.array([sum(freq[w] for w in words) / max(len(words), 1) for words in word_lists])
+
+
+def best_time(func):
+    times = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+async def main():
+    parser = get_document_parser()
+    for path in BOOKS:
+        book = await parser.parse_book(path)
+        store, _ = await parser.build_token_store(book.chapters)
+
+        ranges = [store.chapter_sentence_range(c) for c in range(store.num_chapters)]
+        ranges = [(start, end) for start, end in ranges if end - start > TOP_K]
+
+        def run(scorer):
+            return [[start + i for i in top_sentences(scorer(start, end), TOP_K)] for start, end in ranges]
+
+        old_time, old_picks = best_time(lambda: run(lambda s, e: frequency_scores(store, s, e)))
+        new_time, new_picks = best_time(lambda: run(
+            lambda s, e: textrank_scores(store.token_ids, store.sentence_offsets[s:e + 1])
+        ))
+
+        def describe(picks):
+            chosen = [index for chapter in picks for index in chapter]
+            lengths = np.diff(store.sentence_spans[chosen], axis=1).ravel()
+            tokens = np.diff(store.sentence_offsets)[chosen]
+            return lengths.mean(), (tokens <= 2).mean() * 100
+
+        shared = sum(len(set(a) & set(b)) for a, b in zip(old_picks, new_picks))
+        total = sum(len(a) for a in old_picks)
+        old_len, old_short = describe(old_picks)
+        new_len, new_short = describe(new_picks)
+
+        print(f"📖 {book.title}: {store.num_chapters} 章, {store.num_sentences:,} 句, {store.num_tokens:,} 词")
+        print(f"   原打分  : {old_time * 1000:7.1f} ms, 关键句平均 {old_len:5.1f} 字, 词数<=2的句子 {old_short:4.1f}%")
+        print(f"   TextRank: {new_time * 1000:7.1f} ms, 关键句平均 {new_len:5.1f} 字, 词数<=2的句子 {new_short:4.1f}%")
+        print(f"   两者选中相同句子: {shared}/{total}")
+        print("")
+
+    # 规模扩展：把最长一章重复拼接，检验窗口化后耗时随句子数近似线性增长
+    start, end = max(ranges, key=lambda r: r[1] - r[0])
+    ids = store.token_ids[store.sentence_offsets[start]:store.sentence_offsets[end]]
+    lengths = np.diff(store.sentence_offsets[start:end + 1])
+    print(f"📈 规模扩展（{book.title} 最长章节重复拼接）")
+    for times in (1, 4, 16):
+        offsets = np.concatenate([[0], np.cumsum(np.tile(lengths, times))])
+        elapsed, _ = best_time(lambda: textrank_scores(np.tile(ids, times), offsets))
+        print(f"   {len(offsets) - 1:7,} 句: {elapsed * 1000:7.1f} ms")
+
+
+asyncio.run(main())
+PYTHON_SCRIPT
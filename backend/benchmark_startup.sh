@@ -0,0 +1,91 @@
+#!/bin/bash
+# 冷启动基准：导入app.main的耗时、最慢的导入模块，以及后台预热各组件的耗时
+# 导入耗时超过STARTUP_BUDGET_MS（默认2000毫秒）或启动时加载了NLP模型/解析库时以非0状态退出
+
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+echo "⏱️  冷启动性能基准"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import os
+import subprocess
+import sys
+import time
+
+REPEATS = 5
+BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "2000"))
+# 这些模块应在首次使用或后台预热时才加载
+LAZY_MODULES = ["jieba", "jieba.analyse", "spacy", "pdfplumber", "PyPDF2", "docx"]
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(elapsed)
+print(",".join(name for name in %r if name in sys.modules))
+""" % (LAZY_MODULES,)
+
+
+def run_probe():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True, text=True, check=True
+    )
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    return float(elapsed), [name for name in loaded.split(",") if name]
+
+
+# 每次都在新进程中导入，测的是冷启动（字节码缓存已生成）
+timings = []
+loaded = []
+for _ in range(REPEATS):
+    elapsed, loaded = run_probe()
+    timings.append(elapsed)
+
+best_ms = min(timings) * 1000
+print(f"🚀 import app.main: 最快 {best_ms:.0f} ms, 中位 {sorted(timings)[len(timings) // 2] * 1000:.0f} ms ({REPEATS}次)")
+
+# -X importtime 输出各模块的累计导入耗时（微秒）
+result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", "import app.main"],
+    capture_output=True, text=True, check=True
+)
+entries = []
+for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "cumulative" in line:
+        continue
+    self_us, cumulative_us, name = line[len("import time:"):].split("|")
+    entries.append((int(cumulative_us), name.rstrip()))
+print("")
+print("📦 累计导入耗时最高的模块:")
+for cumulative_us, name in sorted(entries, reverse=True)[:10]:
+    print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+
+# 后台预热（启动后在线程中执行，这里同步测一次）
+from loguru import logger
+logger.remove()
+from app.utils.warmup import run_warmup
+
+started = time.perf_counter()
+snapshot = run_warmup()
+print("")
+print(f"🔥 预热: {time.perf_counter() - started:.2f} s")
+for name, entry in snapshot["components"].items():
+    print(f"   {name}: {entry['status']} ({entry['seconds']} s)")
+
+print("")
+failed = False
+if loaded:
+    print(f"❌ 启动时加载了应按需加载的模块: {', '.join(loaded)}")
+    failed = True
+if best_ms > BUDGET_MS:
+    print(f"❌ 导入耗时 {best_ms:.0f} ms 超过预算 {BUDGET_MS:.0f} ms")
+    failed = True
+if failed:
+    sys.exit(1)
+print(f"✅ 导入耗时在预算内（{BUDGET_MS:.0f} ms），NLP模型与解析库均为按需加载")
+PYTHON_SCRIPT
@@ -0,0 +1,91 @@
+#!/bin/bash
+# 测试批量导入的重新解析：同批次内容相同的文件只入库一次，--reparse在原book_id下替换解析产物并保留Persona
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+# 数据库、缓存与全书正文都放在临时目录，不影响本地数据
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export DATABASE_URL="sqlite:///$WORK_DIR/reparse.db"
+export BOOK_TEXT_DIR="$WORK_DIR/book_text"
+export PARSE_CACHE_DIR="$WORK_DIR/parse_cache"
+export TOKEN_STORE_DIR="$WORK_DIR/token_store"
+export CUSTOM_DICT_DIR="$WORK_DIR/custom_dict"
+export DEBUG=false
+
+run_batch() {
+    python3 batch_upload_books.py "$@" --stages parse,evidence --manifest "$WORK_DIR/manifest.json" -w 1 > "$WORK_DIR/batch.log" 2>&1 \
+        || { tail -20 "$WORK_DIR/batch.log"; exit 1; }
+}
+
+echo "🔁 测试批量导入的重新解析"
+echo "====================="
+echo ""
+
+echo "🔍 同批次内容相同的文件"
+cp ../books/论语.txt "$WORK_DIR/论语副本.txt"
+run_batch ../books/论语.txt "$WORK_DIR/论语副本.txt"
+grep -q "论语副本.txt: 与 论语.txt 内容相同，跳过" "$WORK_DIR/batch.log"
+
+# 模拟旧版本解析的书籍：改写解析器版本，并添加一条Persona记录
+python3 << 'PYTHON_SCRIPT'
+import sys
+sys.path.insert(0, '.')
+
+from app.database import SessionLocal
+from app.models.orm import AuthorPersonaORM, BookORM
+
+db = SessionLocal()
+books = db.query(BookORM).all()
+assert len(books) == 1, "内容相同的文件应只入库一次"
+book = books[0]
+book.parse_stats = {**book.parse_stats, "cache": {**book.parse_stats["cache"], "version": "old"}}
+db.add(AuthorPersonaORM(persona_id="persona-1", book_id=book.book_id, author_name="孔子", thinking_style="辩证"))
+db.commit()
+print(f"   book_id: {book.book_id}")
+db.close()
+PYTHON_SCRIPT
+python3 - "$WORK_DIR/manifest.json" << 'PYTHON_SCRIPT'
+import json
+import sys
+
+with open(sys.argv[1], encoding="utf-8") as f:
+    manifest = json.load(f)
+for entry in manifest["books"].values():
+    entry["parser_version"] = "old"
+with open(sys.argv[1], "w", encoding="utf-8") as f:
+    json.dump(manifest, f)
+PYTHON_SCRIPT
+
+echo "🔍 --reparse"
+run_batch ../books/论语.txt --reparse
+grep -q "解析器版本 old ->" "$WORK_DIR/batch.log"
+
+python3 << 'PYTHON_SCRIPT'
+import sys
+sys.path.insert(0, '.')
+
+from app.database import SessionLocal
+from app.models.orm import AuthorPersonaORM, BookORM, ChapterORM, EvidenceORM, ParagraphORM
+from app.utils.book_text import get_book_text_store
+
+db = SessionLocal()
+book = db.query(BookORM).one()
+assert book.parse_stats["cache"]["version"] != "old", "应按当前解析器版本重新解析"
+assert db.query(AuthorPersonaORM).filter(AuthorPersonaORM.book_id == book.book_id).count() == 1, "Persona应保留"
+
+chapters = db.query(ChapterORM).filter(ChapterORM.book_id == book.book_id).all()
+assert len(chapters) == book.total_chapters == db.query(ChapterORM).count(), "旧章节应被替换"
+chapter_ids = {chapter.chapter_id for chapter in chapters}
+assert {p.chapter_id for p in db.query(ParagraphORM).all()} == chapter_ids, "段落应按新章节重建"
+assert {e.chapter_id for e in db.query(EvidenceORM).all()} <= chapter_ids, "不应残留旧章节的证据"
+book_text = get_book_text_store().open(book.book_id)
+assert all(book_text.text(chapter.text_start, chapter.text_end) == chapter.content for chapter in chapters)
+print(f"   {len(chapters)} 章，段落 {db.query(ParagraphORM).count()} 行，证据 {db.query(EvidenceORM).count()} 条")
+db.close()
+
+print("")
+print("✅ 批量导入重新解析测试通过")
+PYTHON_SCRIPT
@@ -0,0 +1,72 @@
+#!/bin/bash
+# 测试全书正文存储：字节范围还原、前后文窗口不越出章节、压缩存储
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export BOOK_TEXT_DIR="$WORK_DIR/book_text"
+
+echo "📄 测试全书正文存储"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import os
+import sys
+sys.path.insert(0, '.')
+
+from app.utils.book_text import BookTextStore, byte_offsets
+from app.utils.sentence_index import paragraph_bounds
+
+# 各章首尾、段落之间夹有空行，中英文混排以检验字节偏移
+CHAPTERS = [
+    "乡土本色\n从基层上看去，中国社会是乡土性的。\n\n我们的民族确是和泥土分不开的了。\n农业和游牧或工业不同。",
+    "\n文字下乡\n乡下人在城里人眼睛里是“愚”的。\n\n\n文字是用来帮助人们传情达意的（writing）。\n",
+    "差序格局\n好像把一块石头丢在水面上。",
+    "",
+]
+
+
+def check_store(compress: bool):
+    store = BookTextStore(os.path.join(os.environ["BOOK_TEXT_DIR"], "compressed" if compress else "plain"), compress=compress)
+    ranges = store.write("book", CHAPTERS)
+    book_text = store.open("book")
+    assert book_text is not None and store.exists("book")
+
+    windows = 0
+    for content, (lower, upper) in zip(CHAPTERS, ranges):
+        assert book_text.text(lower, upper) == content, "章节字节范围应还原章节正文"
+        starts, ends = paragraph_bounds(content)
+        paragraphs = [content[start:end] for start, end in zip(starts, ends)]
+        byte_starts = byte_offsets(content, starts)
+        byte_ends = byte_offsets(content, ends)
+        for index, (start, end) in enumerate(zip(byte_starts, byte_ends)):
+            assert book_text.text(lower + start, lower + end) == paragraphs[index]
+            for window in range(0, len(paragraphs) + 2):
+                before, after = book_text.context(lower, upper, lower + start, lower + end, window)
+                before = str(before, "utf-8")
+                after = str(after, "utf-8")
+                # 前后文是本章正文中紧邻段落的连续片段，且恰为前后各window段
+                assert not before or content[:starts[index]].endswith(before + "\n")
+                assert not after or content[ends[index]:].startswith("\n" + after)
+                assert [line for line in before.split("\n") if line.strip()] == paragraphs[max(index - window, 0):index]
+                assert [line for line in after.split("\n") if line.strip()] == paragraphs[index + 1:index + 1 + window]
+                windows += 1
+
+    size = store.size("book")
+    store.delete("book")
+    assert not store.exists("book") and store.open("book") is None
+    print(f"   {'压缩' if compress else '未压缩'}: {len(ranges)} 章，文件 {size} 字节，检查 {windows} 个前后文窗口")
+
+
+print("🔍 未压缩（mmap）")
+check_store(compress=False)
+print("🔍 zlib压缩")
+check_store(compress=True)
+
+print("")
+print("✅ 全书正文存储测试通过")
+PYTHON_SCRIPT
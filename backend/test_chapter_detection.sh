@@ -18,19 +18,18 @@ from app.services.document_parser import get_document_parser
 async def test():
     parser = get_document_parser()
     
-    # 读取文件
-    with open('../books/理想国.txt', 'r', encoding='utf-8') as f:
-        text = f.read()
+    # 读取并清洗文件
+    lines, extraction_stats = await parser._parse_txt('../books/理想国.txt')
     
     print(f"📖 文件: 理想国.txt")
-    print(f"📏 总字数: {len(text):,}")
+    print(f"📏 总字数: {extraction_stats['raw_chars']:,}")
     print("")
     
     # 测试章节识别
     print("🔍 识别章节结构...")
     print("")
     
-    chapters = parser._identify_chapters(text, 'txt')
+    chapters, stats = parser._identify_chapters(lines, 'txt')
     
     print(f"✅ 识别到 {len(chapters)} 个章节")
     print("")
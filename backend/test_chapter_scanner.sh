@@ -0,0 +1,55 @@
+#!/bin/bash
+# 测试章节标题扫描：已知书籍、按卷划分的TXT、正文中引用章节名不被误判为标题
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+echo "📚 测试章节标题扫描"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import asyncio
+import sys
+sys.path.insert(0, '.')
+
+from app.services.document_parser import get_document_parser
+
+LUNYU_TITLES = [
+    "学而", "为政", "八佾", "里仁", "公冶长", "雍也", "述而", "泰伯", "子罕", "乡党",
+    "先进", "颜渊", "子路", "宪问", "卫灵公", "季氏", "阳货", "微子", "子张", "尧曰",
+]
+
+
+async def test():
+    parser = get_document_parser()
+
+    print("🔍 论语.txt")
+    lines, _ = await parser._parse_txt('../books/论语.txt')
+    chapters, stats = parser._identify_chapters(lines, 'txt', '论语')
+    print(f"   策略: {stats['strategy']}, 章节数: {len(chapters)}")
+    assert [chapter.title for chapter in chapters] == LUNYU_TITLES
+
+    print("🔍 理想国.txt")
+    lines, _ = await parser._parse_txt('../books/理想国.txt')
+    chapters, stats = parser._identify_chapters(lines, 'txt', '理想国')
+    print(f"   策略: {stats['strategy']}, 章节数: {len(chapters)}")
+    assert stats["strategy"] == "pattern" and not stats["fallback"]
+    assert [chapter.title for chapter in chapters] == [f"第{n}卷" for n in "一二三四五六七八九十"]
+    assert all(chapter.content for chapter in chapters)
+
+    print("🔍 合成文本（正文中引用章节名）")
+    lines = ["序言", "这是一本测试书。"]
+    for number, numeral in enumerate("一二三四五", start=1):
+        lines += [f"第{numeral}章 标题{number}", f"正文{number}" * 30, f"正如第{numeral}章所说，这里只是引用。" * 2]
+    chapters, stats = parser._identify_chapters(lines, 'txt', '合成')
+    print(f"   策略: {stats['strategy']}, 章节: {[chapter.title for chapter in chapters]}")
+    assert [chapter.title for chapter in chapters] == [f"第{numeral}章 标题{number}" for number, numeral in enumerate("一二三四五", start=1)]
+    assert all(f"正文{number}" in chapter.content for number, chapter in enumerate(chapters, start=1))
+
+    print("")
+    print("✅ 章节标题扫描测试通过")
+
+asyncio.run(test())
+PYTHON_SCRIPT
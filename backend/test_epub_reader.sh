@@ -0,0 +1,142 @@
+#!/bin/bash
+# 测试EPUB流式读取：spine顺序、nav/NCX目录切分章节、无目录回退
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+echo "📚 测试EPUB读取"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import asyncio
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+sys.path.insert(0, '.')
+
+from app.utils.epub_reader import EpubReader
+from app.services.document_parser import get_document_parser
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+DOCUMENTS = {
+    # 封面位于第一个目录条目之前，应被丢弃
+    "cover.xhtml": "<h1>封面</h1><p>版权所有，翻印必究</p>",
+    # 一个文档包含两章，第二章从锚点开始
+    "part1.xhtml": (
+        "<h1>第一章 乡土本色</h1><p>从基层上看去，中国社会是乡土性的。</p>"
+        "<p>我们的民族确是和泥土分不开的了。</p>"
+        "<h1 id=\"sec2\">第二章 文字下乡</h1><p>乡下人在城里人眼睛里是愚的。</p>"
+    ),
+    "part2.xhtml": "<h1>第三章 再论文字下乡</h1><p>文字是用来帮助人们在社会生活中传情达意的。</p>",
+}
+
+# manifest顺序与spine顺序不同，读取应以spine为准
+SPINE = ["cover", "part1", "part2"]
+TOC = [("第一章 乡土本色", "part1.xhtml"), ("第二章 文字下乡", "part1.xhtml#sec2"), ("第三章 再论文字下乡", "part2.xhtml")]
+
+
+def xhtml(body: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+        f'<head><title>t</title></head><body>{body}</body></html>'
+    )
+
+
+def nav_document() -> str:
+    items = "".join(f'<li><a href="{href}">{title}</a></li>' for title, href in TOC)
+    return xhtml(f'<nav epub:type="toc"><h1>目录</h1><ol>{items}</ol></nav>')
+
+
+def ncx_document() -> str:
+    points = "".join(
+        f'<navPoint id="p{i}" playOrder="{i}"><navLabel><text>{title}</text></navLabel><content src="{href}"/></navPoint>'
+        for i, (title, href) in enumerate(TOC, start=1)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1"><navMap>{points}</navMap></ncx>'
+    )
+
+
+def build_epub(path: Path, toc: str):
+    """toc: nav / ncx / none"""
+    manifest = [f'<item id="{name}" href="{name}.xhtml" media-type="application/xhtml+xml"/>' for name in reversed(SPINE)]
+    spine_attrs = ""
+    if toc == "nav":
+        manifest.append('<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>')
+    elif toc == "ncx":
+        manifest.append('<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>')
+        spine_attrs = ' toc="ncx"'
+    itemrefs = "".join(f'<itemref idref="{name}"/>' for name in SPINE)
+    opf = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+        f'<manifest>{"".join(manifest)}</manifest><spine{spine_attrs}>{itemrefs}</spine></package>'
+    )
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr("META-INF/container.xml", CONTAINER)
+        archive.writestr("OEBPS/content.opf", opf)
+        for name, body in DOCUMENTS.items():
+            archive.writestr(f"OEBPS/{name}", xhtml(body))
+        if toc == "nav":
+            archive.writestr("OEBPS/nav.xhtml", nav_document())
+        elif toc == "ncx":
+            archive.writestr("OEBPS/toc.ncx", ncx_document())
+
+
+def check_toc_chapters(path: Path, source: str):
+    reader = EpubReader(str(path))
+    chapters = list(reader.iter_chapters())
+    titles = [title for title, _ in chapters]
+    print(f"   目录来源: {reader.stats['toc_source']}, 章节: {titles}")
+    assert reader.stats["toc_source"] == source
+    assert reader.stats["spine_documents"] == len(SPINE)
+    assert titles == [title for title, _ in TOC]
+    contents = [content for _, content in chapters]
+    assert "从基层上看去" in contents[0] and "乡下人" not in contents[0], "锚点处应开始新章"
+    assert "乡下人在城里人眼睛里是愚的" in contents[1]
+    assert "传情达意" in contents[2]
+    assert all("版权所有" not in content for content in contents), "目录之前的封面应被丢弃"
+    assert all(not content.lstrip().startswith(title) for title, content in chapters), "正文开头的标题应被去除"
+
+
+async def test():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        print("🔍 EPUB3 nav目录")
+        build_epub(tmp / "nav.epub", "nav")
+        check_toc_chapters(tmp / "nav.epub", "nav")
+
+        print("🔍 EPUB2 NCX目录")
+        build_epub(tmp / "ncx.epub", "ncx")
+        check_toc_chapters(tmp / "ncx.epub", "ncx")
+
+        print("🔍 无目录时按spine文档切分")
+        build_epub(tmp / "plain.epub", "none")
+        reader = EpubReader(str(tmp / "plain.epub"))
+        titles = [title for title, _ in reader.iter_chapters()]
+        print(f"   章节: {titles}")
+        assert reader.stats["toc_source"] is None
+        assert titles == ["封面", "第一章 乡土本色", "第三章 再论文字下乡"]
+
+        print("🔍 DocumentParser解析")
+        chapters, chapter_stats, extraction_stats = await get_document_parser()._parse_epub(str(tmp / "nav.epub"))
+        print(f"   策略: {chapter_stats['strategy']}, 章节数: {len(chapters)}, spine文档: {extraction_stats['spine_documents']}")
+        assert chapter_stats["strategy"] == "epub_nav"
+        assert [c.chapter_number for c in chapters] == [1, 2, 3]
+
+    print("")
+    print("✅ EPUB读取测试通过")
+
+asyncio.run(test())
+PYTHON_SCRIPT
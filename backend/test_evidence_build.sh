@@ -0,0 +1,80 @@
+#!/bin/bash
+# 测试证据库构建：证据按字节位置锚定到段落、段落数与入库行一致、未变化的章节跳过重建
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+# 数据库、缓存与全书正文都放在临时目录，不影响本地数据
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export DATABASE_URL="sqlite:///$WORK_DIR/evidence.db"
+export BOOK_TEXT_DIR="$WORK_DIR/book_text"
+export PARSE_CACHE_DIR="$WORK_DIR/parse_cache"
+export TOKEN_STORE_DIR="$WORK_DIR/token_store"
+export CUSTOM_DICT_DIR="$WORK_DIR/custom_dict"
+export DEBUG=false
+
+echo "🧱 测试证据库构建"
+echo "====================="
+echo ""
+
+python3 batch_upload_books.py ../books/论语.txt --stages parse,evidence --manifest "$WORK_DIR/manifest.json" -w 1 > "$WORK_DIR/batch.log" 2>&1 \
+    || { tail -20 "$WORK_DIR/batch.log"; exit 1; }
+
+python3 << 'PYTHON_SCRIPT'
+import sys
+sys.path.insert(0, '.')
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models.orm import BookORM, ChapterORM, EvidenceORM, ParagraphORM
+from app.services.evidence_builder import get_evidence_builder
+from app.utils.book_text import get_book_text_store
+
+db = SessionLocal()
+book = db.query(BookORM).one()
+chapters = db.query(ChapterORM).filter(ChapterORM.book_id == book.book_id).order_by(ChapterORM.chapter_number).all()
+book_text = get_book_text_store().open(book.book_id)
+assert book_text is not None, "应写出全书正文文件"
+print(f"📖 {book.title}: {len(chapters)} 章，正文 {len(book_text):,} 字节")
+
+print("🔍 章节与段落")
+for chapter in chapters:
+    assert book_text.text(chapter.text_start, chapter.text_end) == chapter.content, "章节字节范围应还原章节正文"
+    paragraphs = db.query(ParagraphORM).filter(ParagraphORM.chapter_id == chapter.chapter_id).all()
+    assert chapter.paragraph_count == len(paragraphs), f"段落数应等于入库行数: {chapter.title}"
+    for p in paragraphs:
+        assert p.content == "" and 0 <= p.byte_start < p.byte_end <= chapter.text_end - chapter.text_start
+        text = book_text.text(chapter.text_start + p.byte_start, chapter.text_start + p.byte_end)
+        assert text.strip() and "\n" not in text, "段落范围应恰为一行"
+print(f"   段落: {db.query(func.count(ParagraphORM.paragraph_id)).scalar()} 行")
+
+print("🔍 证据锚定")
+chapter_starts = {chapter.chapter_id: chapter.text_start for chapter in chapters}
+evidences = db.query(EvidenceORM).filter(EvidenceORM.book_id == book.book_id).all()
+anchored = 0
+for e in evidences:
+    if e.paragraph_id is None:
+        continue
+    paragraph = db.query(ParagraphORM).filter(ParagraphORM.paragraph_id == e.paragraph_id).one()
+    assert (e.byte_start, e.byte_end) == (paragraph.byte_start, paragraph.byte_end), "证据范围应与所在段落一致"
+    text = book_text.text(chapter_starts[e.chapter_id] + e.byte_start, chapter_starts[e.chapter_id] + e.byte_end)
+    assert e.evidence_text.rstrip("…") in text, "证据原文应出现在锚定的段落中"
+    anchored += 1
+print(f"   证据: {len(evidences)} 条，锚定到段落 {anchored} 条")
+assert evidences and anchored == len(evidences)
+
+print("🔍 增量重建")
+stats = get_evidence_builder().build_for_book(db, book.book_id)
+print(f"   重建 {stats['rebuilt']} 章，跳过 {stats['skipped']} 章")
+assert stats["rebuilt"] == 0 and stats["skipped"] == len(chapters), "未变化的章节应跳过"
+stats = get_evidence_builder().build_for_book(db, book.book_id, force=True)
+assert stats["rebuilt"] == len(chapters)
+assert db.query(func.count(EvidenceORM.evidence_id)).scalar() == len(evidences), "强制重建应整章替换，不产生重复行"
+
+db.close()
+print("")
+print("✅ 证据库构建测试通过")
+PYTHON_SCRIPT
@@ -0,0 +1,132 @@
+#!/bin/bash
+# 测试全文检索：未索引时的LIKE回退、补建索引、高亮片段、游标翻页稳定、过滤与删除同步
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+# 使用临时数据库与全书正文目录，不影响本地数据
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export DATABASE_URL="sqlite:///$WORK_DIR/search.db"
+export BOOK_TEXT_DIR="$WORK_DIR/book_text"
+export DEBUG=false
+
+echo "🔎 测试全文检索"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import sys
+sys.path.insert(0, '.')
+
+from app.database import SessionLocal, init_db, ensure_schema
+from app.models.orm import BookORM, ChapterORM, EvidenceORM, ParagraphORM
+from app.crud import crud_search
+from app.utils.book_text import byte_offsets, get_book_text_store
+
+init_db()
+ensure_schema()
+db = SessionLocal()
+
+SENTENCES = [
+    "乡土社会是安土重迁的，生于斯、长于斯、死于斯的社会。",
+    "在乡土社会里，人口的流动率很小。",
+    "文字是用来帮助人们在社会生活中传情达意的。",
+    "差序格局像把一块石头丢在水面上所发生的一圈圈推出去的波纹。",
+]
+
+# 两本书，证据有意大量重复（得分相同），检验翻页在同分时按rowid稳定推进
+for book_number in (1, 2):
+    book_id = f"book-{book_number}"
+    db.add(BookORM(book_id=book_id, title=f"测试书{book_number}", author="测试", file_path="-", file_type="txt"))
+    db.add(ChapterORM(chapter_id=f"{book_id}-c1", book_id=book_id, chapter_number=1, title="乡土本色", content=""))
+    for index in range(23):
+        db.add(EvidenceORM(
+            evidence_id=f"{book_id}-e{index}",
+            book_id=book_id,
+            chapter_id=f"{book_id}-c1",
+            evidence_text=SENTENCES[index % len(SENTENCES)]
+        ))
+db.commit()
+
+# 段落正文不入库，按字节位置从全书正文切出后建索引
+content = "\n".join(SENTENCES)
+ranges = get_book_text_store().write("book-1", [content])
+chapter = db.query(ChapterORM).filter(ChapterORM.chapter_id == "book-1-c1").one()
+chapter.text_start, chapter.text_end = ranges[0]
+starts, position = [], 0
+for sentence in SENTENCES:
+    starts.append(position)
+    position += len(sentence) + 1
+for number, (sentence, start) in enumerate(zip(SENTENCES, starts), start=1):
+    byte_start, byte_end = byte_offsets(content, [start, start + len(sentence)])
+    db.add(ParagraphORM(
+        paragraph_id=f"p{number}", book_id="book-1", chapter_id="book-1-c1", paragraph_number=number,
+        content="", byte_start=byte_start, byte_end=byte_end
+    ))
+db.commit()
+
+print("🔍 未进入索引的书退回LIKE匹配")
+assert crud_search.unindexed_books(db, crud_search.EVIDENCE_SEARCH) == ["book-1", "book-2"]
+hits, cursor = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "流动率", filters={"book_id": "book-1"}, limit=4)
+print(f"   {hits[0]['snippet']}")
+assert len(hits) == 4 and cursor is not None
+assert all("<mark>流动率</mark>" in hit["snippet"] for hit in hits)
+more, _ = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "流动率", filters={"book_id": "book-1"}, cursor=cursor, limit=50)
+assert len(hits) + len(more) == 6 and hits[-1]["rowid"] < more[0]["rowid"]
+
+print("🔍 补建索引")
+indexed = crud_search.backfill_index(db)
+print(f"   建立索引: {indexed}")
+assert indexed == {"evidences": 46, "paragraphs": 4}
+assert crud_search.unindexed_books(db, crud_search.EVIDENCE_SEARCH) == []
+assert crud_search.index_missing(db) == {"evidences": 0, "paragraphs": 0}, "已索引的行不应重复索引"
+
+print("🔍 高亮片段")
+hits, _ = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "乡土社会", limit=5)
+for hit in hits:
+    print(f"   {hit['score']:.4f}  {hit['snippet']}")
+assert hits
+assert all("<mark>" in hit["snippet"] for hit in hits)
+assert all(crud_search.FTS_SEPARATOR not in hit["snippet"] for hit in hits), "片段中不应残留分隔符"
+assert all(hit["snippet"].replace("<mark>", "").replace("</mark>", "") in SENTENCES for hit in hits), "去掉高亮后应还原原文"
+
+paragraph_hits, _ = crud_search.search(db, crud_search.PARAGRAPH_SEARCH, "差序格局")
+print(f"   段落: {paragraph_hits[0]['snippet']}")
+assert len(paragraph_hits) == 1 and "<mark>差序格局</mark>" in paragraph_hits[0]["snippet"]
+
+print("🔍 游标翻页")
+all_hits, cursor = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "社会", limit=200)
+assert cursor is None
+expected = [hit["rowid"] for hit in all_hits]
+for page_size in (1, 4, 7):
+    paged, cursor, pages = [], None, 0
+    while True:
+        hits, cursor = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "社会", cursor=cursor, limit=page_size)
+        paged.extend(hit["rowid"] for hit in hits)
+        pages += 1
+        if cursor is None:
+            break
+    print(f"   每页 {page_size}: {pages} 页，{len(paged)} 条")
+    assert paged == expected, "逐页结果应与一次取出的顺序一致，不重不漏"
+
+try:
+    crud_search.search(db, crud_search.EVIDENCE_SEARCH, "社会", cursor="not-a-cursor")
+    raise AssertionError("无效游标应被拒绝")
+except ValueError:
+    pass
+
+print("🔍 过滤与删除同步")
+hits, _ = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "社会", filters={"book_id": "book-2"}, limit=200)
+assert hits and len(hits) == len(expected) // 2
+db.query(EvidenceORM).filter(EvidenceORM.book_id == "book-2").delete()
+db.commit()
+hits, _ = crud_search.search(db, crud_search.EVIDENCE_SEARCH, "社会", limit=200)
+assert len(hits) == len(expected) - len(expected) // 2, "删除的行应由触发器移出索引"
+assert crud_search.search(db, crud_search.EVIDENCE_SEARCH, "，。") == ([], None), "没有可检索词元时返回空"
+
+db.close()
+print("")
+print("✅ 全文检索测试通过")
+PYTHON_SCRIPT
@@ -0,0 +1,64 @@
+#!/bin/bash
+# 测试段落重排：《乡土中国》PDF折行合并为段落，按段落存放的TXT原样通过
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+echo "📐 测试段落重排"
+echo "====================="
+echo ""
+
+python3 << 'PYTHON_SCRIPT'
+import asyncio
+import sys
+sys.path.insert(0, '.')
+
+from app.services.document_parser import get_document_parser
+from app.utils.line_pipeline import ParagraphReflow, iter_text_lines
+
+
+def reflow_lines(lines):
+    reflow = ParagraphReflow()
+    reflow.consume(lines)
+    paragraphs = [line for line in reflow.reflow(lines) if line]
+    return paragraphs, reflow.stats()
+
+
+def squeeze(lines) -> str:
+    return "".join("".join(lines).split())
+
+
+async def test():
+    parser = get_document_parser()
+
+    print("🔍 乡土中国.pdf")
+    pages, _ = await parser._parse_pdf('../books/乡土中国.pdf')
+    lines = parser._run_line_pipeline(lambda: iter_text_lines(pages))[0]
+    paragraphs, stats = reflow_lines(lines)
+    ended = sum(1 for paragraph in paragraphs if ParagraphReflow.ends_paragraph(paragraph))
+    print(f"   {stats['lines']} 行 -> {stats['paragraphs']} 段，版心宽度 {stats['wrap_width']}，合并比例 {stats['merge_ratio']:.1%}")
+    print(f"   以段末标点结尾的段落: {ended}/{len(paragraphs)}")
+
+    assert stats["applied"], "PDF折行应启用重排"
+    assert stats["merge_ratio"] >= 0.5
+    assert ended / len(paragraphs) >= 0.85, "重排后的段落应基本以段末标点结尾"
+    assert squeeze(paragraphs) == squeeze(lines), "重排只合并行，不应增删字符"
+    # 原书跨行的段落合并为一段，章节标题保持独立成行
+    opening = next(paragraph for paragraph in paragraphs if paragraph.startswith("从基层上看去"))
+    assert "他们才是中国社会的基层。" in opening
+    for title in ("文字下乡", "差序格局", "礼治秩序", "长老统治"):
+        assert title in paragraphs, f"章节标题不应并入正文: {title}"
+
+    print("🔍 论语.txt（按段落存放）")
+    lines, _ = await parser._parse_txt('../books/论语.txt')
+    paragraphs, stats = reflow_lines(lines)
+    print(f"   启用: {stats['applied']}，{stats['lines']} 行 -> {stats['paragraphs']} 段")
+    assert not stats["applied"], "按段落存放的文本不应重排"
+    assert paragraphs == [line for line in lines if line]
+
+    print("")
+    print("✅ 段落重排测试通过")
+
+asyncio.run(test())
+PYTHON_SCRIPT
@@ -0,0 +1,83 @@
+#!/bin/bash
+# 测试整书批量分词与分词存储：进程池分词与逐条分词一致、存储与句子对齐、npz缓存往返
+
+set -e
+cd "$(dirname "$0")"
+export PYTHONPATH="$(pwd)"
+
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+export TOKEN_STORE_DIR="$WORK_DIR/token_store"
+
+echo "🔤 测试批量分词与分词存储"
+echo "====================="
+echo ""
+
+# 进程池以spawn启动子进程，子进程需要按路径重新导入主模块，因此脚本先写入文件再执行
+cat > "$WORK_DIR/test_token_store.py" << 'PYTHON_SCRIPT'
+import asyncio
+import os
+import sys
+sys.path.insert(0, os.getcwd())
+
+import numpy as np
+
+from app.services.document_parser import get_document_parser
+from app.utils import segmenter
+from app.utils.segmenter import MIN_PARALLEL_CHARS, segment_batch, segment_texts, shutdown_pool
+from app.utils.token_store import BookTokenStore, TokenStoreCache
+
+
+async def test():
+    parser = get_document_parser()
+    lines, _ = await parser._parse_txt('../books/理想国.txt')
+    chapters, _ = parser._identify_chapters(lines, 'txt', '理想国')
+    contents = [chapter.content for chapter in chapters]
+
+    sentences, _ = parser.text_processor.build_sentence_index(contents)
+    texts = list(sentences.iter_texts(contents))
+    total_chars = sum(len(text) for text in texts)
+    print(f"📖 理想国: {len(chapters)} 章，{sentences.num_sentences} 句，{total_chars:,} 字")
+    assert total_chars >= MIN_PARALLEL_CHARS, "文本量应足以走进程池"
+
+    print("🔍 进程池分词与逐条分词一致")
+    try:
+        pooled = await segment_batch(texts, workers=2)
+        assert segmenter._pool is not None, "应通过进程池分词"
+    finally:
+        shutdown_pool()
+    sequential = segment_texts(texts)
+    assert len(pooled) == len(texts)
+    assert pooled == sequential, "分片并行的结果应与输入一一对应且与单进程一致"
+
+    print("🔍 分词存储与句子对齐")
+    store = BookTokenStore.build(sentences, pooled)
+    stats = store.stats()
+    print(f"   {stats}")
+    assert store.num_sentences == len(texts) and store.num_chapters == len(chapters)
+    assert store.token_ids.dtype == (np.uint16 if len(store.vocab) <= 0xFFFF else np.uint32)
+    for index in range(0, store.num_sentences, 97):
+        assert store.sentence_tokens(index) == pooled[index]
+    for chapter_index in (0, len(chapters) - 1):
+        start, end = store.chapter_sentence_range(chapter_index)
+        assert store.chapter_token_lists(chapter_index) == pooled[start:end]
+
+    print("🔍 npz缓存往返")
+    cache = TokenStoreCache(enabled=True)
+    cache.put("hash", "v-test", store)
+    loaded = cache.get("hash", "v-test")
+    assert loaded is not None and cache.get("hash", "v-other") is None
+    assert loaded.vocab == store.vocab
+    assert np.array_equal(loaded.token_ids, store.token_ids)
+    assert np.array_equal(loaded.sentence_spans, store.sentence_spans)
+    assert all(loaded.sentence_tokens(index) == pooled[index] for index in range(loaded.num_sentences))
+    print(f"   缓存文件: {sorted(os.listdir(os.environ['TOKEN_STORE_DIR']))}")
+
+    print("")
+    print("✅ 批量分词与分词存储测试通过")
+
+
+if __name__ == "__main__":
+    asyncio.run(test())
+PYTHON_SCRIPT
+python3 "$WORK_DIR/test_token_store.py"